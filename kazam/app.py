@@ -22,22 +22,25 @@
 
 import os
 import sys
-import locale
 import shutil
+import locale
 import gettext
 import logging
 
 from subprocess import Popen
-from gi.repository import Gtk, Gdk, GObject
+from gi.repository import Gtk, Gdk, GObject, GLib
 from gettext import gettext as _
 
 from kazam.utils import *
 from kazam.backend.prefs import *
 from kazam.backend.grabber import Grabber
+from kazam.backend.filemover import FileMover
+from kazam.backend.recovery import Recovery, find_orphans, find_replay_dirs
 from kazam.frontend.main_menu import MainMenu
 from kazam.frontend.window_area import AreaWindow
 from kazam.backend.gstreamer import Screencast
 from kazam.frontend.preferences import Preferences
+from kazam.frontend.widgets import LevelMeter
 from kazam.frontend.about_dialog import AboutDialog
 from kazam.frontend.indicator import KazamIndicator
 from kazam.frontend.window_select import SelectWindow
@@ -111,6 +114,13 @@ class KazamApp(GObject.GObject):
         self.in_countdown = False
         self.recording_paused = False
         self.recording = False
+        self.last_stats = None
+        self.stats_timer_id = None
+        self.movers = []
+        self.flushing = []
+        self.pending_flushes = []
+        self.done_windows = []
+        self.quit_pending = False
         self.main_mode = 0
         self.record_mode = 0
         self.last_mode = None
@@ -131,6 +141,7 @@ class KazamApp(GObject.GObject):
         self.indicator.connect("indicator-pause-request", self.cb_pause_request)
         self.indicator.connect("indicator-unpause-request", self.cb_unpause_request)
         self.indicator.connect("indicator-about-request", self.cb_about_request)
+        self.indicator.connect("indicator-replay-request", self.cb_replay_request)
 
         self.mainmenu.connect("file-quit", self.cb_quit_request)
         self.mainmenu.connect("file-preferences", self.cb_preferences_request)
@@ -154,6 +165,9 @@ class KazamApp(GObject.GObject):
         # Retrieve gdk_win for the root window
         self.gdk_win = self.window.get_root_window()
 
+        self.meter_speakers = LevelMeter(self.levelbar_speakers)
+        self.meter_microphone = LevelMeter(self.levelbar_microphone)
+
         #
         # Attach main menu, so that
         #
@@ -269,6 +283,15 @@ class KazamApp(GObject.GObject):
         self.default_screen.connect("size-changed", self.cb_screen_size_changed)
         self.window.connect("configure-event", self.cb_configure_event)
 
+        #
+        # Level meters only run while the main window is on screen.
+        #
+        self.window.connect("map", self.cb_window_mapped)
+        self.window.connect("unmap", self.cb_window_mapped)
+        if prefs.sound:
+            # After prefs has picked the sources again
+            prefs.pa_q.connect_after("sources-changed", self.cb_sources_changed)
+
         # Fetch sources info, take care of all the widgets and saved settings and show main window
         if prefs.sound:
             prefs.get_audio_sources()
@@ -289,6 +312,66 @@ class KazamApp(GObject.GObject):
         HW.get_current_screen(self.window)
         self.startup = False
 
+        if not prefs.silent:
+            GLib.idle_add(self.check_orphans)
+
+    def check_orphans(self):
+        #
+        # Replay fragments are only a ring buffer, nothing in them was
+        # saved by the user.
+        #
+        for path in find_replay_dirs([prefs.video_dest, REPLAY_MEMORY_DIR]):
+            logger.info("Removing replay fragments left behind in {0}".format(path))
+            shutil.rmtree(path, ignore_errors=True)
+
+        (movies, muxes) = find_orphans(prefs.video_dest)
+        if not (movies or muxes):
+            return False
+
+        logger.info("Found unfinished recordings: {0} {1}".format(movies, muxes))
+        count = len(movies) + len([m for m in muxes if m[:-len(".mux")] not in movies])
+        dialog = Gtk.MessageDialog(self.window, 0,
+                                   Gtk.MessageType.QUESTION,
+                                   Gtk.ButtonsType.NONE,
+                                   _("Kazam found {0} unfinished recording(s).").format(count))
+        dialog.format_secondary_text(_("These were left behind when Kazam stopped unexpectedly. "
+                                       "Recovered files will be saved to {0}.").format(self.get_recovery_dir()))
+        dialog.add_buttons(_("Later"), Gtk.ResponseType.CANCEL,
+                           _("Recover"), Gtk.ResponseType.OK)
+        response = dialog.run()
+        dialog.destroy()
+        if response != Gtk.ResponseType.OK:
+            return False
+
+        recovery = Recovery(movies, muxes, self.get_recovery_dir())
+        recovery.connect("recovery-done", self.cb_recovery_done)
+        recovery.start()
+        return False
+
+    def get_recovery_dir(self):
+        if prefs.autosave_video:
+            return prefs.autosave_video_dir
+        return prefs.video_dest
+
+    def cb_recovery_done(self, recovery, results):
+        if not results:
+            return
+        recovered = [out for (orig, out) in results if out]
+        damaged = [orig for (orig, out) in results if not out]
+        text = ""
+        if recovered:
+            text += _("Recovered:") + "\n" + "\n".join(recovered)
+        if damaged:
+            text += "\n\n" if text else ""
+            text += _("Could not be recovered, kept as:") + "\n" + "\n".join(damaged)
+        dialog = Gtk.MessageDialog(self.window, 0,
+                                   Gtk.MessageType.INFO,
+                                   Gtk.ButtonsType.OK,
+                                   _("Recovery finished."))
+        dialog.format_secondary_text(text)
+        dialog.run()
+        dialog.destroy()
+
     #
     # Callbacks, go down here ...
     #
@@ -304,6 +387,7 @@ class KazamApp(GObject.GObject):
             self.main_mode = MODE_SCREENCAST
             self.ntb_main.set_current_page(0)
             self.indicator.menuitem_start.set_label(_("Start recording"))
+            self.update_level_meters()
 
         elif name == "MAIN_SCREENSHOT" and widget.get_active():
             logger.debug("Main toggled: {0}".format(name))
@@ -312,6 +396,7 @@ class KazamApp(GObject.GObject):
             if self.record_mode == MODE_WIN:
                 self.last_mode.set_active(True)
             self.indicator.menuitem_start.set_label(_("Take screenshot"))
+            self.update_level_meters()
             if self.record_mode == "MODE_WIN":
                 self.chk_borders_pic.set_sensitive(True)
             else:
@@ -505,16 +590,38 @@ class KazamApp(GObject.GObject):
         # Restore cursor, just in case if by some chance stays set to cross-hairs
         self.gdk_win.set_cursor(self.default_cursor)
         (prefs.main_x, prefs.main_y) = self.window.get_position()
-        try:
-            os.remove(self.recorder.tempfile)
-            os.remove("{0}.mux".format(self.recorder.tempfile))
-        except OSError:
-            logger.info("Unable to delete one of the temporary files. Check your temporary directory.")
-        except AttributeError:
-            pass
+
+        #
+        # Don't cut off recordings that are still being finalized, moved
+        # into place or waiting to be saved.
+        #
+        self.finish_pending()
+        if self.movers or self.flushing or self.done_windows:
+            logger.info("Waiting for {0} recording(s) to finish.".format(len(self.movers) + len(self.flushing) +
+                                                                      len(self.done_windows)))
+            self.quit_pending = True
+            self.window.hide()
+            return
+
+        #
+        # The A/V sync and adaptation logs are left behind with the
+        # recording they belong to.
+        #
+        tempfile = getattr(self.recorder, "tempfile", None)
+        if tempfile:
+            for suffix in ["", ".mux"] + SIDECAR_SUFFIXES:
+                fname = "{0}{1}".format(tempfile, suffix)
+                if not os.path.exists(fname):
+                    continue
+                try:
+                    os.remove(fname)
+                except OSError:
+                    logger.info("Unable to delete {0}. Check your temporary directory.".format(fname))
 
         prefs.save_config()
 
+        self.meter_speakers.set_device(None)
+        self.meter_microphone.set_device(None)
         if prefs.sound:
             prefs.pa_q.end()
 
@@ -523,6 +630,8 @@ class KazamApp(GObject.GObject):
     def cb_preferences_request(self, indicator):
         logger.debug("Preferences requested.")
         self.preferences_window = Preferences()
+        self.preferences_window.connect("volume-changed", self.cb_volume_changed)
+        self.preferences_window.connect("prefs-quit", self.cb_prefs_quit)
         self.preferences_window.open()
 
     def cb_show_request(self, indicator):
@@ -565,8 +674,17 @@ class KazamApp(GObject.GObject):
         if self.main_mode == MODE_SCREENCAST:
             self.indicator.menuitem_finish.set_label(_("Finish recording"))
             self.indicator.menuitem_pause.set_sensitive(True)
+            self.indicator.menuitem_replay.set_sensitive(prefs.instant_replay)
             self.indicator.start_recording()
             self.recorder.start_recording()
+            self.last_stats = None
+            #
+            # The timer of the previous recording may not have noticed it
+            # ended yet.
+            #
+            if self.stats_timer_id:
+                GLib.source_remove(self.stats_timer_id)
+            self.stats_timer_id = GLib.timeout_add(STATS_INTERVAL, self.cb_stats_timer)
         elif self.main_mode == MODE_SCREENSHOT:
             self.indicator.hide_it()
             self.grabber.grab()
@@ -574,6 +692,7 @@ class KazamApp(GObject.GObject):
 
     def cb_stop_request(self, widget):
         self.recording = False
+        self.indicator.menuitem_replay.set_sensitive(False)
 
         if self.outline_window:
             self.outline_window.hide()
@@ -584,6 +703,11 @@ class KazamApp(GObject.GObject):
             logger.debug("Cancel countdown request.")
             self.countdown.cancel_countdown()
             self.countdown = None
+            self.in_countdown = False
+            if self.main_mode == MODE_SCREENCAST:
+                self.recorder.abort()
+                self.recorder = None
+            self.finish_pending()
             self.indicator.menuitem_finish.set_label(_("Finish recording"))
             self.window.set_sensitive(True)
             self.window.show()
@@ -593,36 +717,93 @@ class KazamApp(GObject.GObject):
                 self.recorder.unpause_recording()
             logger.debug("Stop request.")
             self.recorder.stop_recording()
+            if self.main_mode == MODE_SCREENCAST:
+                self.flushing.append(self.recorder)
             self.tempfile = self.recorder.get_tempfile()
             logger.debug("Recorded tmp file: {0}".format(self.tempfile))
             logger.debug("Waiting for data to flush.")
 
-    def cb_flush_done(self, widget):
-        if self.main_mode == MODE_SCREENCAST and prefs.autosave_video:
-            logger.debug("Autosaving enabled.")
-            fname = get_next_filename(prefs.autosave_video_dir,
-                                      prefs.autosave_video_file,
-                                      CODEC_LIST[prefs.codec][3])
-
-            shutil.move(self.tempfile, fname)
+            #
+            # Finalizing happens in the background, a new recording can be
+            # started right away.
+            #
+            if self.main_mode == MODE_SCREENCAST:
+                self.btn_record.set_visible(True)
+                self.btn_stop.set_visible(False)
+
+        self.update_level_meters()
+
+    def get_recording_stats(self):
+        if self.recording and self.main_mode == MODE_SCREENCAST and self.recorder and not self.in_countdown:
+            return self.recorder.get_stats()
+        return {}
+
+    def cb_stats_timer(self):
+        if not self.recording:
+            self.indicator.set_stats_text(None)
+            self.stats_timer_id = None
+            return False
+
+        stats = self.recorder.get_stats()
+        last = self.last_stats
+        self.last_stats = stats
+        if not last or "frames_out" not in stats:
+            return True
+
+        elapsed = stats["running_time"] - last["running_time"]
+        fps = (stats["frames_out"] - last["frames_out"]) / elapsed if elapsed > 0 else 0
+        text = _("{0:.1f} fps, {1} dropped, encoder queue {2:.0f}%, {3:.1f} MB").format(
+            fps,
+            stats["frames_dropped"],
+            stats.get("queue_v1_fill", 0),
+            stats["bytes_written"] / (1024 * 1024))
+        if stats.get("queue_v1_overruns"):
+            text += _(", capture queue full {0}x").format(stats["queue_v1_overruns"])
+        if "idle_skipped" in stats:
+            text += _(", {0:.0f}s idle skipped").format(stats["idle_skipped"])
+        if stats.get("adaptive_level"):
+            text += _(", quality step {0}/{1}").format(stats["adaptive_level"], stats["adaptive_steps"])
+        self.indicator.set_stats_text(text)
+        return True
+
+    def cb_replay_request(self, widget):
+        logger.debug("Instant replay requested.")
+        if not (self.recording and self.recorder and getattr(self.recorder, "replay_dir", None)):
+            logger.debug("No instant replay running.")
+            return
+        if prefs.autosave_video:
+            sdir = prefs.autosave_video_dir
+        else:
+            sdir = prefs.video_dest
+        fname = get_next_filename(sdir, "Kazam_replay", self.recorder.extension)
+        self.recorder.save_replay(fname)
 
-            self.window.set_sensitive(True)
-            self.window.show()
-            self.window.present()
-        elif self.main_mode == MODE_SCREENCAST:
-            self.done_recording = DoneRecording(self.icons,
-                                            self.tempfile,
-                                            prefs.codec,
-                                            self.old_vid_path)
-            logger.debug("Done Recording initialized.")
-            self.done_recording.connect("save-done", self.cb_save_done)
-            self.done_recording.connect("save-cancel", self.cb_save_cancel)
-            self.done_recording.connect("edit-request", self.cb_edit_request)
-            logger.debug("Done recording signals connected.")
-            self.done_recording.show_all()
-            self.window.set_sensitive(False)
+    def cb_replay_saved(self, widget, fname):
+        if fname:
+            logger.info("Instant replay saved to {0}".format(fname))
+        else:
+            logger.warning("Failed to save instant replay.")
 
-        elif self.main_mode == MODE_SCREENSHOT:
+    def cb_flush_done(self, widget):
+        #
+        # The widget is the recorder that finished, by now self.recorder
+        # may already belong to the next recording.
+        #
+        if isinstance(widget, Screencast):
+            if widget in self.flushing:
+                self.flushing.remove(widget)
+            if widget is not self.recorder and self.recording:
+                #
+                # Don't get in the way of the recording that is running,
+                # this one is offered when that one is finished.
+                #
+                logger.debug("Previous recording finalized, deferred.")
+                self.pending_flushes.append(widget)
+                return
+            self.finish_pending()
+            self.finish_recording(widget)
+            self.resume_quit()
+        else:
             if self.outline_window:
                 self.outline_window.hide()
                 self.outline_window.window.destroy()
@@ -643,9 +824,92 @@ class KazamApp(GObject.GObject):
                 self.grabber.autosave(fname)
             else:
                 self.grabber.save_capture(self.old_pic_path)
-                
-        self.btn_record.set_visible(True)
-        self.btn_stop.set_visible(False)
+
+            self.btn_record.set_visible(True)
+            self.btn_stop.set_visible(False)
+
+    def finish_pending(self):
+        while self.pending_flushes:
+            self.finish_recording(self.pending_flushes.pop(0))
+
+    def finish_recording(self, recorder):
+        if recorder.output_mode != OUTPUT_FILE:
+            #
+            # Nothing to save, replays and segments were already written
+            # out while recording.
+            #
+            logger.debug("Split recording finished.")
+            self.restore_window()
+        elif prefs.autosave_video:
+            logger.debug("Autosaving enabled.")
+            fname = get_next_filename(prefs.autosave_video_dir,
+                                      prefs.autosave_video_file,
+                                      recorder.extension)
+
+            self.move_file(recorder.get_tempfile(), fname)
+            self.restore_window()
+        else:
+            self.done_recording = DoneRecording(self.icons,
+                                            recorder.get_tempfile(),
+                                            recorder.extension,
+                                            self.old_vid_path)
+            logger.debug("Done Recording initialized.")
+            self.done_recording.connect("save-done", self.cb_save_done)
+            self.done_recording.connect("save-cancel", self.cb_save_cancel)
+            self.done_recording.connect("edit-request", self.cb_edit_request)
+            self.done_recording.connect("move-start", self.cb_move_start)
+            logger.debug("Done recording signals connected.")
+            self.done_windows.append(self.done_recording)
+            self.done_recording.show_all()
+            self.window.set_sensitive(False)
+
+    def resume_quit(self):
+        if self.quit_pending and not (self.movers or self.flushing or self.done_windows):
+            self.cb_quit_request(None)
+
+    def restore_window(self):
+        if self.recording:
+            return
+        self.window.set_sensitive(True)
+        self.window.show()
+        self.window.present()
+
+    def move_file(self, src, dest):
+        mover = FileMover(src, dest)
+        self.cb_move_start(None, mover)
+        mover.start()
+        return mover
+
+    def cb_move_start(self, widget, mover):
+        self.movers.append(mover)
+        mover.connect("move-done", self.cb_move_done)
+
+    def cb_move_done(self, mover, result):
+        if result:
+            logger.debug("Recording saved to {0}".format(result))
+            self.move_sidecars(mover.src, result)
+        else:
+            logger.warning("Unable to save recording {0}".format(mover.src))
+        self.movers.remove(mover)
+        self.resume_quit()
+
+    def move_sidecars(self, src, dest):
+        #
+        # A/V sync and adaptation logs follow the recording, they are small
+        # enough to be moved in the main loop.
+        #
+        for suffix in SIDECAR_SUFFIXES:
+            log = "{0}{1}".format(src, suffix)
+            if not os.path.isfile(log):
+                continue
+            try:
+                shutil.move(log, "{0}{1}".format(dest, suffix))
+            except (IOError, OSError):
+                logger.warning("Unable to move log {0}".format(log))
+
+    def cb_volume_changed(self, widget, source, gain):
+        if self.recorder and self.main_mode == MODE_SCREENCAST:
+            self.recorder.set_volume(source, gain)
 
     def cb_pause_request(self, widget):
         logger.debug("Pause requested.")
@@ -659,6 +923,9 @@ class KazamApp(GObject.GObject):
 
     def cb_save_done(self, widget, result):
         logger.debug("Save Done, result: {0}".format(result))
+        if widget in self.done_windows:
+            self.done_windows.remove(widget)
+            self.resume_quit()
         if self.main_mode == MODE_SCREENCAST:
             self.old_vid_path = result
         else:
@@ -671,13 +938,16 @@ class KazamApp(GObject.GObject):
 
     def cb_save_cancel(self, widget):
         try:
-            logger.debug("Save canceled, removing {0}".format(self.tempfile))
-            os.remove(self.tempfile)
+            logger.debug("Save canceled, removing {0}".format(widget.tempfile))
+            os.remove(widget.tempfile)
+            for suffix in SIDECAR_SUFFIXES:
+                if os.path.isfile("{0}{1}".format(widget.tempfile, suffix)):
+                    os.remove("{0}{1}".format(widget.tempfile, suffix))
         except OSError:
-            logger.info("Failed to remove tempfile {0}".format(self.tempfile))
-        except AttributeError:
-            logger.info("Failed to remove tempfile {0}".format(self.tempfile))
-            pass
+            logger.info("Failed to remove tempfile {0}".format(widget.tempfile))
+        if widget in self.done_windows:
+            self.done_windows.remove(widget)
+            self.resume_quit()
 
         self.window.set_sensitive(True)
         self.window.show_all()
@@ -695,17 +965,24 @@ class KazamApp(GObject.GObject):
         #
         fname = get_next_filename(prefs.video_dest,
                                   prefs.autosave_video_file,
-                                  CODEC_LIST[prefs.codec][3])
+                                  widget.extension)
 
-        shutil.move(self.tempfile, fname)
         arg_list.append(fname)
+        if widget in self.done_windows:
+            self.done_windows.remove(widget)
+        mover = self.move_file(widget.tempfile, fname)
+        mover.connect("move-done", self.cb_edit_moved, arg_list)
+        self.window.set_sensitive(True)
+        self.window.show_all()
+
+    def cb_edit_moved(self, mover, result, arg_list):
+        if not result:
+            return
         logger.debug("Edit request, cmd: {0}".format(arg_list))
         try:
             Popen(arg_list)
         except:
             logger.warning("Failed to open selected editor.")
-        self.window.set_sensitive(True)
-        self.window.show_all()
 
     def cb_check_cursor(self, widget):
         prefs.capture_cursor = widget.get_active()
@@ -722,10 +999,40 @@ class KazamApp(GObject.GObject):
     def cb_check_speakers(self, widget):
         prefs.capture_speakers = widget.get_active()
         logger.debug("Capture speakers: {0}.".format(prefs.capture_speakers))
+        self.update_level_meters()
 
     def cb_check_microphone(self, widget):
         prefs.capture_microphone = widget.get_active()
         logger.debug("Capture microphone: {0}.".format(prefs.capture_microphone))
+        self.update_level_meters()
+
+    def cb_window_mapped(self, widget):
+        self.update_level_meters()
+
+    def cb_sources_changed(self, pa_q):
+        self.chk_speakers.set_active(prefs.capture_speakers)
+        self.chk_microphone.set_active(prefs.capture_microphone)
+        self.update_level_meters()
+
+    def cb_prefs_quit(self, widget):
+        self.update_level_meters()
+
+    def update_level_meters(self):
+        #
+        # Meters share the sources with recordings, keep them off while
+        # recording or counting down and when nobody can see them.
+        #
+        active = (prefs.sound and self.main_mode == MODE_SCREENCAST and
+                  not self.recording and not self.in_countdown and
+                  self.window.get_mapped())
+        speakers = None
+        microphone = None
+        if active and prefs.capture_speakers:
+            speakers = prefs.get_source_name(prefs.speaker_sources, prefs.audio_source)
+        if active and prefs.capture_microphone:
+            microphone = prefs.get_source_name(prefs.mic_sources, prefs.audio2_source)
+        self.meter_speakers.set_device(speakers)
+        self.meter_microphone.set_device(microphone)
 
     def cb_spinbutton_delay_change(self, widget):
         prefs.countdown_timer = widget.get_value_as_int()
@@ -736,6 +1043,11 @@ class KazamApp(GObject.GObject):
     #
 
     def run_counter(self):
+        if self.main_mode == MODE_SCREENCAST and prefs.audio_only and \
+           not (prefs.sound and (prefs.capture_speakers or prefs.capture_microphone)):
+            logger.warning("Audio-only recording needs speakers or microphone enabled.")
+            return
+
         #
         # Annoyances with the menus
         #
@@ -789,15 +1101,23 @@ class KazamApp(GObject.GObject):
             screen = HW.get_current_screen(self.window)
             video_source = HW.screens[screen]
 
+        area = prefs.area if self.record_mode == MODE_AREA else None
+        xid = prefs.xid if self.record_mode == MODE_WIN else None
+
+        if self.main_mode == MODE_SCREENCAST and prefs.audio_only:
+            video_source = area = xid = None
+
         if self.main_mode == MODE_SCREENCAST:
             self.recorder = Screencast()
             self.recorder.setup_sources(video_source,
                                         audio_source,
                                         audio2_source,
-                                        prefs.area if self.record_mode == MODE_AREA else None,
-                                        prefs.xid if self.record_mode == MODE_WIN else None)
+                                        area,
+                                        xid)
 
             self.recorder.connect("flush-done", self.cb_flush_done)
+            self.recorder.connect("replay-saved", self.cb_replay_saved)
+            self.recorder.preroll()
 
         elif self.main_mode == MODE_SCREENSHOT:
             self.grabber = Grabber()
@@ -810,6 +1130,7 @@ class KazamApp(GObject.GObject):
         self.countdown.connect("counter-finished", self.cb_counter_finished)
         self.countdown.run(prefs.countdown_timer)
         self.recording = True
+        self.update_level_meters()
         self.btn_record.set_visible(False)
         self.btn_stop.set_visible(True)
         try:
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+#       adaptive.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import time
+import logging
+logger = logging.getLogger("Adaptive")
+
+from gi.repository import GLib, Gst
+
+from kazam.backend.prefs import prefs, CODEC_RAW, ADAPTIVE_INTERVAL, ADAPTIVE_HIGH_LAG, ADAPTIVE_LOW_LAG, \
+                                ADAPTIVE_HIGH_FILL, ADAPTIVE_DOWN_TICKS, ADAPTIVE_UP_TICKS, ADAPTIVE_MIN_FRAMERATE, \
+                                VFR_MUXERS
+
+ADAPT_LOG_HEADER = "time,wallclock,action,level,setting,value,lag_ms,queue_fill,fps_out\n"
+
+
+class AdaptiveController(object):
+    """Trades quality for speed while the video encoder can't keep up.
+
+    Every encoded frame is compared with the pipeline clock, how long it
+    took from capture to leaving the encoder, minus the latency the
+    encoder reports for itself, is the lag. Once every ADAPTIVE_INTERVAL
+    milliseconds the worst lag and the fill level of the capture queue are
+    checked. When either stays too high for ADAPTIVE_DOWN_TICKS the
+    controller goes one step down the ladder, after ADAPTIVE_UP_TICKS with
+    headroom it goes one step back up.
+
+    The ladder first makes the encoder faster, where the encoder allows
+    that while playing, then halves the framerate down to
+    ADAPTIVE_MIN_FRAMERATE. Frames are thinned out in front of videorate
+    and videorate is switched to drop-only, so it doesn't fill the gaps
+    with duplicates and fewer frames reach the encoder. The caps stay the
+    same, muxers never see a format change, but the result is variable
+    frame rate, framerate steps are only taken for muxers in VFR_MUXERS.
+    Every step is written to a CSV file next to the recording, with the
+    rate videorate passed on since the previous check.
+    """
+
+    def __init__(self, screencast, path=None):
+        self.screencast = screencast
+        self.pipeline = screencast.pipeline
+        self.path = path
+        self.fh = None
+        self.tick_id = None
+        self.level = 0
+        self.overloaded = 0
+        self.headroom = 0
+        self.lag = 0.0
+        self.max_lag = 0
+        self.fill = 0.0
+        self.encoder_latency = 0
+        self.min_interval = 0
+        self.last_frame = None
+        self.decimate_id = None
+        self.drop_only = False
+        self.videorate = screencast.videorate
+        self.last_out = 0
+        self.last_tick = None
+        self.fps = 0.0
+
+        if prefs.codec != CODEC_RAW:
+            self.encoder = screencast.videnc
+            self.encoded_pad = self.encoder.get_static_pad("src")
+        else:
+            self.encoder = None
+            self.encoded_pad = screencast.videoconvert.get_static_pad("src")
+        self.capture_pad = screencast.vid_in_queue.get_static_pad("src")
+        self.steps = self.get_steps()
+
+    def get_steps(self):
+        #
+        # Every step is (setting, setter, new value, old value). x264enc
+        # only reads its speed preset when it starts, it goes straight to
+        # the framerate steps.
+        #
+        steps = []
+        if self.encoder and self.encoder.get_factory().get_name() == "vp8enc":
+            deadline = self.encoder.get_property("deadline")
+            if deadline != 1:
+                steps.append(("deadline", self.set_encoder_property("deadline"), 1, deadline))
+            cpu_used = self.encoder.get_property("cpu-used")
+            for value in (cpu_used + 4, cpu_used + 8, 16):
+                if cpu_used < value <= 16:
+                    steps.append(("cpu-used", self.set_encoder_property("cpu-used"), value, cpu_used))
+                    cpu_used = value
+
+        muxer = self.screencast.mux.get_factory().get_name()
+        if muxer not in VFR_MUXERS:
+            logger.debug("{0} needs a constant frame rate, no framerate steps.".format(muxer))
+            return steps
+
+        rate = float(prefs.framerate)
+        while rate / 2 >= ADAPTIVE_MIN_FRAMERATE:
+            steps.append(("framerate", self.set_framerate, rate / 2, rate))
+            rate /= 2
+        return steps
+
+    def set_encoder_property(self, prop):
+        def setter(value):
+            self.encoder.set_property(prop, value)
+        return setter
+
+    def set_framerate(self, rate):
+        if rate >= prefs.framerate:
+            self.min_interval = 0
+            if self.decimate_id:
+                self.capture_pad.remove_probe(self.decimate_id)
+                self.decimate_id = None
+                self.videorate.set_property("drop-only", self.drop_only)
+            return
+        #
+        # A little under the frame interval, so capture jitter doesn't
+        # drop frames that should be kept.
+        #
+        self.min_interval = int(Gst.SECOND / rate * 0.9)
+        if not self.decimate_id:
+            self.last_frame = None
+            self.drop_only = self.videorate.get_property("drop-only")
+            self.videorate.set_property("drop-only", True)
+            self.decimate_id = self.capture_pad.add_probe(Gst.PadProbeType.BUFFER, self.cb_decimate, None)
+
+    def cb_decimate(self, pad, info, data):
+        pts = info.get_buffer().pts
+        if pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        if self.last_frame is not None and pts - self.last_frame < self.min_interval:
+            return Gst.PadProbeReturn.DROP
+        self.last_frame = pts
+        return Gst.PadProbeReturn.OK
+
+    def cb_encoded(self, pad, info, data):
+        pts = info.get_buffer().pts
+        running_time = self.get_running_time()
+        if pts != Gst.CLOCK_TIME_NONE and running_time is not None:
+            self.max_lag = max(self.max_lag, running_time - pts - self.encoder_latency)
+        return Gst.PadProbeReturn.OK
+
+    def start(self):
+        if self.path:
+            try:
+                self.fh = open(self.path, "w")
+                self.fh.write(ADAPT_LOG_HEADER)
+            except IOError:
+                logger.warning("Unable to write adaptation log {0}".format(self.path))
+                self.fh = None
+        self.encoded_pad.add_probe(Gst.PadProbeType.BUFFER, self.cb_encoded, None)
+        self.tick_id = GLib.timeout_add(ADAPTIVE_INTERVAL, self.cb_tick)
+        logger.debug("Adaptive controller started, {0} steps, log: {1}".format(len(self.steps), self.path))
+        self.log("start", "", "")
+
+    def stop(self):
+        if self.tick_id:
+            GLib.source_remove(self.tick_id)
+            self.tick_id = None
+            self.log("stop", "", "")
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+
+    def cb_tick(self):
+        if self.encoder:
+            self.encoder_latency = int(self.screencast.get_element_latency(self.encoder) * Gst.SECOND)
+        self.lag = max(0, self.max_lag) / Gst.MSECOND
+        self.max_lag = 0
+        #
+        # A single frame of a large screen can fill the queue up to its
+        # byte limit, that alone is no backlog.
+        #
+        queue = self.screencast.vid_in_queue
+        self.fill = self.screencast.get_queue_fill(queue)
+
+        now = time.monotonic()
+        out = self.videorate.get_property("out")
+        if self.last_tick is not None and now > self.last_tick:
+            self.fps = (out - self.last_out) / (now - self.last_tick)
+        (self.last_out, self.last_tick) = (out, now)
+        backlog = self.fill >= ADAPTIVE_HIGH_FILL and queue.get_property("current-level-buffers") > 1
+
+        if self.lag > ADAPTIVE_HIGH_LAG or backlog:
+            self.overloaded += 1
+            self.headroom = 0
+        elif self.lag < ADAPTIVE_LOW_LAG:
+            self.headroom += 1
+            self.overloaded = 0
+        else:
+            self.overloaded = 0
+            self.headroom = 0
+
+        if self.overloaded >= ADAPTIVE_DOWN_TICKS and self.level < len(self.steps):
+            (setting, setter, value, old) = self.steps[self.level]
+            setter(value)
+            self.level += 1
+            self.overloaded = 0
+            logger.info("Encoder {0:.0f}ms behind, {1} set to {2}.".format(self.lag, setting, value))
+            self.log("down", setting, value)
+        elif self.headroom >= ADAPTIVE_UP_TICKS and self.level > 0:
+            self.level -= 1
+            (setting, setter, value, old) = self.steps[self.level]
+            setter(old)
+            self.headroom = 0
+            logger.info("Encoder keeping up, {0} back to {1}.".format(setting, old))
+            self.log("up", setting, old)
+        return True
+
+    def get_running_time(self):
+        clock = self.pipeline.get_clock()
+        if not clock:
+            return None
+        return clock.get_time() - self.pipeline.get_base_time()
+
+    def log(self, action, setting, value):
+        if not self.fh:
+            return
+        running_time = self.get_running_time() or 0
+        self.fh.write("{0:.3f},{1},{2},{3},{4},{5},{6:.1f},{7:.1f},{8:.1f}\n".format(
+                      running_time / Gst.SECOND,
+                      time.strftime("%Y-%m-%dT%H:%M:%S"),
+                      action,
+                      self.level,
+                      setting,
+                      value,
+                      self.lag,
+                      self.fill,
+                      self.fps))
+        self.fh.flush()
+
+    def get_stats(self):
+        return {"adaptive_level": self.level,
+                "adaptive_steps": len(self.steps),
+                "adaptive_lag": self.lag / 1000,
+                "adaptive_fps": self.fps}
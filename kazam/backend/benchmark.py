@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+#
+#       benchmark.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+#
+# Encoder throughput benchmark. Every case runs the real Screencast pipeline
+# with the test video source in a freshly spawned process, so CPU time and
+# peak memory are not polluted by the previous runs.
+#
+# Audio latency profiles are measured the same way, with a plain pulsesrc
+# pipeline on a real PulseAudio source.
+#
+# Variable frame rate needs real screen changes. With the screen as the
+# source, the constant and variable frame rate runs of a case record at the
+# same time, so both see the same session.
+#
+
+import os
+import time
+import shutil
+import logging
+import platform
+import resource
+import tempfile
+import multiprocessing
+
+logger = logging.getLogger("Benchmark")
+
+DEFAULT_RESOLUTIONS = [(1280, 720), (1920, 1080)]
+DEFAULT_FRAMERATES = [15, 30]
+DEFAULT_DURATION = 10
+DEFAULT_AUDIO_MODES = ["none"]
+DEFAULT_AUDIO_CODECS = [0]
+DEFAULT_PRESETS = [0]
+
+#
+# Audio modes, number of test sources and whether they go into separate
+# tracks.
+#
+AUDIO_MODES = {"none": (0, False),
+               "mixed": (2, False),
+               "tracks": (2, True)}
+
+
+def parse_resolution(value):
+    (width, height) = value.lower().split("x")
+    return (int(width), int(height))
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_case(case, result_q):
+    """Records a single benchmark case and puts the results in result_q.
+
+    Args:
+        case: dictionary with codec, width, height, framerate, duration,
+              pattern, preset, audio, audio_codec, source, vfr and output
+              keys, output is the (width, height) to scale to or None.
+        result_q: multiprocessing queue for the results.
+
+    Returns:
+        None
+
+    Raises:
+        None
+    """
+    from gi.repository import GLib, Gst
+    from kazam.backend.prefs import prefs, CODEC_LIST, AUDIO_CODEC_LIST, ENCODER_PRESETS, PRESET_ENCODERS, \
+                                    CODEC_RAW, get_audio_codec
+
+    workdir = tempfile.mkdtemp(prefix="kazam_bench_")
+    prefs.test = case["source"] == "test"
+    prefs.test_audio = True
+    prefs.vfr = case["vfr"]
+    prefs.sound = False
+    prefs.capture_damage = False
+    prefs.idle_pause = False
+    prefs.adaptive = False
+    prefs.instant_replay = False
+    prefs.segment_recording = False
+    (audio_sources, prefs.separate_tracks) = AUDIO_MODES[case["audio"]]
+    prefs.codec = case["codec"]
+    prefs.encoder_preset = case["preset"]
+    prefs.audio_codec = case["audio_codec"]
+    prefs.framerate = case["framerate"]
+    prefs.video_dest = workdir
+    (prefs.output_width, prefs.output_height) = case["output"] or (0, 0)
+
+    from kazam.backend.gstreamer import Screencast
+
+    result = dict(case)
+    result["codec_name"] = CODEC_LIST[case["codec"]][2]
+    if CODEC_LIST[case["codec"]][1] in PRESET_ENCODERS:
+        result["preset_name"] = ENCODER_PRESETS[case["preset"]][2]
+    if audio_sources:
+        result["audio_codec_name"] = AUDIO_CODEC_LIST[get_audio_codec(case["codec"])][2]
+    loop = GLib.MainLoop()
+    recorder = Screencast()
+    #
+    # With test_audio the audio sources are audiotestsrc, device names only
+    # need to be set.
+    #
+    recorder.setup_sources({"x": 0, "y": 0, "width": case["width"], "height": case["height"]},
+                           "test_speakers" if audio_sources > 0 else None,
+                           "test_mic" if audio_sources > 1 else None,
+                           None, None)
+    if prefs.test:
+        recorder.videosrc.set_property("pattern", case["pattern"])
+
+    #
+    # videorate always puts out the configured framerate, the encoder
+    # output is what the machine actually sustained.
+    #
+    encoded = {"frames": 0}
+
+    def cb_encoded(pad, info, data):
+        encoded["frames"] += 1
+        return Gst.PadProbeReturn.OK
+
+    encoder = recorder.videoconvert if case["codec"] == CODEC_RAW else recorder.videnc
+    encoder.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, cb_encoded, None)
+
+    def cb_stop():
+        result["elapsed"] = time.monotonic() - start_wall
+        result["cpu_time"] = cpu_time() - start_cpu
+        result["frames_in"] = recorder.videorate.get_property("in")
+        result["frames_out"] = recorder.videorate.get_property("out")
+        result["frames_dropped"] = recorder.videorate.get_property("drop")
+        result["frames_duplicated"] = recorder.videorate.get_property("duplicate")
+        result["frames_encoded"] = encoded["frames"]
+        if recorder.vfr_filter:
+            result["frames_skipped"] = recorder.vfr_filter.frames_skipped
+        if recorder.videoscale:
+            result["output_width"] = recorder.output_size[0]
+            result["output_height"] = recorder.output_size[1]
+        result["stop_time"] = time.monotonic()
+        recorder.stop_recording()
+        return False
+
+    def cb_flush_done(widget):
+        result["finalize_time"] = time.monotonic() - result.pop("stop_time")
+        loop.quit()
+
+    def cb_error(bus, message):
+        result["error"] = message.parse_error()[1]
+        loop.quit()
+
+    recorder.connect("flush-done", cb_flush_done)
+    recorder.bus.connect("message::error", cb_error)
+
+    start_wall = time.monotonic()
+    start_cpu = cpu_time()
+    recorder.start_recording()
+    GLib.timeout_add(int(case["duration"] * 1000), cb_stop)
+    loop.run()
+
+    if "error" not in result:
+        size = os.path.getsize(recorder.get_tempfile())
+        result["bytes"] = size
+        result["fps"] = result["frames_encoded"] / result["elapsed"]
+        result["bitrate"] = int(size * 8 / result["elapsed"])
+        result["cpu_percent"] = 100.0 * result["cpu_time"] / result["elapsed"]
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    result_q.put(result)
+
+
+def run_audio_case(case, result_q):
+    """Records from a PulseAudio source with one latency profile.
+
+    Nothing is written, encoded audio goes to a synchronised fakesink so
+    the source is drained in real time, like in a recording.
+
+    Args:
+        case: dictionary with device, profile, audio_codec and duration
+              keys.
+        result_q: multiprocessing queue for the results.
+
+    Returns:
+        None
+
+    Raises:
+        None
+    """
+    from gi.repository import GLib, Gst
+    from kazam.backend.prefs import AUDIO_LATENCY_PROFILES, AUDIO_CODEC_LIST
+
+    Gst.init(None)
+    (num, desc, buffer_time, latency_time) = AUDIO_LATENCY_PROFILES[case["profile"]]
+    codec = AUDIO_CODEC_LIST[case["audio_codec"]]
+    result = dict(case)
+    result["profile_name"] = desc
+    result["buffer_time"] = buffer_time
+    result["latency_time"] = latency_time
+    counts = {"buffers": 0, "xruns": 0}
+
+    pipeline = Gst.parse_launch("pulsesrc name=src ! queue ! audioconvert ! audioresample ! "
+                                "{0} name=enc ! fakesink sync=true".format(codec[1]))
+    src = pipeline.get_by_name("src")
+    src.set_property("device", case["device"])
+    src.set_property("buffer-time", buffer_time)
+    src.set_property("latency-time", latency_time)
+    for (prop, value) in codec[3].items():
+        Gst.util_set_object_arg(pipeline.get_by_name("enc"), prop, value)
+
+    def cb_buffer(pad, info, data):
+        #
+        # Every buffer is one read from PulseAudio, a discontinuity after
+        # the first one means samples were lost.
+        #
+        if counts["buffers"] and info.get_buffer().has_flags(Gst.BufferFlags.DISCONT):
+            counts["xruns"] += 1
+        counts["buffers"] += 1
+        return Gst.PadProbeReturn.OK
+
+    src.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, cb_buffer, None)
+    loop = GLib.MainLoop()
+
+    def cb_stop():
+        result["elapsed"] = time.monotonic() - start_wall
+        result["cpu_time"] = cpu_time() - start_cpu
+        query = Gst.Query.new_latency()
+        if pipeline.query(query):
+            result["latency_ms"] = query.parse_latency()[1] / Gst.MSECOND
+        loop.quit()
+        return False
+
+    def cb_error(bus, message):
+        result["error"] = message.parse_error()[1]
+        loop.quit()
+
+    bus = pipeline.get_bus()
+    bus.add_signal_watch()
+    bus.connect("message::error", cb_error)
+
+    start_wall = time.monotonic()
+    start_cpu = cpu_time()
+    pipeline.set_state(Gst.State.PLAYING)
+    GLib.timeout_add(int(case["duration"] * 1000), cb_stop)
+    loop.run()
+    pipeline.set_state(Gst.State.NULL)
+
+    if "error" not in result:
+        result["buffers"] = counts["buffers"]
+        result["xruns"] = counts["xruns"]
+        result["wakeups_per_sec"] = counts["buffers"] / result["elapsed"]
+        result["cpu_percent"] = 100.0 * result["cpu_time"] / result["elapsed"]
+    result_q.put(result)
+
+
+def run_audio_profiles(device, profiles, duration=DEFAULT_DURATION, audio_codec=0):
+    """Measures every pulsesrc latency profile on a PulseAudio source.
+
+    Returns:
+        Dictionary with information about the machine and a list of
+        results, one for each profile.
+    """
+    report = machine_info()
+    cases = [{"device": device,
+              "profile": profile,
+              "audio_codec": audio_codec,
+              "duration": duration} for profile in profiles]
+    report["results"] = [run_process(run_audio_case, case, duration) for case in cases]
+    return report
+
+
+def machine_info():
+    from gi.repository import Gst
+    from kazam.version import VERSION
+
+    Gst.init(None)
+    return {"kazam": VERSION,
+            "gstreamer": Gst.version_string(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpus": multiprocessing.cpu_count(),
+            "results": []}
+
+
+def start_process(target, case):
+    ctx = multiprocessing.get_context("spawn")
+    logger.info("Running: {0}".format(case))
+    result_q = ctx.Queue()
+    proc = ctx.Process(target=target, args=(case, result_q))
+    proc.start()
+    return (proc, result_q)
+
+
+def wait_process(proc, result_q, case, duration):
+    try:
+        result = result_q.get(timeout=duration * 4 + 30)
+    except Exception:
+        result = dict(case)
+        result["error"] = "Benchmark case timed out."
+        proc.terminate()
+    proc.join()
+    logger.info("Result: {0}".format(result))
+    return result
+
+
+def run_process(target, case, duration):
+    (proc, result_q) = start_process(target, case)
+    return wait_process(proc, result_q, case, duration)
+
+
+def run_vfr_pair(case, duration):
+    """Runs a case at constant and at variable frame rate.
+
+    Screen recordings run side by side, so both record the same screen
+    changes. The VFR result gets frames and bytes relative to CFR.
+    """
+    cases = [dict(case, vfr=False), dict(case, vfr=True)]
+    if case["source"] == "screen":
+        procs = [start_process(run_case, c) for c in cases]
+        (cfr, vfr) = [wait_process(proc, result_q, c, duration) for ((proc, result_q), c) in zip(procs, cases)]
+    else:
+        (cfr, vfr) = [run_process(run_case, c, duration) for c in cases]
+
+    if cfr.get("frames_out") and cfr.get("bytes"):
+        if "frames_out" in vfr:
+            vfr["frames_vs_cfr"] = vfr["frames_out"] / cfr["frames_out"]
+        if "bytes" in vfr:
+            vfr["bytes_vs_cfr"] = vfr["bytes"] / cfr["bytes"]
+    return [cfr, vfr]
+
+
+def run_scale_pair(case, output, duration):
+    """Runs a case at its own size and scaled down to fit output.
+
+    The scaled result gets CPU time, bytes and frames per second relative
+    to the native one, the encode cost saved by scaling while recording.
+    """
+    (native, scaled) = [run_process(run_case, c, duration) for c in (case, dict(case, output=output))]
+    if native.get("cpu_time") and native.get("bytes") and "error" not in scaled:
+        scaled["cpu_vs_native"] = scaled["cpu_time"] / native["cpu_time"]
+        scaled["bytes_vs_native"] = scaled["bytes"] / native["bytes"]
+        scaled["fps_vs_native"] = scaled["fps"] / native["fps"] if native["fps"] else 0.0
+    return [native, scaled]
+
+
+def run_matrix(codecs, resolutions, framerates, duration=DEFAULT_DURATION, pattern="smpte",
+               audio_modes=DEFAULT_AUDIO_MODES, audio_codecs=DEFAULT_AUDIO_CODECS,
+               source="test", vfr=False, presets=DEFAULT_PRESETS, output=None):
+    """Runs every combination of codecs, presets, resolutions, framerates and audio settings.
+
+    Audio codecs are only varied for cases that record audio and presets
+    only for encoders that have them. With vfr every case is recorded at
+    constant and at variable frame rate, with output at its own size and
+    scaled down to fit output. With both, both pairs are run.
+
+    Returns:
+        Dictionary with information about the machine and a list of
+        results, one for each case.
+    """
+    from kazam.backend.prefs import CODEC_LIST, PRESET_ENCODERS
+
+    report = machine_info()
+    cases = []
+    for codec in codecs:
+        codec_presets = presets if CODEC_LIST[codec][1] in PRESET_ENCODERS else presets[:1]
+        for preset in codec_presets:
+            for (width, height) in resolutions:
+                for framerate in framerates:
+                    for audio in audio_modes:
+                        for audio_codec in (audio_codecs if audio != "none" else audio_codecs[:1]):
+                            cases.append({"codec": codec,
+                                          "preset": preset,
+                                          "width": width,
+                                          "height": height,
+                                          "framerate": framerate,
+                                          "duration": duration,
+                                          "pattern": pattern,
+                                          "audio": audio,
+                                          "audio_codec": audio_codec,
+                                          "source": source,
+                                          "vfr": False,
+                                          "output": None})
+
+    for case in cases:
+        if vfr:
+            report["results"].extend(run_vfr_pair(case, duration))
+        if output:
+            report["results"].extend(run_scale_pair(case, output, duration))
+        if not (vfr or output):
+            report["results"].append(run_process(run_case, case, duration))
+    return report
@@ -33,13 +33,40 @@ class KazamConfig(ConfigParser):
                          "video_source":          "0",
                          "audio_toggled":         "False",
                          "audio_source":          "0",
-                         "audio_volume":          "0",
                          "audio2_toggled":        "False",
                          "audio2_source":         "0",
-                         "audio2_volume":         "0",
+                         "audio_gain":            "1.0",
+                         "audio2_gain":           "1.0",
+                         "audio_profile":         "1",
+                         "audio2_profile":        "1",
                          "codec":                 "0",
                          "counter":               "5",
                          "capture_cursor":        "True",
+                         "capture_damage":        "False",
+                         "instant_replay":        "False",
+                         "replay_seconds":        "30",
+                         "replay_in_memory":      "False",
+                         "crash_safe":            "False",
+                         "segment_recording":     "False",
+                         "segment_seconds":       "600",
+                         "segment_size_mb":       "0",
+                         "segment_max_files":     "0",
+                         "separate_tracks":       "False",
+                         "audio_codec":           "0",
+                         "audio_only":            "False",
+                         "sync_log":              "False",
+                         "sync_compensate":       "False",
+                         "idle_pause":            "False",
+                         "idle_timeout":          "10",
+                         "idle_level":            "-50",
+                         "vfr":                   "False",
+                         "vfr_min_interval":      "0",
+                         "vfr_max_interval":      "1000",
+                         "encoder_preset":        "0",
+                         "adaptive":              "False",
+                         "queue_memory_limit":    "512",
+                         "output_width":          "0",
+                         "output_height":         "0",
                          "capture_microphone":    "False",
                          "capture_speakers":      "False",
                          "capture_cursor_pic":    "True",
@@ -61,6 +88,53 @@ class KazamConfig(ConfigParser):
                          "first_run":              "True",
                          },
                 },
+                #
+                # Encoder presets, element properties as they would be
+                # given to gst-launch. Threads are always set to match the
+                # number of cores.
+                #
+                {"name": "preset_default",
+                 "keys": {"x264enc": "speed-preset=ultrafast pass=quant quantizer=15",
+                          "vp8enc":  "cpu-used=2 end-usage=vbr target-bitrate=800000000 static-threshold=1000 "
+                                     "token-partitions=4 max-quantizer=30",
+                          },
+                 },
+                {"name": "preset_still",
+                 "keys": {"x264enc": "speed-preset=veryfast tune=stillimage pass=qual quantizer=20",
+                          "vp8enc":  "cpu-used=4 deadline=1 end-usage=cq cq-level=10 target-bitrate=20000000 "
+                                     "static-threshold=100 min-quantizer=4 max-quantizer=24",
+                          },
+                 },
+                {"name": "preset_long_gop",
+                 "keys": {"x264enc": "speed-preset=superfast pass=qual quantizer=21 key-int-max=600 "
+                                     "option-string=scenecut=40:min-keyint=15",
+                          "vp8enc":  "cpu-used=4 deadline=1 end-usage=vbr target-bitrate=4000000 "
+                                     "keyframe-mode=auto keyframe-max-dist=600 max-quantizer=40",
+                          },
+                 },
+                {"name": "preset_text",
+                 "keys": {"x264enc": "speed-preset=veryfast psy-tune=animation pass=qual quantizer=14 "
+                                     "option-string=deblock=-2,-2:aq-mode=2",
+                          "vp8enc":  "cpu-used=3 deadline=1 end-usage=cq cq-level=4 target-bitrate=40000000 "
+                                     "sharpness=7 noise-sensitivity=0 min-quantizer=0 max-quantizer=16",
+                          },
+                 },
+                #
+                # Queue limits in megabytes and milliseconds, 0 is no
+                # limit. Leaky is no, upstream (drop new buffers) or
+                # downstream (drop old buffers) and works only on queues
+                # that carry raw frames or samples.
+                #
+                {"name": "queues",
+                 "keys": {"queue_v1":     "mb=256 ms=1000 leaky=downstream",
+                          "queue_v2":     "mb=32 ms=2000 leaky=no",
+                          "queue_a_in":   "mb=4 ms=2000 leaky=no",
+                          "queue_a2_in":  "mb=4 ms=2000 leaky=no",
+                          "queue_a_out":  "mb=2 ms=2000 leaky=no",
+                          "queue_a2_out": "mb=2 ms=2000 leaky=no",
+                          "queue_file":   "mb=32 ms=0 leaky=no",
+                          },
+                 },
                 {"name": "keyboard_shortcuts",
                  "keys": {"pause":  "<Shift><Control>p",
                           "finish": "<Shift><Control>f",
@@ -122,6 +196,8 @@ class KazamConfig(ConfigParser):
     def set(self, section, option, value):
         # If the section referred to doesn't exist (rare case),
         # then create it
+        if not self.has_section(section):
+            self.add_section(section)
         super().set(section, option, str(value))
 
     def write(self):
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+#
+#       damage.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import logging
+logger = logging.getLogger("Damage")
+
+from ctypes import *
+from gi.repository import GObject, GLib
+
+try:
+    X11 = CDLL("libX11.so.6")
+    XDAMAGE = CDLL("libXdamage.so.1")
+except OSError:
+    X11 = None
+    XDAMAGE = None
+
+#
+# XDamage constants
+#
+XDamageNotify = 0
+XDamageReportBoundingBox = 2
+
+Display = c_void_p
+XID = c_ulong
+
+
+class XRectangle(Structure):
+    _fields_ = [
+        ('x', c_short),
+        ('y', c_short),
+        ('width', c_ushort),
+        ('height', c_ushort),
+    ]
+
+
+class XDamageNotifyEvent(Structure):
+    _fields_ = [
+        ('type', c_int),
+        ('serial', c_ulong),
+        ('send_event', c_int),
+        ('display', Display),
+        ('drawable', XID),
+        ('damage', XID),
+        ('level', c_int),
+        ('more', c_int),
+        ('timestamp', c_ulong),
+        ('area', XRectangle),
+        ('geometry', XRectangle),
+    ]
+
+
+class XEvent(Union):
+    _fields_ = [
+        ('type', c_int),
+        ('pad', c_long * 24),
+    ]
+
+if X11 and XDAMAGE:
+    X11.XOpenDisplay.restype = Display
+    X11.XOpenDisplay.argtypes = [c_char_p]
+    X11.XCloseDisplay.argtypes = [Display]
+    X11.XDefaultRootWindow.restype = XID
+    X11.XDefaultRootWindow.argtypes = [Display]
+    X11.XConnectionNumber.restype = c_int
+    X11.XConnectionNumber.argtypes = [Display]
+    X11.XPending.restype = c_int
+    X11.XPending.argtypes = [Display]
+    X11.XNextEvent.argtypes = [Display, POINTER(XEvent)]
+    X11.XFlush.argtypes = [Display]
+
+    XDAMAGE.XDamageQueryExtension.restype = c_int
+    XDAMAGE.XDamageQueryExtension.argtypes = [Display, POINTER(c_int), POINTER(c_int)]
+    XDAMAGE.XDamageCreate.restype = XID
+    XDAMAGE.XDamageCreate.argtypes = [Display, XID, c_int]
+    XDAMAGE.XDamageDestroy.argtypes = [Display, XID]
+    XDAMAGE.XDamageSubtract.argtypes = [Display, XID, XID, XID]
+
+
+class DamageMonitor(GObject.GObject):
+    """Tracks which parts of the capture area actually change.
+
+    Opens a private X connection and listens for XDamage events on the
+    captured drawable. When a window is captured, area coordinates are
+    relative to that window. Events are read from the X socket in the
+    GLib main loop, the bounding box of each batch is clipped to the
+    capture area and counted. This gives the number of pixels that a damage-driven
+    ximagesrc has to copy, as opposed to full frame grabs.
+    """
+    __gsignals__ = {"damage": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (GObject.TYPE_PYOBJECT,),),
+                    }
+
+    def __init__(self, x, y, width, height, xid=None):
+        GObject.GObject.__init__(self)
+        self.area = (x, y, width, height)
+        self.xid = xid
+        self.dpy = None
+        self.damage = None
+        self.watch_id = None
+        self.tick_id = None
+        self.event_base = c_int(0)
+        self.error_base = c_int(0)
+
+        self.damaged_pixels = 0
+        self.damaged_pixels_sec = 0
+        self.last_damaged_pixels = 0
+
+    def start(self):
+        if not X11 or not XDAMAGE:
+            logger.warning("XDamage library not found, damage statistics disabled.")
+            return False
+
+        self.dpy = X11.XOpenDisplay(None)
+        if not self.dpy:
+            logger.warning("Unable to open X display, damage statistics disabled.")
+            return False
+
+        if not XDAMAGE.XDamageQueryExtension(self.dpy, byref(self.event_base), byref(self.error_base)):
+            logger.warning("XDamage extension not available, damage statistics disabled.")
+            X11.XCloseDisplay(self.dpy)
+            self.dpy = None
+            return False
+
+        drawable = self.xid if self.xid else X11.XDefaultRootWindow(self.dpy)
+        self.damage = XDAMAGE.XDamageCreate(self.dpy, drawable, XDamageReportBoundingBox)
+        X11.XFlush(self.dpy)
+
+        fd = X11.XConnectionNumber(self.dpy)
+        self.watch_id = GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.cb_x_events)
+        self.tick_id = GLib.timeout_add_seconds(1, self.cb_tick)
+        logger.debug("Damage monitor started for area {0}.".format(self.area))
+        return True
+
+    def stop(self):
+        if self.watch_id:
+            GLib.source_remove(self.watch_id)
+            self.watch_id = None
+        if self.tick_id:
+            GLib.source_remove(self.tick_id)
+            self.tick_id = None
+        if self.dpy:
+            XDAMAGE.XDamageDestroy(self.dpy, self.damage)
+            X11.XCloseDisplay(self.dpy)
+            self.dpy = None
+            self.damage = None
+            logger.debug("Damage monitor stopped, {0} pixels damaged in total.".format(self.damaged_pixels))
+
+    def cb_x_events(self, fd, condition):
+        x1 = y1 = None
+        x2 = y2 = 0
+        event = XEvent()
+        while X11.XPending(self.dpy):
+            X11.XNextEvent(self.dpy, byref(event))
+            if event.type != self.event_base.value + XDamageNotify:
+                continue
+            area = cast(byref(event), POINTER(XDamageNotifyEvent)).contents.area
+            x1 = area.x if x1 is None else min(x1, area.x)
+            y1 = area.y if y1 is None else min(y1, area.y)
+            x2 = max(x2, area.x + area.width)
+            y2 = max(y2, area.y + area.height)
+
+        if x1 is not None:
+            XDAMAGE.XDamageSubtract(self.dpy, self.damage, 0, 0)
+            X11.XFlush(self.dpy)
+            pixels = self.clip(x1, y1, x2, y2)
+            if pixels:
+                self.damaged_pixels += pixels
+                self.emit("damage", pixels)
+        return True
+
+    def clip(self, x1, y1, x2, y2):
+        (ax, ay, aw, ah) = self.area
+        w = min(x2, ax + aw) - max(x1, ax)
+        h = min(y2, ay + ah) - max(y1, ay)
+        if w <= 0 or h <= 0:
+            return 0
+        return w * h
+
+    def cb_tick(self):
+        self.damaged_pixels_sec = self.damaged_pixels - self.last_damaged_pixels
+        self.last_damaged_pixels = self.damaged_pixels
+        return True
+
+    def get_stats(self):
+        return {"area_pixels": self.area[2] * self.area[3],
+                "damaged_pixels": self.damaged_pixels,
+                "damaged_pixels_sec": self.damaged_pixels_sec}
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+#       filemover.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import os
+import time
+import errno
+import shutil
+import logging
+import threading
+logger = logging.getLogger("FileMover")
+
+from gi.repository import GObject, GLib
+
+# Copy chunk size and the minimum time between progress updates
+MOVE_CHUNK_SIZE = 1024 * 1024
+MOVE_PROGRESS_INTERVAL = 0.1
+
+
+class FileMover(GObject.GObject):
+    """Moves a finished recording without blocking the main loop.
+
+    A rename is tried first. When the destination is on another
+    filesystem the file is copied in a thread, "progress" is emitted with
+    the copied fraction and "move-done" with the destination path, or None
+    if the move failed. Both are emitted from the main loop.
+    """
+    __gsignals__ = {"progress": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (GObject.TYPE_FLOAT,),),
+                    "move-done": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (GObject.TYPE_PYOBJECT,),),
+                    }
+
+    def __init__(self, src, dest):
+        GObject.GObject.__init__(self)
+        self.src = src
+        self.dest = dest
+        self.thread = None
+
+    def start(self):
+        try:
+            os.rename(self.src, self.dest)
+            logger.debug("Renamed {0} to {1}".format(self.src, self.dest))
+            GLib.idle_add(self.finish, self.dest)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                logger.warning("Unable to move {0} to {1}: {2}".format(self.src, self.dest, e))
+                GLib.idle_add(self.finish, None)
+                return
+
+        logger.debug("Copying {0} to {1}".format(self.src, self.dest))
+        self.thread = threading.Thread(target=self.copy)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def copy(self):
+        try:
+            total = os.path.getsize(self.src) or 1
+            copied = 0
+            last = 0
+            with open(self.src, "rb") as fsrc, open(self.dest, "wb") as fdst:
+                while True:
+                    chunk = fsrc.read(MOVE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    fdst.write(chunk)
+                    copied += len(chunk)
+                    now = time.monotonic()
+                    if now - last > MOVE_PROGRESS_INTERVAL:
+                        last = now
+                        GLib.idle_add(self.emit, "progress", copied / total)
+            shutil.copystat(self.src, self.dest)
+            os.remove(self.src)
+        except (IOError, OSError) as e:
+            logger.warning("Unable to copy {0} to {1}: {2}".format(self.src, self.dest, e))
+            try:
+                os.remove(self.dest)
+            except OSError:
+                pass
+            GLib.idle_add(self.finish, None)
+            return
+
+        GLib.idle_add(self.finish, self.dest)
+
+    def finish(self, result):
+        self.emit("move-done", result)
+        return False
@@ -24,7 +24,11 @@ import gi
 import logging
 logger = logging.getLogger("GStreamer")
 
+import time
+import fcntl
+import shutil
 import tempfile
+import threading
 import multiprocessing
 
 #
@@ -37,6 +41,13 @@ gi.require_version('Gst', '1.0')
 from gi.repository import GObject, Gst
 
 from kazam.backend.prefs import *
+from kazam.backend.damage import DamageMonitor
+from kazam.backend.remux import Remuxer
+from kazam.backend.sync import SyncMonitor
+from kazam.backend.idle import IdleGate
+from kazam.backend.vfr import FrameFilter
+from kazam.backend.adaptive import AdaptiveController
+from kazam.utils import fit_size
 
 
 GObject.threads_init()
@@ -51,17 +62,63 @@ class Screencast(GObject.GObject):
     __gsignals__ = {"flush-done": (GObject.SIGNAL_RUN_LAST,
                     None,
                     (),),
+                    "replay-saved": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (GObject.TYPE_PYOBJECT,),),
                     }
 
     def __init__(self):
         GObject.GObject.__init__(self)
         self.temp_fh = tempfile.mkstemp(prefix="kazam_", dir=prefs.video_dest, suffix=".movie")
         self.tempfile = self.temp_fh[1]
+        #
+        # Held as long as the tempfile is in use, recovery skips locked
+        # tempfiles.
+        #
+        fcntl.flock(self.temp_fh[0], fcntl.LOCK_EX)
         self.muxer_tempfile = "{0}.mux".format(self.tempfile)
         self.pipeline = Gst.Pipeline()
         self.area = None
         self.xid = None
         self.crop_vid = False
+        self.damage_monitor = None
+        self.replay_dir = None
+        self.replay_lock = None
+        self.replay_fragments = []
+        self.replay_save = None
+        self.segment_location = None
+        self.segments = []
+        self.start_time = None
+        self.start_latency = None
+        self.audio_levels = {}
+        self.logged_conversions = {}
+        self.sync_monitor = None
+        self.sync_log = None
+        self.idle_gate = None
+        self.vfr_filter = None
+        self.adaptive = None
+        self.adapt_log = None
+        self.queues = []
+        self.queue_overruns = {}
+        self.queue_lock = threading.Lock()
+        self.capture_size = None
+        self.output_size = None
+        self.videoscale = None
+
+        if prefs.instant_replay:
+            self.output_mode = OUTPUT_REPLAY
+        elif prefs.segment_recording:
+            self.output_mode = OUTPUT_SEGMENTS
+        else:
+            self.output_mode = OUTPUT_FILE
+
+        #
+        # The recording is finalized in the background while the next one
+        # may already use other preferences, saving goes by these.
+        #
+        self.codec = prefs.codec
+        self.container = codec_muxer(prefs.codec)
+        self.extension = codec_extension(prefs.codec)
 
     def setup_sources(self,
                       video_source,
@@ -78,12 +135,15 @@ class Screencast(GObject.GObject):
 
         self.audio_source = audio_source
         self.audio2_source = audio2_source
+        self.separate_tracks = bool(prefs.separate_tracks and audio_source and audio2_source)
         self.video_source = video_source
         self.area = area
         self.xid = xid
+        self.audio_only = not (video_source or area)
 
         logger.debug("Audio_source : {0}".format(audio_source))
         logger.debug("Audio2_source : {0}".format(audio2_source))
+        logger.debug("Separate audio tracks: {0}".format(self.separate_tracks))
         logger.debug("Video_source: {0}".format(video_source))
         logger.debug("Xid: {0}".format(xid))
         logger.debug("Area: {0}".format(area))
@@ -91,15 +151,27 @@ class Screencast(GObject.GObject):
         logger.debug("Capture Cursor: {0}".format(prefs.capture_cursor))
         logger.debug("Framerate : {0}".format(prefs.framerate))
 
-        if self.video_source or self.area:
+        if prefs.idle_pause:
+            self.idle_gate = IdleGate(self.pipeline, prefs.idle_timeout, prefs.idle_level)
+
+        if self.audio_only:
+            self.setup_audio_container()
+        else:
             self.setup_video_source()
 
         self.setup_audio_sources()
 
         self.setup_filesink()
         self.setup_pipeline()
+        self.apply_memory_ceiling()
         self.setup_links()
 
+        if prefs.sync_log or prefs.sync_compensate:
+            self.setup_sync_monitor()
+
+        if prefs.adaptive and not self.audio_only:
+            self.setup_adaptive()
+
         self.bus = self.pipeline.get_bus()
         self.bus.add_signal_watch()
         self.bus.connect("message", self.on_message)
@@ -137,11 +209,19 @@ class Screencast(GObject.GObject):
             endy -= 1
 
         logger.debug("Coordinates SX: {0} SY: {1} EX: {2} EY: {3}".format(startx, starty, endx, endy))
+        self.capture_size = (endx - startx + 1, endy - starty + 1)
 
         if prefs.test:
             logger.info("Using test signal instead of screen capture.")
-            self.vid_caps = Gst.caps_from_string("video/x-raw, framerate={0}/1".format(
-                  int(prefs.framerate)))
+            #
+            # Behave like ximagesrc, a live source producing frames of the
+            # same size as the capture area. The size is set right at the
+            # source, frames may still be scaled after capture.
+            #
+            self.videosrc.set_property("is-live", True)
+            self.test_caps = Gst.caps_from_string("video/x-raw, framerate={0}/1, width={1}, height={2}".format(
+                  int(prefs.framerate), endx - startx + 1, endy - starty + 1))
+            self.vid_caps = Gst.caps_from_string("video/x-raw, framerate={0}/1".format(int(prefs.framerate)))
             self.vid_caps_filter = Gst.ElementFactory.make("capsfilter", "vid_filter")
             self.vid_caps_filter.set_property("caps", self.vid_caps)
         else:
@@ -158,15 +238,41 @@ class Screencast(GObject.GObject):
                     if prefs.xid_geometry[3] % 2:
                         self.videocrop.set_property("bottom", 1)
                         self.crop_vid = True
+                self.capture_size = (prefs.xid_geometry[2], prefs.xid_geometry[3])
+                if self.crop_vid:
+                    self.capture_size = (self.capture_size[0] - self.videocrop.get_property("left"),
+                                         self.capture_size[1] - self.videocrop.get_property("bottom"))
             else:
                 self.videosrc.set_property("startx", startx)
                 self.videosrc.set_property("starty", starty)
                 self.videosrc.set_property("endx", endx)
                 self.videosrc.set_property("endy", endy)
 
-            self.videosrc.set_property("use-damage", False)
+            #
+            # With use-damage ximagesrc keeps the last frame around and only
+            # copies rectangles reported by XDamage into it.
+            #
+            logger.debug("Damage driven capture: {0}".format(prefs.capture_damage))
+            self.videosrc.set_property("use-damage", prefs.capture_damage)
             self.videosrc.set_property("show-pointer", prefs.capture_cursor)
 
+            #
+            # The idle gate and VFR need to know about screen changes even
+            # when frames are grabbed whole.
+            #
+            if prefs.capture_damage or self.idle_gate or prefs.vfr:
+                if self.xid:
+                    self.damage_monitor = DamageMonitor(0, 0,
+                                                        prefs.xid_geometry[2],
+                                                        prefs.xid_geometry[3],
+                                                        self.xid)
+                else:
+                    self.damage_monitor = DamageMonitor(startx, starty,
+                                                        endx - startx + 1,
+                                                        endy - starty + 1)
+                if self.idle_gate:
+                    self.idle_gate.watch_damage(self.damage_monitor)
+
             self.vid_caps = Gst.caps_from_string("video/x-raw, framerate={0}/1".format(int(prefs.framerate)))
             self.vid_caps_filter = Gst.ElementFactory.make("capsfilter", "vid_filter")
             self.vid_caps_filter.set_property("caps", self.vid_caps)
@@ -178,16 +284,11 @@ class Screencast(GObject.GObject):
 
         if prefs.codec is not CODEC_RAW:
             self.videnc = Gst.ElementFactory.make(CODEC_LIST[prefs.codec][1], "video_encoder")
+            self.apply_encoder_preset(prefs.encoder_preset)
 
         if prefs.codec == CODEC_RAW:
-            self.mux = Gst.ElementFactory.make("avimux", "muxer")
+            self.mux = self.make_avi_mux()
         elif prefs.codec == CODEC_VP8:
-            self.videnc.set_property("cpu-used", 2)
-            self.videnc.set_property("end-usage", "vbr")
-            self.videnc.set_property("target-bitrate", 800000000)
-            self.videnc.set_property("static-threshold", 1000)
-            self.videnc.set_property("token-partitions", 2)
-            self.videnc.set_property("max-quantizer", 30)
             self.videnc.set_property("threads", self.cores)
 
             # Good framerate, bad memory
@@ -200,66 +301,459 @@ class Screencast(GObject.GObject):
 
             self.mux = Gst.ElementFactory.make("webmmux", "muxer")
         elif prefs.codec == CODEC_H264:
-            self.videnc.set_property("speed-preset", "ultrafast")
-            self.videnc.set_property("pass", 4)
-            self.videnc.set_property("quantizer", 15)
             #
             # x264enc supports maximum of four cores
             #
             self.videnc.set_property("threads", self.cores if self.cores <= 4 else 4)
             self.mux = Gst.ElementFactory.make("mp4mux", "muxer")
-            self.mux.set_property("faststart", 1)
-            self.mux.set_property("faststart-file", self.muxer_tempfile)
+            if prefs.crash_safe:
+                #
+                # Fragmented MP4, everything up to the last complete
+                # fragment stays playable if recording is interrupted.
+                #
+                self.mux.set_property("fragment-duration", MP4_FRAGMENT_DURATION)
+            elif self.output_mode == OUTPUT_FILE:
+                self.mux.set_property("faststart", 1)
+                self.mux.set_property("faststart-file", self.muxer_tempfile)
             self.mux.set_property("streamable", 1)
         elif prefs.codec == CODEC_HUFF:
-            self.mux = Gst.ElementFactory.make("avimux", "muxer")
+            self.mux = self.make_avi_mux()
             self.videnc.set_property("bitrate", 500000)
         elif prefs.codec == CODEC_JPEG:
-            self.mux = Gst.ElementFactory.make("avimux", "muxer")
+            self.mux = self.make_avi_mux()
 
-        self.vid_in_queue = Gst.ElementFactory.make("queue", "queue_v1")
-        self.vid_out_queue = Gst.ElementFactory.make("queue", "queue_v2")
+        self.vid_in_queue = self.make_queue("queue_v1")
+        self.vid_out_queue = self.make_queue("queue_v2")
+        if self.idle_gate:
+            self.vid_valve = self.idle_gate.add_valve("vid_valve")
+
+        if prefs.vfr:
+            self.setup_vfr()
+
+        if prefs.output_width and prefs.output_height:
+            self.setup_scaling()
+
+    def setup_scaling(self):
+        #
+        # Frames are scaled right after capture, everything from videorate
+        # on, the encoder most of all, works on the smaller frames. The
+        # H264 size rule applies to the scaled frame.
+        #
+        self.output_size = fit_size(self.capture_size[0], self.capture_size[1],
+                                    prefs.output_width, prefs.output_height,
+                                    prefs.codec == CODEC_H264)
+        if self.output_size == self.capture_size:
+            logger.debug("Capture fits into {0}x{1}, not scaled.".format(prefs.output_width, prefs.output_height))
+            return
+
+        self.videoscale = Gst.ElementFactory.make("videoscale", "video_scale")
+        Gst.util_set_object_arg(self.videoscale, "method", OUTPUT_SCALE_METHOD)
+        if self.videoscale.find_property("n-threads"):
+            self.videoscale.set_property("n-threads", self.cores)
+        self.scale_caps_filter = Gst.ElementFactory.make("capsfilter", "scale_filter")
+        self.scale_caps_filter.set_property("caps", Gst.caps_from_string(
+            "video/x-raw, width={0}, height={1}, pixel-aspect-ratio=1/1".format(*self.output_size)))
+        logger.info("Scaling {0}x{1} to {2}x{3}, {4:.0f}% fewer pixels to encode.".format(
+                    self.capture_size[0], self.capture_size[1], self.output_size[0], self.output_size[1],
+                    self.get_pixels_saved() * 100))
+
+    def get_pixels_saved(self):
+        """Returns the fraction of captured pixels that are not encoded."""
+        if not self.videoscale:
+            return 0.0
+        return 1.0 - (self.output_size[0] * self.output_size[1]) / (self.capture_size[0] * self.capture_size[1])
+
+    def setup_vfr(self):
+        muxer = self.mux.get_factory().get_name()
+        if not self.damage_monitor:
+            logger.info("Screen changes are not tracked, recording at a constant frame rate.")
+        elif muxer not in VFR_MUXERS:
+            logger.info("{0} needs a constant frame rate, VFR disabled.".format(muxer))
+        else:
+            logger.debug("VFR, frame interval {0} - {1}ms".format(prefs.vfr_min_interval,
+                                                                   prefs.vfr_max_interval))
+            self.vfr_filter = FrameFilter(self.pipeline, prefs.vfr_min_interval, prefs.vfr_max_interval)
+            self.vfr_filter.watch_damage(self.damage_monitor)
+            #
+            # Static frames are gone before videorate, it must not fill
+            # the gaps with duplicates.
+            #
+            self.videorate.set_property("drop-only", True)
+
+    def apply_encoder_preset(self, preset):
+        #
+        # Settings come from the configuration file, properties the
+        # installed encoder doesn't know about are skipped.
+        #
+        logger.debug("Encoder preset: {0}".format(ENCODER_PRESETS[preset][2]))
+        for (prop, value) in get_encoder_settings(preset, CODEC_LIST[prefs.codec][1]):
+            if not self.videnc.find_property(prop):
+                logger.warning("Encoder has no property {0}, ignored.".format(prop))
+                continue
+            logger.debug("  {0}={1}".format(prop, value))
+            Gst.util_set_object_arg(self.videnc, prop, value)
+
+    def setup_audio_container(self):
+        #
+        # Nothing is captured from X, encoded audio goes straight into an
+        # audio container.
+        #
+        logger.info("Audio-only recording.")
+        (muxer, ext) = audio_container()
+        logger.debug("Audio container: {0} ({1})".format(muxer, ext))
+        self.mux = Gst.ElementFactory.make(muxer, "muxer")
+
+    def make_avi_mux(self):
+        #
+        # AVI index is written at the very end, Matroska can be played
+        # back up to the last written cluster.
+        #
+        if prefs.crash_safe:
+            return Gst.ElementFactory.make("matroskamux", "muxer")
+        return Gst.ElementFactory.make("avimux", "muxer")
 
     def setup_audio_sources(self):
         if self.audio_source or self.audio2_source:
             logger.debug("Setup audio elements.")
-            self.aud_out_queue = Gst.ElementFactory.make("queue", "queue_a_out")
-            self.audioconv = Gst.ElementFactory.make("audioconvert", "audio_conv")
-            if prefs.codec == CODEC_VP8:
-                self.audioenc = Gst.ElementFactory.make("vorbisenc", "audio_encoder")
-                self.audioenc.set_property("quality", 1)
-            else:
-                self.audioenc = Gst.ElementFactory.make("lamemp3enc", "audio_encoder")
-                self.audioenc.set_property("quality", 0)
+            self.audio_codec = get_audio_codec(prefs.codec)
+            logger.debug("Audio codec: {0}".format(AUDIO_CODEC_LIST[self.audio_codec][2]))
+            (self.audioconv,
+             self.audioresample,
+             self.audioenc,
+             self.aud_out_queue) = self.make_audio_encoder("audio", "queue_a_out")
+            if self.idle_gate:
+                self.aud_valve = self.idle_gate.add_valve("aud_valve")
+
+        if self.separate_tracks:
+            #
+            # Microphone is encoded on its own and goes into a second audio
+            # track, nothing is mixed.
+            #
+            (self.aud2_conv,
+             self.aud2_resample,
+             self.aud2_enc,
+             self.aud2_out_queue) = self.make_audio_encoder("audio2", "queue_a2_out")
+            if self.idle_gate:
+                self.aud2_valve = self.idle_gate.add_valve("aud2_valve")
+
+        #
+        # Branches are pinned to the native sample spec of their source, so
+        # nothing is converted until right before the encoder. When mixing,
+        # PulseAudio converts both sources to a format the encoder takes,
+        # the mixer output is pinned to it and the converters in front of
+        # the encoder work in passthrough mode.
+        #
+        speakers_spec = None
+        mic_spec = None
+        speakers_target = None
+        mic_target = None
+        self.mix_spec = None
+        if self.audio_source:
+            speakers_spec = prefs.get_source_spec(self.audio_source)
+        if self.audio2_source:
+            mic_spec = prefs.get_source_spec(self.audio2_source)
+        if self.audio_source and self.audio2_source and not self.separate_tracks:
+            self.mix_spec = self.get_encoder_spec(speakers_spec)
+            if self.mix_spec != speakers_spec:
+                speakers_target = self.mix_spec
+            mic_target = self.mix_spec
 
         if self.audio_source:
             logger.debug("Audio1 Source:\n  {0}".format(self.audio_source))
-            self.audiosrc = Gst.ElementFactory.make("pulsesrc", "audio_src")
-            self.audiosrc.set_property("device", self.audio_source)
-            self.aud_caps = Gst.caps_from_string("audio/x-raw")
+            self.audiosrc = self.make_audio_src("audio_src", self.audio_source, prefs.speakers_profile,
+                                                speakers_target or speakers_spec)
+            self.aud_caps = self.get_audio_caps("Speakers", speakers_spec, speakers_target)
             self.aud_caps_filter = Gst.ElementFactory.make("capsfilter", "aud_filter")
             self.aud_caps_filter.set_property("caps", self.aud_caps)
 
-            self.aud_in_queue = Gst.ElementFactory.make("queue", "queue_a_in")
+            self.aud_in_queue = self.make_queue("queue_a_in")
+            (self.aud_volume, self.aud_level) = self.make_gain_elements("aud", prefs.speakers_volume)
 
         if self.audio2_source:
             logger.debug("Audio2 Source:\n  {0}".format(self.audio2_source))
-            self.audio2src = Gst.ElementFactory.make("pulsesrc", "audio2_src")
-            self.audio2src.set_property("device", self.audio2_source)
-            self.aud2_caps = Gst.caps_from_string("audio/x-raw")
+            self.audio2src = self.make_audio_src("audio2_src", self.audio2_source, prefs.microphone_profile,
+                                                 mic_target or mic_spec)
+            self.aud2_caps = self.get_audio_caps("Microphone", mic_spec, mic_target)
             self.aud2_caps_filter = Gst.ElementFactory.make("capsfilter", "aud2_filter")
             self.aud2_caps_filter.set_property("caps", self.aud2_caps)
-            self.aud2_in_queue = Gst.ElementFactory.make("queue", "queue_a2_in")
-            self.audio2conv = Gst.ElementFactory.make("audioconvert", "audio2_conv")
+            self.aud2_in_queue = self.make_queue("queue_a2_in")
+            (self.aud2_volume, self.aud2_level) = self.make_gain_elements("aud2", prefs.microphone_volume)
+
+        if self.audio_source and self.audio2_source and not self.separate_tracks:
+            #
+            # audiomixer aggregates live sources by running time and converts
+            # formats on its pads, adder is only a fallback for old systems.
+            #
+            self.audiomixer = Gst.ElementFactory.make("audiomixer", "audiomixer")
+            if not self.audiomixer:
+                logger.info("audiomixer not available, falling back to adder.")
+                self.audiomixer = Gst.ElementFactory.make("adder", "audiomixer")
+            self.mix_caps_filter = Gst.ElementFactory.make("capsfilter", "mix_filter")
+            self.mix_caps_filter.set_property("caps", self.get_audio_caps("Mixer", self.mix_spec))
+
+    def make_audio_src(self, name, device, profile, spec=None):
+        (num, desc, buffer_time, latency_time) = AUDIO_LATENCY_PROFILES[profile]
+        logger.debug("{0}: {1} latency profile, buffer {2}us, latency {3}us".format(name,
+                                                                                 desc,
+                                                                                 buffer_time,
+                                                                                 latency_time))
+        if prefs.test_audio:
+            logger.info("Using test signal instead of {0}.".format(device))
+            src = Gst.ElementFactory.make("audiotestsrc", name)
+            src.set_property("is-live", True)
+            #
+            # Same buffer duration as pulsesrc would produce, at the rate the
+            # caps are pinned to or the audiotestsrc default of 44.1kHz.
+            #
+            rate = spec[1] if spec else 44100
+            src.set_property("samplesperbuffer", int(rate * latency_time / 1000000))
+            return src
+        src = Gst.ElementFactory.make("pulsesrc", name)
+        src.set_property("device", device)
+        src.set_property("buffer-time", buffer_time)
+        src.set_property("latency-time", latency_time)
+        return src
+
+    def get_audio_caps(self, label, spec, target=None):
+        """Returns caps matching the sample spec of a PulseAudio source.
+
+        Args:
+            label: source name used for logging.
+            spec: (format, rate, channels) of the source or None if unknown.
+            target: spec PulseAudio should convert to instead, or None.
+
+        Returns:
+            Gst.Caps, unconstrained audio/x-raw if the spec is not known.
+
+        Raises:
+            None
+        """
+        out = target or spec
+        if not out:
+            logger.debug("{0}: sample spec unknown, not pinning caps.".format(label))
+            return Gst.caps_from_string("audio/x-raw")
+
+        (fmt, rate, channels) = out
+        caps = "audio/x-raw, rate={0}, channels={1}".format(rate, channels)
+        if fmt in PA_SAMPLE_FORMATS:
+            caps = "{0}, format={1}".format(caps, PA_SAMPLE_FORMATS[fmt])
+        else:
+            logger.info("{0}: sample format {1} converted by PulseAudio.".format(label, fmt))
+        if spec and tuple(spec) != tuple(out):
+            logger.info("{0}: converted by PulseAudio from {1} to {2} for mixing.".format(label, spec, out))
+        logger.debug("{0} caps: {1}".format(label, caps))
+        return Gst.caps_from_string(caps)
+
+    def get_encoder_spec(self, spec):
+        """Returns the sample spec closest to spec that the audio encoder takes.
+
+        Args:
+            spec: (format, rate, channels) of a PulseAudio source or None.
+
+        Returns:
+            spec itself if the encoder takes it or if the encoder format
+            has no PulseAudio equivalent, otherwise the nearest spec the
+            encoder takes.
+
+        Raises:
+            None
+        """
+        if not spec:
+            return spec
+        (fmt, rate, channels) = spec
+        enc_caps = self.audioenc.get_static_pad("sink").query_caps(None)
+        if fmt in PA_SAMPLE_FORMATS:
+            native = "audio/x-raw, format={0}, rate={1}, channels={2}".format(PA_SAMPLE_FORMATS[fmt], rate, channels)
+            if not enc_caps.intersect(Gst.caps_from_string(native)).is_empty():
+                return spec
+
+        caps = enc_caps.intersect(Gst.caps_from_string("audio/x-raw, rate={0}, channels={1}".format(rate, channels)))
+        if caps.is_empty():
+            caps = enc_caps.intersect(Gst.caps_from_string("audio/x-raw, channels={0}".format(channels)))
+        if caps.is_empty():
+            caps = enc_caps
+        caps = caps.fixate()
+        st = caps.get_structure(0)
+        pa_formats = dict((v, k) for (k, v) in PA_SAMPLE_FORMATS.items())
+        enc_fmt = pa_formats.get(st.get_string("format"))
+        if enc_fmt is None or st.get_string("layout") not in (None, "interleaved"):
+            logger.debug("Encoder caps {0} have no PulseAudio sample spec.".format(caps.to_string()))
+            return spec
+        return (enc_fmt, st.get_int("rate")[1], st.get_int("channels")[1])
+
+    def make_audio_encoder(self, prefix, queue_name):
+        #
+        # The only place where samples are converted. Both elements work in
+        # passthrough mode when the encoder takes what the source gives.
+        #
+        conv = Gst.ElementFactory.make("audioconvert", "{0}_conv".format(prefix))
+        resample = Gst.ElementFactory.make("audioresample", "{0}_resample".format(prefix))
+        #
+        # Live sources negotiate late and may renegotiate, conversions are
+        # logged whenever caps are set on either side.
+        #
+        for pad in (conv.get_static_pad("sink"), resample.get_static_pad("src")):
+            pad.connect("notify::caps", self.cb_converter_caps, (conv, resample))
+        codec = AUDIO_CODEC_LIST[self.audio_codec]
+        enc = Gst.ElementFactory.make(codec[1], "{0}_encoder".format(prefix))
+        for (prop, value) in codec[3].items():
+            Gst.util_set_object_arg(enc, prop, value)
+        queue = self.make_queue(queue_name)
+        return (conv, resample, enc, queue)
+
+    def make_queue(self, name):
+        #
+        # Limits come from the configuration file, the number of buffers
+        # is never limited.
+        #
+        (max_bytes, max_time, leaky) = get_queue_settings(name)
+        if leaky != "no" and name not in LEAKY_QUEUES:
+            logger.warning("{0} holds encoded data, it can't drop buffers.".format(name))
+            leaky = "no"
+        queue = Gst.ElementFactory.make("queue", name)
+        queue.set_property("max-size-buffers", 0)
+        queue.set_property("max-size-bytes", max_bytes)
+        queue.set_property("max-size-time", max_time)
+        Gst.util_set_object_arg(queue, "leaky", leaky)
+        queue.connect("overrun", self.cb_queue_overrun)
+        self.queues.append(queue)
+        self.queue_overruns[name] = 0
+        logger.debug("Queue {0}: {1} bytes, {2}ms, leaky: {3}".format(name, max_bytes, max_time // Gst.MSECOND,
+                                                                      leaky))
+        return queue
+
+    def cb_queue_overrun(self, queue):
+        #
+        # Emitted from the streaming thread whenever the queue is full. The
+        # only Python callback on a streaming thread the statistics use. A
+        # queue that blocks calls it once per stall. A leaky queue that
+        # stays full calls it for about every incoming buffer, a few
+        # microseconds each, while it is already dropping frames.
+        #
+        with self.queue_lock:
+            self.queue_overruns[queue.get_name()] += 1
 
-        if self.audio_source and self.audio2_source:
-            self.audiomixer = Gst.ElementFactory.make("adder", "audiomixer")
+    def apply_memory_ceiling(self):
+        #
+        # Queues without a byte limit count as the whole ceiling, if the
+        # limits add up to more than the ceiling all of them are scaled
+        # down by the same factor.
+        #
+        ceiling = prefs.queue_memory_limit * 1024 * 1024
+        queues = [queue for queue in self.queues if queue.get_parent() == self.pipeline]
+        if not ceiling or not queues:
+            return
+        limits = [queue.get_property("max-size-bytes") or ceiling for queue in queues]
+        scale = min(1.0, ceiling / sum(limits))
+        if scale < 1.0:
+            logger.info("Queue limits exceed {0} MB, scaled to {1:.0f}%.".format(prefs.queue_memory_limit,
+                                                                               scale * 100))
+        for (queue, limit) in zip(queues, limits):
+            queue.set_property("max-size-bytes", int(limit * scale))
+
+    def make_gain_elements(self, prefix, gain):
+        volume = Gst.ElementFactory.make("volume", "{0}_volume".format(prefix))
+        volume.set_property("volume", gain)
+        level = Gst.ElementFactory.make("level", "{0}_level".format(prefix))
+        level.set_property("post-messages", True)
+        level.set_property("interval", LEVEL_INTERVAL * Gst.MSECOND)
+        self.audio_levels[level.get_name()] = {"rms": -700.0, "peak": -700.0, "clipped": 0}
+        return (volume, level)
+
+    def set_volume(self, source, gain):
+        """Changes the gain of one of the audio sources while recording.
+
+        Args:
+            source: 1 for speakers, 2 for microphone.
+            gain: linear gain, 1.0 leaves the signal unchanged.
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        if source == 1 and self.audio_source:
+            self.aud_volume.set_property("volume", gain)
+        elif source == 2 and self.audio2_source:
+            self.aud2_volume.set_property("volume", gain)
 
     def setup_filesink(self):
+        if self.output_mode == OUTPUT_REPLAY:
+            self.setup_replay_sink()
+            return
+        elif self.output_mode == OUTPUT_SEGMENTS:
+            self.setup_segment_sink()
+            return
+
         logger.debug("Filesink: {0}".format(self.tempfile))
         self.sink = Gst.ElementFactory.make("filesink", "sink")
         self.sink.set_property("location", self.tempfile)
-        self.file_queue = Gst.ElementFactory.make("queue", "queue_file")
+        self.file_queue = self.make_queue("queue_file")
+
+    def setup_replay_sink(self):
+        #
+        # Instant replay, the muxer is handed over to splitmuxsink which
+        # starts a new fragment at a keyframe every REPLAY_FRAGMENT_TIME
+        # seconds. Fragments that fall out of the replay window are deleted
+        # as soon as a new one is closed.
+        #
+        if prefs.replay_in_memory:
+            base_dir = REPLAY_MEMORY_DIR
+        else:
+            base_dir = prefs.video_dest
+        self.replay_dir = tempfile.mkdtemp(prefix="kazam_replay_", dir=base_dir)
+        self.replay_lock = self.lock_dir(self.replay_dir)
+        logger.debug("Replay fragments: {0}".format(self.replay_dir))
+
+        self.setup_splitmuxsink(os.path.join(self.replay_dir,
+                                             "fragment_%08d{0}".format(self.extension)),
+                                REPLAY_FRAGMENT_TIME, 0)
+
+    def lock_dir(self, path):
+        #
+        # Same as the tempfile, recovery leaves locked directories alone.
+        #
+        fd = os.open(path, os.O_RDONLY)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def setup_segment_sink(self):
+        #
+        # Segmented recording, every segment is a complete file written
+        # straight to its final location.
+        #
+        if not self.segment_location:
+            if prefs.autosave_video:
+                sdir = prefs.autosave_video_dir
+            else:
+                sdir = prefs.video_dest
+            self.segment_location = os.path.join(sdir, "{0}_{1}_%05d{2}".format(prefs.autosave_video_file,
+                                                                               time.strftime("%Y%m%d-%H%M%S"),
+                                                                               self.extension))
+        logger.debug("Segments: {0}".format(self.segment_location))
+        self.setup_splitmuxsink(self.segment_location, prefs.segment_seconds, prefs.segment_size_mb)
+
+    def setup_splitmuxsink(self, location, max_seconds, max_mb):
+        #
+        # There is no single output file, the tempfile is not needed.
+        #
+        os.close(self.temp_fh[0])
+        os.remove(self.tempfile)
+
+        #
+        # splitmuxsink's own max-files is not used, it reuses file names and
+        # old fragments get truncated in place. Closed fragments are pruned
+        # in cb_fragment_closed() instead.
+        #
+        self.sink = Gst.ElementFactory.make("splitmuxsink", "sink")
+        self.sink.set_property("location", location)
+        if max_seconds:
+            self.sink.set_property("max-size-time", max_seconds * Gst.SECOND)
+            self.sink.set_property("send-keyframe-requests", True)
+        if max_mb:
+            self.sink.set_property("max-size-bytes", max_mb * 1024 * 1024)
+        self.sink.set_property("muxer", self.mux)
 
     #
     # One day, this horrific code will be optimised... I promise!
@@ -268,40 +762,73 @@ class Screencast(GObject.GObject):
         #
         # Behold, setup the master pipeline
         #
-        self.pipeline.add(self.videosrc)
-        self.pipeline.add(self.vid_in_queue)
-        if self.crop_vid:
-            self.pipeline.add(self.videocrop)
-        self.pipeline.add(self.videorate)
-        self.pipeline.add(self.vid_caps_filter)
-        self.pipeline.add(self.videoconvert)
-        self.pipeline.add(self.vid_out_queue)
-        self.pipeline.add(self.file_queue)
-
-        if prefs.codec is not CODEC_RAW:
-            self.pipeline.add(self.videnc)
+        if not self.audio_only:
+            self.pipeline.add(self.videosrc)
+            self.pipeline.add(self.vid_in_queue)
+            if self.crop_vid:
+                self.pipeline.add(self.videocrop)
+            if self.videoscale:
+                self.pipeline.add(self.videoscale)
+                self.pipeline.add(self.scale_caps_filter)
+            self.pipeline.add(self.videorate)
+            self.pipeline.add(self.vid_caps_filter)
+            self.pipeline.add(self.videoconvert)
+            self.pipeline.add(self.vid_out_queue)
+            if prefs.codec is not CODEC_RAW:
+                self.pipeline.add(self.videnc)
+
+        if self.idle_gate:
+            for valve in self.idle_gate.valves:
+                self.pipeline.add(valve)
+
+        if self.output_mode == OUTPUT_FILE:
+            self.pipeline.add(self.file_queue)
 
         if self.audio_source or self.audio2_source:
             self.pipeline.add(self.audioconv)
+            self.pipeline.add(self.audioresample)
             self.pipeline.add(self.audioenc)
             self.pipeline.add(self.aud_out_queue)
 
+        if self.separate_tracks:
+            self.pipeline.add(self.aud2_conv)
+            self.pipeline.add(self.aud2_resample)
+            self.pipeline.add(self.aud2_enc)
+            self.pipeline.add(self.aud2_out_queue)
+
         if self.audio_source:
             self.pipeline.add(self.audiosrc)
             self.pipeline.add(self.aud_in_queue)
             self.pipeline.add(self.aud_caps_filter)
+            self.pipeline.add(self.aud_volume)
+            self.pipeline.add(self.aud_level)
 
         if self.audio2_source:
             self.pipeline.add(self.audio2src)
             self.pipeline.add(self.aud2_in_queue)
             self.pipeline.add(self.aud2_caps_filter)
+            self.pipeline.add(self.aud2_volume)
+            self.pipeline.add(self.aud2_level)
 
-        if self.audio_source and self.audio2_source:
+        if self.audio_source and self.audio2_source and not self.separate_tracks:
             self.pipeline.add(self.audiomixer)
+            self.pipeline.add(self.mix_caps_filter)
 
-        self.pipeline.add(self.mux)
+        if self.output_mode == OUTPUT_FILE:
+            self.pipeline.add(self.mux)
         self.pipeline.add(self.sink)
 
+    def link_chain(self, elements):
+        for (src, dst) in zip(elements, elements[1:]):
+            ret = src.link(dst)
+            logger.debug(" Link {0} -> {1}: {2}".format(src.get_name(), dst.get_name(), ret))
+
+    def link_mux(self, element, template):
+        if self.output_mode != OUTPUT_FILE:
+            pad = self.sink.get_request_pad(template)
+            return element.get_static_pad("src").link(pad)
+        return element.link(self.mux)
+
     # gst-launch-1.0 -e ximagesrc endx=1919 endy=1079 use-damage=false show-pointer=true ! \
     #   queue ! videorate ! video/x-raw,framerate=15/1 ! videoconvert ! \
     #   vp8enc end-usage=vbr target-bitrate=800000000 threads=3 static-threshold=1000 \
@@ -310,12 +837,34 @@ class Screencast(GObject.GObject):
 
     def setup_links(self):
         # Connect everything together
-        self.videosrc.link(self.vid_in_queue)
-        if self.crop_vid:
-            self.vid_in_queue.link(self.videocrop)
-            self.videocrop.link(self.videorate)
+        if not self.audio_only:
+            self.setup_video_links()
+        self.setup_audio_links()
+
+        if self.output_mode == OUTPUT_FILE:
+            ret = self.mux.link(self.file_queue)
+            logger.debug("Link mux -> file queue: %s" % ret)
+            ret = self.file_queue.link(self.sink)
+            logger.debug("Link file queue -> sink: %s" % ret)
+
+    def setup_video_links(self):
+        if prefs.test:
+            self.videosrc.link_filtered(self.vid_in_queue, self.test_caps)
+        else:
+            self.videosrc.link(self.vid_in_queue)
+        if self.vfr_filter:
+            self.vfr_filter.attach(self.vid_in_queue.get_static_pad("src"))
+        if self.idle_gate:
+            self.vid_in_queue.link(self.vid_valve)
+            vid_in = self.vid_valve
         else:
-            self.vid_in_queue.link(self.videorate)
+            vid_in = self.vid_in_queue
+        chain = [vid_in]
+        if self.crop_vid:
+            chain.append(self.videocrop)
+        if self.videoscale:
+            chain.extend([self.videoscale, self.scale_caps_filter])
+        self.link_chain(chain + [self.videorate])
         self.videorate.link(self.vid_caps_filter)
         self.vid_caps_filter.link(self.videoconvert)
         if prefs.codec is CODEC_RAW:
@@ -326,73 +875,165 @@ class Screencast(GObject.GObject):
             self.videoconvert.link(self.videnc)
             self.videnc.link(self.vid_out_queue)
 
-        self.vid_out_queue.link(self.mux)
+        ret = self.link_mux(self.vid_out_queue, "video")
+        logger.debug("Link vid_out_queue -> mux: %s" % ret)
 
-        if self.audio_source and self.audio2_source:
-            logger.debug("Linking Audio")
-            ret = self.audiosrc.link(self.aud_in_queue)
-            logger.debug(" Link audiosrc -> aud_in_queue: %s" % ret)
-            ret = self.aud_in_queue.link(self.aud_caps_filter)
-            logger.debug(" Link aud_in_queue -> aud_caps_filter: %s" % ret)
-
-            logger.debug("Linking Audio2")
-            # Link first audio source to mixer
-            ret = self.aud_caps_filter.link(self.audiomixer)
-            logger.debug(" Link aud_caps_filter -> audiomixer: %s" % ret)
-
-            # Link second audio source to mixer
-            ret = self.audio2src.link(self.aud2_in_queue)
-            logger.debug(" Link audio2src -> aud2_in_queue: %s" % ret)
-            ret = self.aud2_in_queue.link(self.aud2_caps_filter)
-            logger.debug(" Link aud2_in_queue -> aud2_caps_filter: %s" % ret)
-            ret = self.aud2_caps_filter.link(self.audiomixer)
-            logger.debug(" Link aud2_caps_filter -> audiomixer: %s" % ret)
-
-            # Link mixer to audio convert
-            ret = self.audiomixer.link(self.audioconv)
-            logger.debug(" Link audiomixer -> audioconv: %s" % ret)
-
-        elif self.audio_source:
+    def setup_audio_links(self):
+        audio_branches = []
+        if self.audio_source:
+            audio_branches.append([self.audiosrc, self.aud_in_queue, self.aud_caps_filter,
+                                   self.aud_volume, self.aud_level])
+        if self.audio2_source:
+            audio_branches.append([self.audio2src, self.aud2_in_queue, self.aud2_caps_filter,
+                                   self.aud2_volume, self.aud2_level])
 
+        #
+        # Idle gate valves sit after the level elements, so sources are
+        # still metered while encoding is stopped.
+        #
+        if self.idle_gate:
+            aud_gate = [self.aud_valve]
+            aud2_gate = [self.aud2_valve] if self.separate_tracks else []
+        else:
+            aud_gate = []
+            aud2_gate = []
+
+        audio_tracks = []
+        if self.separate_tracks:
+            logger.debug("Linking Audio, separate tracks")
+            self.link_chain(audio_branches[0] + aud_gate + [self.audioconv, self.audioresample,
+                                                            self.audioenc, self.aud_out_queue])
+            self.link_chain(audio_branches[1] + aud2_gate + [self.aud2_conv, self.aud2_resample,
+                                                             self.aud2_enc, self.aud2_out_queue])
+            audio_tracks = [self.aud_out_queue, self.aud2_out_queue]
+        elif len(audio_branches) > 1:
+            logger.debug("Linking Audio, mixed")
+            for branch in audio_branches:
+                self.link_chain(branch + [self.audiomixer])
+            self.link_chain([self.audiomixer, self.mix_caps_filter] + aud_gate + [self.audioconv, self.audioresample,
+                                                            self.audioenc, self.aud_out_queue])
+            audio_tracks = [self.aud_out_queue]
+        elif audio_branches:
             logger.debug("Linking Audio")
-            ret = self.audiosrc.link(self.aud_in_queue)
-            logger.debug(" Link audiosrc -> aud_in_queue: %s" % ret)
-            ret = self.aud_in_queue.link(self.aud_caps_filter)
-            logger.debug(" Link aud_in_queue -> aud_caps_filter: %s" % ret)
-
-            # Link first audio source to audio convert
-            ret = self.aud_caps_filter.link(self.audioconv)
-            logger.debug(" Link aud_caps_filter -> audioconv: %s" % ret)
-
-        elif self.audio2_source:
-            # Link second audio source to mixer
-            ret = self.audio2src.link(self.aud2_in_queue)
-            logger.debug(" Link audio2src -> aud2_in_queue: %s" % ret)
-            ret = self.aud2_in_queue.link(self.aud2_caps_filter)
-            logger.debug(" Link aud2_in_queue -> aud2_caps_filter: %s" % ret)
-
-            # Link second audio source to audio convert
-            ret = self.aud2_caps_filter.link(self.audioconv)
-            logger.debug(" Link aud2_caps_filter -> audioconv: %s" % ret)
+            self.link_chain(audio_branches[0] + aud_gate + [self.audioconv, self.audioresample,
+                                                            self.audioenc, self.aud_out_queue])
+            audio_tracks = [self.aud_out_queue]
 
-        if self.audio_source or self.audio2_source:
-            # Link audio to muxer
-            ret = self.audioconv.link(self.audioenc)
-            logger.debug("Link audioconv -> audioenc: %s" % ret)
-            ret = self.audioenc.link(self.aud_out_queue)
-            logger.debug("Link audioenc -> aud_out_queue: %s" % ret)
-            ret = self.aud_out_queue.link(self.mux)
-            logger.debug("Link aud_out_queue -> mux: %s" % ret)
-
-        ret = self.mux.link(self.file_queue)
-        logger.debug("Link mux -> file queue: %s" % ret)
-        ret = self.file_queue.link(self.sink)
-        logger.debug("Link file queue -> sink: %s" % ret)
+        # Link audio to muxer, tracks are numbered in request order
+        for queue in audio_tracks:
+            ret = self.link_mux(queue, "audio_%u")
+            logger.debug("Link {0} -> mux: {1}".format(queue.get_name(), ret))
+
+    def setup_sync_monitor(self):
+        #
+        # The log of a single file recording follows the tempfile and is
+        # moved next to the recording when it is saved. Segments share one
+        # log, replays don't get one.
+        #
+        if prefs.sync_log and self.output_mode == OUTPUT_FILE:
+            self.sync_log = "{0}{1}".format(self.tempfile, SYNC_LOG_SUFFIX)
+        elif prefs.sync_log and self.output_mode == OUTPUT_SEGMENTS:
+            base = os.path.splitext(self.segment_location.replace("_%05d", ""))[0]
+            self.sync_log = "{0}{1}".format(base, SYNC_LOG_SUFFIX)
+
+        self.sync_monitor = SyncMonitor(self.pipeline, self.sync_log, prefs.sync_compensate)
+        if self.video_source or self.area:
+            self.sync_monitor.add_stream("video", self.videosrc.get_static_pad("src"))
+        if self.audio_source:
+            self.sync_monitor.add_stream("speakers",
+                                         self.audiosrc.get_static_pad("src"),
+                                         self.aud_in_queue.get_static_pad("src"))
+        if self.audio2_source:
+            self.sync_monitor.add_stream("microphone",
+                                         self.audio2src.get_static_pad("src"),
+                                         self.aud2_in_queue.get_static_pad("src"))
+
+    def get_sync_log(self):
+        return self.sync_log
+
+    def setup_adaptive(self):
+        #
+        # The adaptation log goes wherever the sync log would go.
+        #
+        if self.output_mode == OUTPUT_FILE:
+            self.adapt_log = "{0}{1}".format(self.tempfile, ADAPT_LOG_SUFFIX)
+        elif self.output_mode == OUTPUT_SEGMENTS:
+            base = os.path.splitext(self.segment_location.replace("_%05d", ""))[0]
+            self.adapt_log = "{0}{1}".format(base, ADAPT_LOG_SUFFIX)
+        self.adaptive = AdaptiveController(self, self.adapt_log)
+
+    def get_adapt_log(self):
+        return self.adapt_log
+
+    def preroll(self):
+        """Brings the pipeline up to PAUSED ahead of start_recording().
+
+        Plugins are loaded, devices opened and PulseAudio connected while
+        the countdown is running, so PLAYING only has to start the clock.
+        Live sources do not preroll, the state change returns right away.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        logger.debug("Setting STATE_PAUSED - PREROLL")
+        ret = self.pipeline.set_state(Gst.State.PAUSED)
+        logger.debug("Preroll: {0}".format(ret))
+
+    def abort(self):
+        """Tears down a pipeline that never started recording."""
+        logger.debug("Aborting, setting pipeline to NULL.")
+        self.pipeline.set_state(Gst.State.NULL)
+        self.bus.remove_signal_watch()
+        for fname in (self.tempfile, self.muxer_tempfile):
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+        if self.replay_dir:
+            shutil.rmtree(self.replay_dir, ignore_errors=True)
+            os.close(self.replay_lock)
 
     def start_recording(self):
         logger.debug("Setting STATE_PLAYING")
+        damage = False
+        if self.damage_monitor:
+            damage = self.damage_monitor.start()
+        if self.sync_monitor:
+            self.sync_monitor.start()
+        if self.vfr_filter and not damage:
+            logger.warning("Screen changes can't be tracked, recording at a constant frame rate.")
+            self.vfr_filter.enabled = False
+        if self.idle_gate:
+            if not self.audio_only and not damage:
+                logger.warning("Screen changes can't be tracked, idle pause disabled.")
+                self.idle_gate = None
+            else:
+                self.idle_gate.start()
+        if self.adaptive:
+            self.adaptive.start()
+
+        #
+        # Measure how long it takes from PLAYING to the first encoded frame.
+        # The probe removes itself after the first buffer.
+        #
+        if self.video_source or self.area:
+            pad = self.vid_out_queue.get_static_pad("sink")
+            pad.add_probe(Gst.PadProbeType.BUFFER, self.cb_first_buffer, None)
+
+        self.start_time = time.monotonic()
         self.pipeline.set_state(Gst.State.PLAYING)
 
+    def cb_first_buffer(self, pad, info, user_data):
+        self.start_latency = time.monotonic() - self.start_time
+        logger.info("First encoded frame {0:.3f}s after start.".format(self.start_latency))
+        return Gst.PadProbeReturn.REMOVE
+
     def pause_recording(self):
         logger.debug("Setting STATE_PAUSED")
         self.pipeline.set_state(Gst.State.PAUSED)
@@ -402,21 +1043,406 @@ class Screencast(GObject.GObject):
         self.pipeline.set_state(Gst.State.PLAYING)
 
     def stop_recording(self):
+        if self.idle_gate:
+            self.idle_gate.stop()
+        if self.adaptive:
+            self.adaptive.stop()
         logger.debug("Sending new EOS event")
         self.pipeline.send_event(Gst.Event.new_eos())
 
     def get_tempfile(self):
         return self.tempfile
 
+    def save_replay(self, output):
+        """Saves the last prefs.replay_seconds of the recording.
+
+        Closes the fragment that is currently being written, the fragments
+        from the replay window are then joined in the background and
+        "replay-saved" is emitted with the output path, or None on failure.
+
+        Args:
+            output: path of the file to save to.
+
+        Returns:
+            True if the save was started, False otherwise.
+
+        Raises:
+            None
+        """
+        if not self.replay_dir or self.replay_save:
+            return False
+        logger.debug("Saving instant replay to {0}".format(output))
+        self.replay_save = output
+        self.sink.emit("split-now")
+        return True
+
+    def get_segments(self):
+        return [seg for seg in self.segments if os.path.isfile(seg)]
+
+    def cb_fragment_closed(self, location, running_time):
+        if self.output_mode == OUTPUT_REPLAY:
+            self.cb_replay_fragment_closed(location, running_time)
+        else:
+            self.cb_segment_closed(location)
+
+    def cb_segment_closed(self, location):
+        logger.debug("Segment closed: {0}".format(location))
+        self.segments.append(location)
+        if prefs.segment_max_files:
+            while len(self.segments) > prefs.segment_max_files:
+                old = self.segments.pop(0)
+                logger.debug("Removing old segment: {0}".format(old))
+                try:
+                    os.remove(old)
+                except OSError:
+                    logger.warning("Unable to remove old segment {0}".format(old))
+
+    def cb_replay_fragment_closed(self, location, running_time):
+        self.replay_fragments.append((location, running_time))
+
+        #
+        # A fragment ending at running_time covers the time since the end of
+        # the previous one, keep everything that overlaps the replay window.
+        #
+        window_start = running_time - prefs.replay_seconds * Gst.SECOND
+        keep = []
+        prev_end = 0
+        for (frag, end) in self.replay_fragments:
+            if end > window_start or prev_end > window_start:
+                keep.append((frag, end))
+            else:
+                try:
+                    os.remove(frag)
+                except OSError:
+                    logger.debug("Unable to remove replay fragment {0}".format(frag))
+            prev_end = end
+        self.replay_fragments = keep
+
+        if self.replay_save:
+            self.join_replay(self.replay_save)
+            self.replay_save = None
+
+    def join_replay(self, output):
+        #
+        # Hard link fragments into a private directory, so they survive the
+        # pruning above while they are being remuxed. Copies are the
+        # fallback for file systems without hard links.
+        #
+        ext = self.extension
+        staging = None
+        lock = None
+        try:
+            staging = tempfile.mkdtemp(prefix="kazam_replay_save_", dir=os.path.dirname(self.replay_dir))
+            lock = self.lock_dir(staging)
+            for (cnt, (frag, end)) in enumerate(self.replay_fragments):
+                part = os.path.join(staging, "part_{0}{1}".format(str(cnt).zfill(5), ext))
+                try:
+                    os.link(frag, part)
+                except OSError:
+                    shutil.copy2(frag, part)
+        except (IOError, OSError) as e:
+            logger.warning("Unable to stage replay fragments: {0}".format(e))
+            if staging:
+                shutil.rmtree(staging, ignore_errors=True)
+            if lock is not None:
+                os.close(lock)
+            self.emit("replay-saved", None)
+            return
+
+        remuxer = Remuxer(output, self.container)
+        remuxer.connect("remux-done", self.cb_replay_remuxed, (staging, lock))
+        remuxer.start_fragments(os.path.join(staging, "*{0}".format(ext)))
+
+    def cb_replay_remuxed(self, remuxer, output, data):
+        (staging, lock) = data
+        shutil.rmtree(staging, ignore_errors=True)
+        os.close(lock)
+        logger.debug("Instant replay saved: {0}".format(output))
+        self.emit("replay-saved", output)
+
     def get_audio_recorded(self):
         return self.audio
 
+    def get_stats(self):
+        """Returns live statistics for the running pipeline.
+
+        Everything is read from counters kept by the elements themselves,
+        apart from queue overruns, which are counted by a signal handler
+        on the streaming threads. Safe to call as often as needed from the
+        main loop.
+
+        Args:
+            None
+
+        Returns:
+            Flat dictionary of numbers, times are in seconds.
+
+        Raises:
+            None
+        """
+        stats = {"running_time": 0.0}
+        clock = self.pipeline.get_clock()
+        if clock:
+            stats["running_time"] = (clock.get_time() - self.pipeline.get_base_time()) / Gst.SECOND
+
+        if self.video_source or self.area:
+            stats["frames_captured"] = self.videorate.get_property("in")
+            stats["frames_out"] = self.videorate.get_property("out")
+            stats["frames_dropped"] = self.videorate.get_property("drop")
+            stats["frames_duplicated"] = self.videorate.get_property("duplicate")
+            if self.vfr_filter:
+                stats.update(self.vfr_filter.get_stats())
+
+            #
+            # Not a count, nothing looks at the encoder output. videorate
+            # and the encoder run in the same streaming thread, so
+            # everything videorate pushed out reached the encoder, minus
+            # the frames its reported latency says it is holding on to.
+            #
+            # Encoder latency is what the element reports in a latency
+            # query, the delay it adds by design, not measured processing
+            # time per frame.
+            #
+            encoded = stats["frames_out"]
+            if prefs.codec != CODEC_RAW:
+                latency = self.get_element_latency(self.videnc)
+                stats["reported_latency_video_encoder"] = latency
+                encoded -= int(round(latency * prefs.framerate))
+            stats["frames_encoded_estimate"] = max(0, encoded)
+
+        if self.audio_source or self.audio2_source:
+            stats["reported_latency_audio_encoder"] = self.get_element_latency(self.audioenc)
+        if self.separate_tracks:
+            stats["reported_latency_audio2_encoder"] = self.get_element_latency(self.aud2_enc)
+
+        with self.queue_lock:
+            overruns = dict(self.queue_overruns)
+        for name in ("queue_v1", "queue_v2", "queue_a_in", "queue_a2_in", "queue_a_out", "queue_a2_out",
+                     "queue_file"):
+            queue = self.pipeline.get_by_name(name)
+            if queue:
+                stats["{0}_buffers".format(name)] = queue.get_property("current-level-buffers")
+                stats["{0}_bytes".format(name)] = queue.get_property("current-level-bytes")
+                stats["{0}_time".format(name)] = queue.get_property("current-level-time") / Gst.SECOND
+                stats["{0}_fill".format(name)] = self.get_queue_fill(queue)
+                #
+                # Not a count of dropped buffers, a leaky queue may drop
+                # several per overrun. Counting drops would take a probe on
+                # both sides of every queue.
+                #
+                stats["{0}_overruns".format(name)] = overruns.get(name, 0)
+        stats["queue_bytes_total"] = sum(queue.get_property("current-level-bytes") for queue in self.queues
+                                         if queue.get_parent() == self.pipeline)
+
+        stats["bytes_written"] = self.get_bytes_written()
+
+        for (name, source) in (("aud_level", "speakers"), ("aud2_level", "microphone")):
+            level = self.audio_levels.get(name)
+            if level:
+                stats["{0}_rms".format(source)] = level["rms"]
+                stats["{0}_peak".format(source)] = level["peak"]
+                stats["{0}_clipped".format(source)] = level["clipped"]
+
+        if self.start_latency is not None:
+            stats["start_latency"] = self.start_latency
+
+        if self.sync_monitor:
+            stats.update(self.sync_monitor.get_stats())
+
+        if self.idle_gate:
+            stats.update(self.get_idle_stats(stats["bytes_written"], stats["running_time"]))
+
+        if self.adaptive:
+            stats.update(self.adaptive.get_stats())
+
+        if self.videoscale:
+            stats["scale_native_pixels"] = self.capture_size[0] * self.capture_size[1]
+            stats["scale_output_pixels"] = self.output_size[0] * self.output_size[1]
+            stats["scale_pixels_saved"] = self.get_pixels_saved()
+
+        damage = self.get_damage_stats()
+        if damage:
+            for (key, value) in damage.items():
+                stats["damage_{0}".format(key)] = value
+
+        return stats
+
+    def cb_level(self, name, st):
+        #
+        # Loudest channel in dBFS, an interval counts as clipped if any
+        # channel peaked at full scale.
+        #
+        level = self.audio_levels.get(name)
+        if level is None:
+            return
+        level["rms"] = max(st.get_value("rms"))
+        level["peak"] = max(st.get_value("peak"))
+        if level["peak"] >= LEVEL_CLIP_DB:
+            level["clipped"] += 1
+        if self.idle_gate:
+            self.idle_gate.audio_level(level["peak"])
+
+    def get_idle_stats(self, bytes_written, running_time):
+        """Returns what the idle gate saved so far.
+
+        Args:
+            bytes_written: size of the output in bytes.
+            running_time: pipeline running time in seconds.
+
+        Returns:
+            Dictionary with the gate state, idle time skipped and CPU time
+            saved in seconds, frames not encoded and an estimate of the
+            bytes not written at the average bitrate of the recording.
+
+        Raises:
+            None
+        """
+        stats = self.idle_gate.get_stats()
+        recorded = running_time - stats["idle_skipped"]
+        if recorded > 0:
+            stats["idle_bytes_saved"] = int(bytes_written * stats["idle_skipped"] / recorded)
+        else:
+            stats["idle_bytes_saved"] = 0
+        if not self.audio_only:
+            stats["idle_frames_skipped"] = int(stats["idle_skipped"] * prefs.framerate)
+        return stats
+
+    def cb_converter_caps(self, pad, pspec, converters):
+        #
+        # Runs in a streaming thread. Compares what goes into the converters
+        # with what comes out, once both sides are negotiated.
+        #
+        (conv, resample) = converters
+        in_caps = conv.get_static_pad("sink").get_current_caps()
+        out_caps = resample.get_static_pad("src").get_current_caps()
+        if not in_caps or not out_caps:
+            return
+        in_st = in_caps.get_structure(0)
+        out_st = out_caps.get_structure(0)
+        changes = []
+        for key in ("format", "rate", "channels"):
+            if in_st.get_value(key) != out_st.get_value(key):
+                changes.append((key, in_st.get_value(key), out_st.get_value(key)))
+        if self.logged_conversions.get(conv.get_name()) == changes:
+            return
+        self.logged_conversions[conv.get_name()] = changes
+        if not changes:
+            logger.debug("{0}: passthrough, {1}".format(conv.get_name(), in_caps.to_string()))
+        for (key, old, new) in changes:
+            logger.info("{0}: {1} converted from {2} to {3}.".format(conv.get_name(), key, old, new))
+
+    def get_element_latency(self, element):
+        #
+        # Latency queries are answered for the whole upstream chain, the
+        # element's own share is the difference between both sides of it.
+        #
+        def query(pad):
+            q = Gst.Query.new_latency()
+            if pad and pad.query(q):
+                return q.parse_latency()[1]
+            return 0
+
+        src = query(element.get_static_pad("src"))
+        sink = query(element.get_static_pad("sink").get_peer())
+        return max(0, src - sink) / Gst.SECOND
+
+    def get_queue_fill(self, queue):
+        #
+        # Fill level in percent of whichever limit is closest to being hit.
+        #
+        fill = 0.0
+        for limit in ("buffers", "bytes", "time"):
+            max_size = queue.get_property("max-size-{0}".format(limit))
+            if max_size:
+                level = queue.get_property("current-level-{0}".format(limit))
+                fill = max(fill, 100.0 * level / max_size)
+        return fill
+
+    def get_bytes_written(self):
+        if self.output_mode == OUTPUT_FILE:
+            (ret, pos) = self.sink.query_position(Gst.Format.BYTES)
+            if ret:
+                return pos
+            try:
+                return os.path.getsize(self.tempfile)
+            except OSError:
+                return 0
+
+        if self.output_mode == OUTPUT_REPLAY:
+            closed = [frag for (frag, end) in self.replay_fragments]
+        else:
+            closed = self.segments
+        written = 0
+        for fname in closed:
+            try:
+                written += os.path.getsize(fname)
+            except OSError:
+                pass
+        filesink = self.sink.get_by_name("sink")
+        if filesink:
+            (ret, pos) = filesink.query_position(Gst.Format.BYTES)
+            if ret:
+                written += pos
+        return written
+
+    def get_damage_stats(self):
+        """Returns pixel copy statistics for damage driven capture.
+
+        Args:
+            None
+
+        Returns:
+            Dictionary with the size of the capture area, number of damaged
+            pixels copied in total and in the last second and the ratio
+            against copying full frames at the current framerate. None if
+            damage driven capture is not in use.
+
+        Raises:
+            None
+        """
+        if not self.damage_monitor or not prefs.capture_damage:
+            return None
+        stats = self.damage_monitor.get_stats()
+        stats["full_copy_pixels_sec"] = stats["area_pixels"] * int(prefs.framerate)
+        if stats["full_copy_pixels_sec"]:
+            stats["copy_ratio"] = stats["damaged_pixels_sec"] / stats["full_copy_pixels_sec"]
+        else:
+            stats["copy_ratio"] = 0.0
+        return stats
+
     def on_message(self, bus, message):
         t = message.type
         if t == Gst.MessageType.EOS:
             logger.debug("Received EOS, setting pipeline to NULL.")
+            if self.idle_gate:
+                stats = self.get_stats()
+                logger.info("Idle pause skipped {0:.1f}s, {1} frames, ~{2:.1f} MB and {3:.1f}s of CPU time.".format(
+                            stats["idle_skipped"],
+                            stats.get("idle_frames_skipped", 0),
+                            stats["idle_bytes_saved"] / (1024 * 1024),
+                            stats["idle_cpu_saved"]))
+            #
+            # Monitors write their last row with the running time, the
+            # pipeline has no clock any more once it is set to NULL.
+            #
+            if self.damage_monitor:
+                self.damage_monitor.stop()
+            if self.sync_monitor:
+                self.sync_monitor.stop()
+            if self.adaptive:
+                self.adaptive.stop()
             self.pipeline.set_state(Gst.State.NULL)
+            if self.replay_dir:
+                shutil.rmtree(self.replay_dir, ignore_errors=True)
+                os.close(self.replay_lock)
             logger.debug("Emitting flush-done.")
             self.emit("flush-done")
         elif t == Gst.MessageType.ERROR:
             logger.debug("Received an error message: %s", message.parse_error()[1])
+        elif t == Gst.MessageType.ELEMENT:
+            st = message.get_structure()
+            if st and st.get_name() == "splitmuxsink-fragment-closed":
+                self.cb_fragment_closed(st.get_string("location"),
+                                        st.get_value("running-time"))
+            elif st and st.get_name() == "level":
+                self.cb_level(message.src.get_name(), st)
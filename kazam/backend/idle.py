@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+#       idle.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import time
+import logging
+import resource
+logger = logging.getLogger("Idle")
+
+from gi.repository import GLib, Gst
+
+from kazam.backend.prefs import IDLE_CHECK_INTERVAL
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class IdleGate(object):
+    """Stops encoding while nothing happens on screen or in the sources.
+
+    Every stream passes a valve right in front of its encoder. When there
+    was no screen damage and no audio peak above the level threshold for
+    the timeout, all valves start dropping buffers. The pipeline keeps
+    running, sources are drained and nothing downstream of the valves is
+    woken up.
+
+    Damage events and level messages both arrive in the main loop, the
+    valves are opened as soon as one of them reports activity, so the
+    next captured frame is encoded again. The idle time is taken out of
+    the recording with a pad offset on every valve, the same one for all
+    streams, so the output has no gaps and A/V sync is kept.
+    """
+
+    def __init__(self, pipeline, timeout, level):
+        self.pipeline = pipeline
+        self.timeout = timeout
+        self.level = level
+        self.valves = []
+        self.closed = False
+        self.closed_at = 0
+        self.skipped = 0
+        self.last_activity = None
+        self.tick_id = None
+
+        # CPU time and wall time spent with the gate open and closed
+        self.mark = None
+        self.active_cpu = 0.0
+        self.active_wall = 0.0
+        self.idle_cpu = 0.0
+        self.idle_wall = 0.0
+
+    def add_valve(self, name):
+        valve = Gst.ElementFactory.make("valve", name)
+        self.valves.append(valve)
+        return valve
+
+    def watch_damage(self, monitor):
+        monitor.connect("damage", self.cb_damage)
+
+    def start(self):
+        self.last_activity = time.monotonic()
+        self.mark = (self.last_activity, cpu_time())
+        self.tick_id = GLib.timeout_add(IDLE_CHECK_INTERVAL, self.cb_tick)
+        logger.debug("Idle gate started, timeout {0}s, level {1}dB.".format(self.timeout, self.level))
+
+    def stop(self):
+        #
+        # Valves drop events too, they have to be open for EOS to get
+        # through.
+        #
+        if self.tick_id:
+            GLib.source_remove(self.tick_id)
+            self.tick_id = None
+        if self.closed:
+            self.open()
+        self.account()
+        logger.debug("Idle gate stopped.")
+
+    def cb_damage(self, monitor, pixels):
+        self.activity()
+
+    def audio_level(self, peak):
+        if peak > self.level:
+            self.activity()
+
+    def activity(self):
+        self.last_activity = time.monotonic()
+        if self.closed:
+            self.open()
+
+    def cb_tick(self):
+        if not self.closed and time.monotonic() - self.last_activity >= self.timeout:
+            self.close()
+        return True
+
+    def close(self):
+        self.account()
+        self.closed_at = self.get_running_time()
+        for valve in self.valves:
+            valve.set_property("drop", True)
+        self.closed = True
+        logger.debug("Idle, encoding stopped.")
+
+    def open(self):
+        self.account()
+        self.skipped += max(0, self.get_running_time() - self.closed_at)
+        for valve in self.valves:
+            valve.get_static_pad("src").set_offset(-self.skipped)
+            valve.set_property("drop", False)
+        self.closed = False
+        logger.debug("Activity, encoding resumed. Skipped {0:.1f}s.".format(self.skipped / Gst.SECOND))
+
+    def account(self):
+        if not self.mark:
+            return
+        now = (time.monotonic(), cpu_time())
+        (wall, cpu) = (now[0] - self.mark[0], now[1] - self.mark[1])
+        if self.closed:
+            self.idle_wall += wall
+            self.idle_cpu += cpu
+        else:
+            self.active_wall += wall
+            self.active_cpu += cpu
+        self.mark = now
+
+    def get_running_time(self):
+        clock = self.pipeline.get_clock()
+        if not clock:
+            return 0
+        return clock.get_time() - self.pipeline.get_base_time()
+
+    def get_skipped(self):
+        """Returns the idle time taken out of the recording, in seconds."""
+        skipped = self.skipped
+        if self.closed:
+            skipped += max(0, self.get_running_time() - self.closed_at)
+        return skipped / Gst.SECOND
+
+    def get_cpu_saved(self):
+        #
+        # What the idle time would have cost at the CPU load measured while
+        # recording, minus what it did cost.
+        #
+        if not self.active_wall or not self.idle_wall:
+            return 0.0
+        rate = self.active_cpu / self.active_wall
+        return max(0.0, rate * self.idle_wall - self.idle_cpu)
+
+    def get_stats(self):
+        self.account()
+        return {"idle": 1 if self.closed else 0,
+                "idle_skipped": self.get_skipped(),
+                "idle_cpu_saved": self.get_cpu_saved()}
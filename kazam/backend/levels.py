@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+#       levels.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import logging
+logger = logging.getLogger("Levels")
+
+from gi.repository import GObject, Gst
+
+from kazam.utils import level_to_fraction
+from kazam.backend.prefs import LEVEL_METER_INTERVAL, LEVEL_METER_RATE, LEVEL_METER_FLOOR
+
+Gst.init(None)
+
+# One monitor per PulseAudio source, shared by every meter showing it
+MONITORS = {}
+
+
+def get_level_monitor(device):
+    if device not in MONITORS:
+        MONITORS[device] = LevelMonitor(device)
+    return MONITORS[device]
+
+
+class LevelMonitor(GObject.GObject):
+    """Peak meter for a single PulseAudio source, outside of any recording.
+
+    PulseAudio hands over mono audio at LEVEL_METER_RATE, the level element
+    sums it up and posts one message every LEVEL_METER_INTERVAL
+    milliseconds. Samples never reach Python, only those messages do and
+    they are delivered from the main loop, so the meter costs a handful of
+    wakeups per second no matter what the source rate is.
+
+    "level" is emitted with the peak level as a 0.0 - 1.0 fraction. The
+    source is only captured while at least one user holds the monitor.
+    """
+    __gsignals__ = {"level": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (GObject.TYPE_DOUBLE,),),
+                    }
+
+    def __init__(self, device):
+        GObject.GObject.__init__(self)
+        self.device = device
+        self.pipeline = None
+        self.bus = None
+        self.last = None
+        self.users = 0
+
+    def acquire(self):
+        self.users += 1
+        if self.users == 1:
+            self.start()
+
+    def release(self):
+        self.users = max(0, self.users - 1)
+        if not self.users:
+            self.stop()
+
+    def start(self):
+        if self.pipeline:
+            return
+        logger.debug("Starting level monitor on {0}".format(self.device))
+        self.pipeline = Gst.Pipeline(name="level_monitor")
+
+        src = Gst.ElementFactory.make("pulsesrc", "level_src")
+        src.set_property("device", self.device)
+        src.set_property("client-name", "Kazam level meter")
+        src.set_property("latency-time", LEVEL_METER_INTERVAL * 1000)
+        src.set_property("buffer-time", LEVEL_METER_INTERVAL * 4000)
+
+        caps = Gst.ElementFactory.make("capsfilter", "level_caps")
+        caps.set_property("caps", Gst.caps_from_string("audio/x-raw, rate={0}, channels=1".format(LEVEL_METER_RATE)))
+
+        level = Gst.ElementFactory.make("level", "level_meter")
+        level.set_property("post-messages", True)
+        level.set_property("interval", LEVEL_METER_INTERVAL * Gst.MSECOND)
+
+        sink = Gst.ElementFactory.make("fakesink", "level_sink")
+        sink.set_property("sync", False)
+
+        for element in (src, caps, level, sink):
+            self.pipeline.add(element)
+        src.link(caps)
+        caps.link(level)
+        level.link(sink)
+
+        self.bus = self.pipeline.get_bus()
+        self.bus.add_signal_watch()
+        self.bus.connect("message::element", self.cb_element)
+        self.bus.connect("message::error", self.cb_error)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def stop(self):
+        if not self.pipeline:
+            return
+        logger.debug("Stopping level monitor on {0}".format(self.device))
+        self.pipeline.set_state(Gst.State.NULL)
+        self.bus.remove_signal_watch()
+        self.pipeline = None
+        self.bus = None
+        self.last = None
+        self.emit("level", 0.0)
+
+    def cb_element(self, bus, message):
+        st = message.get_structure()
+        if not st or st.get_name() != "level":
+            return
+        fraction = level_to_fraction(max(st.get_value("peak")), LEVEL_METER_FLOOR)
+        #
+        # Rounded to the meter resolution, unchanged values are not redrawn
+        # and silence is the common case.
+        #
+        if fraction != self.last:
+            self.last = fraction
+            self.emit("level", fraction)
+
+    def cb_error(self, bus, message):
+        logger.warning("Level monitor on {0} failed: {1}".format(self.device, message.parse_error()[1]))
+        self.stop()
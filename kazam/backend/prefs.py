@@ -20,6 +20,7 @@
 #       MA 02110-1301, USA.
 
 import os
+import sys
 import logging
 from os.path import expanduser
 from gettext import gettext as _
@@ -50,6 +51,7 @@ class Prefs():
         # GUI preferences and stuff
         #
         self.capture_cursor = False
+        self.capture_damage = False
         self.capture_speakers = False
         self.capture_microphone = False
 
@@ -61,8 +63,75 @@ class Prefs():
         self.speakers_source = None
         self.microphone_source = None
 
-        self.speakers_volume = 0
-        self.microphone_volume = 0
+        #
+        # Linear gain applied to the sources inside the recording pipeline
+        #
+        self.speakers_volume = 1.0
+        self.microphone_volume = 1.0
+
+        #
+        # pulsesrc buffering, one of AUDIO_LATENCY_PROFILES per source
+        #
+        self.speakers_profile = 1
+        self.microphone_profile = 1
+
+        #
+        # Record speakers and microphone as two audio tracks, not mixed
+        #
+        self.separate_tracks = False
+
+        #
+        # Record only sound, no screen capture at all
+        #
+        self.audio_only = False
+
+        #
+        # A/V sync measurements, written next to the recording, and
+        # automatic drift compensation
+        #
+        self.sync_log = False
+        self.sync_compensate = False
+
+        #
+        # Skip encoding while nothing changes on screen and all sources are
+        # quieter than idle_level dBFS for idle_timeout seconds
+        #
+        self.idle_pause = False
+        self.idle_timeout = 10
+        self.idle_level = -50
+
+        #
+        # Variable frame rate, static frames are not encoded. Minimum and
+        # maximum time between frames in milliseconds, a minimum of 0
+        # follows the framerate.
+        #
+        self.vfr = False
+        self.vfr_min_interval = 0
+        self.vfr_max_interval = 1000
+
+        #
+        # Video encoder settings, one of ENCODER_PRESETS
+        #
+        self.encoder_preset = 0
+
+        #
+        # Step the encoder and the framerate down while the pipeline can't
+        # keep up and back up once it can.
+        #
+        self.adaptive = False
+
+        #
+        # Upper bound in MB for everything the pipeline queues hold
+        # together, per queue limits are in the queues section.
+        #
+        self.queue_memory_limit = 512
+
+        #
+        # Recordings are scaled down to fit this size, 0 records at the
+        # size of the screen or area.
+        #
+        self.output_width = 0
+        self.output_height = 0
 
         self.countdown_splash = True
         self.silent_start = False
@@ -76,12 +145,24 @@ class Prefs():
         # Capture related stuff
         #
         self.codec = None
+        self.audio_codec = 0
         self.pa_q = None
         self.framerate = 15
         self.autosave_video = False
         self.autosave_video_dir = None
         self.autosave_video_file = None
 
+        self.instant_replay = False
+        self.replay_seconds = 30
+        self.replay_in_memory = False
+
+        self.crash_safe = False
+
+        self.segment_recording = False
+        self.segment_seconds = 600
+        self.segment_size_mb = 0
+        self.segment_max_files = 0
+
         self.autosave_picture = False
         self.autosave_picture_dir = None
         self.autosave_picture_file = None
@@ -111,6 +192,7 @@ class Prefs():
         #
         self.debug = False
         self.test = False
+        self.test_audio = False
         self.dist = ('Ubuntu', '12.10', 'quantal')
         self.silent = False
         self.sound = True
@@ -131,21 +213,76 @@ class Prefs():
         self.logger.debug("Getting Audio sources.")
         try:
             self.audio_sources = prefs.pa_q.get_audio_sources()
-            for src in self.audio_sources:
-                if "Monitor" in src[2]:
-                    self.speaker_sources.append(src)
-                else:
-                    self.mic_sources.append(src)
+            self.split_audio_sources()
 
             if prefs.debug:
                 for src in self.audio_sources:
                     self.logger.debug(" Device found: ")
                     for item in src:
                         self.logger.debug("  - {0}".format(item))
+
+            prefs.pa_q.connect("sources-changed", self.cb_sources_changed)
         except:
             # Something went wrong, just fallback to no-sound
             self.logger.warning("Unable to find any audio devices.")
-            self.audio_sources = [[0, _("Unknown"), _("Unknown")]]
+            self.audio_sources = [[0, _("Unknown"), _("Unknown"), False]]
+
+    def split_audio_sources(self):
+        self.speaker_sources = [src for src in self.audio_sources if src[3]]
+        self.mic_sources = [src for src in self.audio_sources if not src[3]]
+
+    def cb_sources_changed(self, pa_q):
+        #
+        # Keep the selected sources selected by name, their position in the
+        # lists may have changed.
+        #
+        speaker = self.get_source_name(self.speaker_sources, self.audio_source)
+        mic = self.get_source_name(self.mic_sources, self.audio2_source)
+
+        self.audio_sources = pa_q.get_cached_sources()
+        self.split_audio_sources()
+        self.logger.debug("Audio sources changed, {0} speakers, {1} microphones.".format(len(self.speaker_sources),
+                                                                                      len(self.mic_sources)))
+
+        #
+        # A source that went away is not swapped for whatever is first in
+        # the list, it is no longer recorded until one is picked again.
+        #
+        self.audio_source = self.get_source_position(self.speaker_sources, speaker)
+        if self.audio_source is None:
+            if speaker and self.capture_speakers:
+                self.logger.warning("Speakers {0} went away, not recording them.".format(speaker))
+                self.capture_speakers = False
+            self.audio_source = 0
+
+        self.audio2_source = self.get_source_position(self.mic_sources, mic)
+        if self.audio2_source is None:
+            if mic and self.capture_microphone:
+                self.logger.warning("Microphone {0} went away, not recording it.".format(mic))
+                self.capture_microphone = False
+            self.audio2_source = 0
+
+    def get_source_spec(self, name):
+        """Returns (format, rate, channels) of a PulseAudio source or None."""
+        if self.pa_q:
+            src = self.pa_q.get_source_by_name(name)
+            return src[4] if src else None
+        for src in self.audio_sources or []:
+            if src[1] == name:
+                return src[4]
+        return None
+
+    def get_source_name(self, sources, position):
+        try:
+            return sources[position][1]
+        except (IndexError, TypeError):
+            return None
+
+    def get_source_position(self, sources, name):
+        for (position, src) in enumerate(sources):
+            if src[1] == name:
+                return position
+        return None
 
     def get_dirs(self):
         paths = {}
@@ -198,6 +335,10 @@ class Prefs():
     def read_config(self):
         self.audio_source = int(self.config.get("main", "audio_source"))
         self.audio2_source = int(self.config.get("main", "audio2_source"))
+        self.speakers_volume = float(self.config.get("main", "audio_gain"))
+        self.microphone_volume = float(self.config.get("main", "audio2_gain"))
+        self.speakers_profile = int(self.config.get("main", "audio_profile"))
+        self.microphone_profile = int(self.config.get("main", "audio2_profile"))
         self.main_x = int(self.config.get("main", "last_x"))
         self.main_y = int(self.config.get("main", "last_y"))
         self.countdown_timer = float(self.config.get("main", "counter"))
@@ -210,6 +351,31 @@ class Prefs():
         self.framerate = float(self.config.get("main", "framerate"))
 
         self.capture_cursor = self.config.getboolean("main", "capture_cursor")
+        self.capture_damage = self.config.getboolean("main", "capture_damage")
+        self.instant_replay = self.config.getboolean("main", "instant_replay")
+        self.replay_seconds = int(self.config.get("main", "replay_seconds"))
+        self.replay_in_memory = self.config.getboolean("main", "replay_in_memory")
+        self.crash_safe = self.config.getboolean("main", "crash_safe")
+        self.segment_recording = self.config.getboolean("main", "segment_recording")
+        self.segment_seconds = int(self.config.get("main", "segment_seconds"))
+        self.segment_size_mb = int(self.config.get("main", "segment_size_mb"))
+        self.segment_max_files = int(self.config.get("main", "segment_max_files"))
+        self.separate_tracks = self.config.getboolean("main", "separate_tracks")
+        self.audio_codec = int(self.config.get("main", "audio_codec"))
+        self.audio_only = self.config.getboolean("main", "audio_only")
+        self.sync_log = self.config.getboolean("main", "sync_log")
+        self.sync_compensate = self.config.getboolean("main", "sync_compensate")
+        self.idle_pause = self.config.getboolean("main", "idle_pause")
+        self.idle_timeout = int(self.config.get("main", "idle_timeout"))
+        self.idle_level = int(self.config.get("main", "idle_level"))
+        self.vfr = self.config.getboolean("main", "vfr")
+        self.vfr_min_interval = int(self.config.get("main", "vfr_min_interval"))
+        self.vfr_max_interval = int(self.config.get("main", "vfr_max_interval"))
+        self.encoder_preset = int(self.config.get("main", "encoder_preset"))
+        self.adaptive = self.config.getboolean("main", "adaptive")
+        self.queue_memory_limit = int(self.config.get("main", "queue_memory_limit"))
+        self.output_width = int(self.config.get("main", "output_width"))
+        self.output_height = int(self.config.get("main", "output_height"))
         self.capture_microphone = self.config.getboolean("main", "capture_microphone")
         self.capture_speakers = self.config.getboolean("main", "capture_speakers")
 
@@ -254,6 +420,31 @@ class Prefs():
 
     def save_config(self):
         self.config.set("main", "capture_cursor", self.capture_cursor)
+        self.config.set("main", "capture_damage", self.capture_damage)
+        self.config.set("main", "instant_replay", self.instant_replay)
+        self.config.set("main", "replay_seconds", self.replay_seconds)
+        self.config.set("main", "replay_in_memory", self.replay_in_memory)
+        self.config.set("main", "crash_safe", self.crash_safe)
+        self.config.set("main", "segment_recording", self.segment_recording)
+        self.config.set("main", "segment_seconds", self.segment_seconds)
+        self.config.set("main", "segment_size_mb", self.segment_size_mb)
+        self.config.set("main", "segment_max_files", self.segment_max_files)
+        self.config.set("main", "separate_tracks", self.separate_tracks)
+        self.config.set("main", "audio_codec", self.audio_codec)
+        self.config.set("main", "audio_only", self.audio_only)
+        self.config.set("main", "sync_log", self.sync_log)
+        self.config.set("main", "sync_compensate", self.sync_compensate)
+        self.config.set("main", "idle_pause", self.idle_pause)
+        self.config.set("main", "idle_timeout", self.idle_timeout)
+        self.config.set("main", "idle_level", self.idle_level)
+        self.config.set("main", "vfr", self.vfr)
+        self.config.set("main", "vfr_min_interval", self.vfr_min_interval)
+        self.config.set("main", "vfr_max_interval", self.vfr_max_interval)
+        self.config.set("main", "encoder_preset", self.encoder_preset)
+        self.config.set("main", "adaptive", self.adaptive)
+        self.config.set("main", "queue_memory_limit", self.queue_memory_limit)
+        self.config.set("main", "output_width", self.output_width)
+        self.config.set("main", "output_height", self.output_height)
         self.config.set("main", "capture_speakers", self.capture_speakers)
         self.config.set("main", "capture_microphone", self.capture_microphone)
 
@@ -266,6 +457,13 @@ class Prefs():
         if self.sound:
             self.config.set("main", "audio_source", self.audio_source)
             self.config.set("main", "audio2_source", self.audio2_source)
+            self.config.set("main", "audio_gain", self.speakers_volume)
+            self.config.set("main", "audio2_gain", self.microphone_volume)
+            self.config.set("main", "audio_profile", self.speakers_profile)
+            self.config.set("main", "audio2_profile", self.microphone_profile)
+        # Replaced by audio_gain and audio2_gain
+        for key in ("audio_volume", "audio2_volume"):
+            self.config.remove_option("main", key)
 
         self.config.set("main", "countdown_splash", self.countdown_splash)
         self.config.set("main", "counter", self.countdown_timer)
@@ -368,6 +566,104 @@ def detect_codecs():
     return codecs_supported
 
 
+def detect_audio_codecs():
+    logger = logging.getLogger("Prefs-DC")
+    from gi.repository import Gst
+
+    Gst.init(None)
+
+    codecs_supported = []
+    for codec in AUDIO_CODEC_LIST:
+        if Gst.ElementFactory.find(codec[1]):
+            codecs_supported.append(codec[0])
+            logger.debug("Supported audio encoder: {0}.".format(codec[2]))
+        else:
+            logger.debug("Unable to find {0} GStreamer plugin - support disabled.".format(codec[1]))
+    return codecs_supported
+
+
+def muxer_accepts(muxer, caps):
+    """Checks the sink pad templates of a muxer for compatible caps."""
+    from gi.repository import Gst
+
+    factory = Gst.ElementFactory.find(muxer)
+    if not factory:
+        return False
+    for template in factory.get_static_pad_templates():
+        if template.direction == Gst.PadDirection.SINK and \
+           template.get_caps().can_intersect(Gst.Caps.from_string(caps)):
+            return True
+    return False
+
+
+def get_audio_codec(codec):
+    """Returns the audio codec to record with the given video codec.
+
+    The selected audio codec is used if the muxer of the video codec can
+    take it, otherwise the first codec the muxer supports.
+    """
+    muxer = codec_muxer(codec)
+    supported = [c for c in MUXER_AUDIO_CODECS[muxer]
+                 if muxer_accepts(muxer, AUDIO_CODEC_LIST[c][4])]
+    if prefs.audio_codec in supported or not supported:
+        return prefs.audio_codec
+    return supported[0]
+
+
+def get_encoder_settings(preset, element):
+    """Returns the (property, value) pairs of an encoder preset.
+
+    Presets are stored in the configuration file, one section per preset
+    with a line of property=value pairs for every encoder it tunes.
+
+    Args:
+        preset: one of ENCODER_PRESETS.
+        element: GStreamer element name of the encoder.
+
+    Returns:
+        List of (property, value) string tuples, empty for encoders that
+        have no presets.
+
+    Raises:
+        None
+    """
+    if element not in PRESET_ENCODERS:
+        return []
+    return parse_settings(prefs.config.get(ENCODER_PRESETS[preset][1], element))
+
+
+def get_queue_settings(name):
+    """Returns the limits and drop policy of a pipeline queue.
+
+    Args:
+        name: element name of the queue, a key in the queues section.
+
+    Returns:
+        Tuple of the byte limit, time limit in nanoseconds and leaky
+        policy as a string, limits of 0 mean no limit.
+
+    Raises:
+        None
+    """
+    settings = dict(parse_settings(prefs.config.get("queues", name) or ""))
+    try:
+        max_bytes = int(float(settings.get("mb", 0)) * 1024 * 1024)
+        max_time = int(settings.get("ms", 0)) * 1000000
+    except ValueError:
+        prefs.logger.warning("Invalid limits for {0}, queue is not limited.".format(name))
+        (max_bytes, max_time) = (0, 0)
+    return (max_bytes, max_time, settings.get("leaky", "no"))
+
+
+def parse_settings(line):
+    settings = []
+    for item in line.split():
+        (prop, sep, value) = item.partition("=")
+        if sep:
+            settings.append((prop, value))
+    return settings
+
+
 def get_codec(codec):
     for c in CODEC_LIST:
         if c[0] == codec:
@@ -387,16 +683,236 @@ CODEC_HUFF = 3
 CODEC_JPEG = 4
 
 #
-# Number, gstreamer element name, string description, file extension, advanced
+# Number, gstreamer element name, string description, file extension, advanced,
+# muxer
 #
 
-CODEC_LIST = [[0, None, 'RAW (AVI)', '.avi', True],
-              [1, 'vp8enc', 'VP8 (WEBM)', '.webm', False],
-              [2, 'x264enc', 'H264 (MP4)', '.mp4', False],
-              [3, 'avenc_huffyuv', 'HUFFYUV (AVI)', '.avi', True],
-              [4, 'avenc_ljpeg', 'Lossless JPEG (AVI)', '.avi', True],
+CODEC_LIST = [[0, None, 'RAW (AVI)', '.avi', True, 'avimux'],
+              [1, 'vp8enc', 'VP8 (WEBM)', '.webm', False, 'webmmux'],
+              [2, 'x264enc', 'H264 (MP4)', '.mp4', False, 'mp4mux'],
+              [3, 'avenc_huffyuv', 'HUFFYUV (AVI)', '.avi', True, 'avimux'],
+              [4, 'avenc_ljpeg', 'Lossless JPEG (AVI)', '.avi', True, 'avimux'],
               ]
 
+
+def codec_extension(codec):
+    """Returns the file extension for recordings made with codec."""
+    if prefs.audio_only:
+        return audio_container()[1]
+    if prefs.crash_safe and CODEC_LIST[codec][3] == ".avi":
+        return ".mkv"
+    return CODEC_LIST[codec][3]
+
+
+def codec_muxer(codec):
+    """Returns the name of the muxer used for recordings made with codec."""
+    if prefs.audio_only:
+        return audio_container()[0]
+    if prefs.crash_safe and CODEC_LIST[codec][5] == "avimux":
+        return "matroskamux"
+    return CODEC_LIST[codec][5]
+
+# Audio codecs
+AUDIO_CODEC_MP3 = 0
+AUDIO_CODEC_VORBIS = 1
+AUDIO_CODEC_OPUS_VOICE = 2
+AUDIO_CODEC_OPUS_MUSIC = 3
+
+#
+# Number, gstreamer element name, string description, encoder settings,
+# encoded caps. Opus settings favour low latency, 10ms frames for voice.
+#
+
+AUDIO_CODEC_LIST = [[0, 'lamemp3enc', 'MP3', {"quality": "0"}, 'audio/mpeg'],
+                    [1, 'vorbisenc', 'Vorbis', {"quality": "1"}, 'audio/x-vorbis'],
+                    [2, 'opusenc', 'Opus (voice)', {"bitrate": "32000",
+                                                    "complexity": "5",
+                                                    "audio-type": "voice",
+                                                    "frame-size": "10"}, 'audio/x-opus'],
+                    [3, 'opusenc', 'Opus (music)', {"bitrate": "128000",
+                                                    "complexity": "10",
+                                                    "audio-type": "generic",
+                                                    "frame-size": "20"}, 'audio/x-opus'],
+                    ]
+
+# Muxer and file extension of audio-only recordings for every audio codec
+AUDIO_CONTAINERS = {AUDIO_CODEC_MP3: ["id3v2mux", ".mp3"],
+                    AUDIO_CODEC_VORBIS: ["oggmux", ".ogg"],
+                    AUDIO_CODEC_OPUS_VOICE: ["oggmux", ".opus"],
+                    AUDIO_CODEC_OPUS_MUSIC: ["oggmux", ".opus"],
+                    }
+
+
+def audio_container():
+    """Returns the muxer and file extension for audio-only recordings."""
+    (muxer, ext) = AUDIO_CONTAINERS[prefs.audio_codec]
+    #
+    # splitmuxsink needs a muxer with request pads, MP3 segments and
+    # replays go into Matroska audio files instead.
+    #
+    if muxer == "id3v2mux" and (prefs.instant_replay or prefs.segment_recording):
+        return ("matroskamux", ".mka")
+    return (muxer, ext)
+
+# Audio codecs every muxer can take, the first one is the fallback
+MUXER_AUDIO_CODECS = {"avimux": [AUDIO_CODEC_MP3],
+                      "id3v2mux": [AUDIO_CODEC_MP3],
+                      "oggmux": [AUDIO_CODEC_VORBIS, AUDIO_CODEC_OPUS_VOICE, AUDIO_CODEC_OPUS_MUSIC],
+                      "mp4mux": [AUDIO_CODEC_MP3, AUDIO_CODEC_OPUS_VOICE, AUDIO_CODEC_OPUS_MUSIC],
+                      "webmmux": [AUDIO_CODEC_VORBIS, AUDIO_CODEC_OPUS_VOICE, AUDIO_CODEC_OPUS_MUSIC],
+                      "matroskamux": [AUDIO_CODEC_MP3, AUDIO_CODEC_VORBIS,
+                                      AUDIO_CODEC_OPUS_VOICE, AUDIO_CODEC_OPUS_MUSIC],
+                      }
+
+# Audio codec names used on the command line
+AUDIO_CODEC_NAMES = {"mp3": AUDIO_CODEC_MP3,
+                     "vorbis": AUDIO_CODEC_VORBIS,
+                     "opus-voice": AUDIO_CODEC_OPUS_VOICE,
+                     "opus-music": AUDIO_CODEC_OPUS_MUSIC,
+                     }
+
+# Encoder presets
+ENCODER_PRESET_DEFAULT = 0
+ENCODER_PRESET_STILL = 1
+ENCODER_PRESET_LONG_GOP = 2
+ENCODER_PRESET_TEXT = 3
+
+#
+# Number, configuration section, description. Still image is for mostly
+# static screens, long GOP puts keyframes only on scene changes and text
+# keeps small fonts sharp at a higher bitrate.
+#
+
+ENCODER_PRESETS = [[0, 'preset_default', 'Default'],
+                   [1, 'preset_still', 'Still image'],
+                   [2, 'preset_long_gop', 'Long GOP'],
+                   [3, 'preset_text', 'Sharp text'],
+                   ]
+
+# Encoders that presets have settings for
+PRESET_ENCODERS = ["x264enc", "vp8enc"]
+
+# Encoder preset names used on the command line
+ENCODER_PRESET_NAMES = {"default": ENCODER_PRESET_DEFAULT,
+                        "still": ENCODER_PRESET_STILL,
+                        "long-gop": ENCODER_PRESET_LONG_GOP,
+                        "text": ENCODER_PRESET_TEXT,
+                        }
+
+# Output sizes offered in the preferences, width, height and description
+OUTPUT_SIZES = [[0, 0, 'Native'],
+                [2560, 1440, '2560x1440'],
+                [1920, 1080, '1920x1080'],
+                [1280, 720, '1280x720'],
+                ]
+
+# videoscale method for the output size, bilinear is the cheapest one
+# that still keeps text readable
+OUTPUT_SCALE_METHOD = "bilinear"
+
+# Codec names used on the command line
+CODEC_NAMES = {"raw": CODEC_RAW,
+               "vp8": CODEC_VP8,
+               "h264": CODEC_H264,
+               "huffyuv": CODEC_HUFF,
+               "ljpeg": CODEC_JPEG,
+               }
+
+# Length of a fragment in crash-safe MP4 output, in milliseconds
+MP4_FRAGMENT_DURATION = 1000
+
+# Audio level reporting interval in milliseconds and the peak level, in
+# dBFS, that counts as clipping
+LEVEL_INTERVAL = 100
+LEVEL_CLIP_DB = -0.1
+
+# Level meters outside of recordings. Update interval in milliseconds,
+# sample rate requested from PulseAudio and the dBFS level shown as an
+# empty meter.
+LEVEL_METER_INTERVAL = 50
+LEVEL_METER_RATE = 8000
+LEVEL_METER_FLOOR = -60
+
+# How often live recording statistics are refreshed, in milliseconds
+STATS_INTERVAL = 1000
+
+# pulsesrc latency profiles
+AUDIO_PROFILE_LOW_LATENCY = 0
+AUDIO_PROFILE_BALANCED = 1
+AUDIO_PROFILE_POWER_SAVER = 2
+
+#
+# Number, description, buffer-time and latency-time in microseconds.
+# Balanced are the pulsesrc defaults, every latency-time is one wakeup.
+#
+
+AUDIO_LATENCY_PROFILES = [[0, 'Low latency', 40000, 5000],
+                          [1, 'Balanced', 200000, 10000],
+                          [2, 'Power saver', 1000000, 50000],
+                          ]
+
+# Latency profile names used on the command line
+AUDIO_PROFILE_NAMES = {"low-latency": AUDIO_PROFILE_LOW_LATENCY,
+                       "balanced": AUDIO_PROFILE_BALANCED,
+                       "power-saver": AUDIO_PROFILE_POWER_SAVER,
+                       }
+
+# A/V sync measurement interval and the offset that triggers drift
+# compensation, both in milliseconds, and how many buffers of every
+# source are measured per interval. The sync log is written next to the
+# recording with this suffix.
+SYNC_INTERVAL = 1000
+SYNC_DRIFT_LIMIT = 40
+SYNC_SAMPLE_BUFFERS = 8
+SYNC_LOG_SUFFIX = ".sync.csv"
+
+# How often the idle gate checks for inactivity, in milliseconds
+IDLE_CHECK_INTERVAL = 250
+
+# Muxers that store a timestamp for every frame, AVI is always constant
+# frame rate
+VFR_MUXERS = ["webmmux", "matroskamux", "mp4mux"]
+
+# Adaptive quality. Encoder lag is checked every ADAPTIVE_INTERVAL
+# milliseconds, above ADAPTIVE_HIGH_LAG or with the capture queue filled to
+# ADAPTIVE_HIGH_FILL percent for ADAPTIVE_DOWN_TICKS checks in a row quality
+# goes one step down, below ADAPTIVE_LOW_LAG for ADAPTIVE_UP_TICKS checks
+# it goes one step back up. The framerate is never halved below
+# ADAPTIVE_MIN_FRAMERATE. Every step is logged next to the recording.
+ADAPTIVE_INTERVAL = 1000
+ADAPTIVE_HIGH_LAG = 250
+ADAPTIVE_LOW_LAG = 100
+ADAPTIVE_HIGH_FILL = 90
+ADAPTIVE_DOWN_TICKS = 2
+ADAPTIVE_UP_TICKS = 10
+ADAPTIVE_MIN_FRAMERATE = 5
+ADAPT_LOG_SUFFIX = ".adapt.csv"
+
+# Queues that hold raw frames or samples, the only ones that may drop
+# buffers when they are full. Dropping encoded data corrupts the stream.
+LEAKY_QUEUES = ["queue_v1", "queue_a_in", "queue_a2_in"]
+
+# Logs that follow a recording when it is saved
+SIDECAR_SUFFIXES = [SYNC_LOG_SUFFIX, ADAPT_LOG_SUFFIX]
+
+# Screencast output modes
+OUTPUT_FILE = 0
+OUTPUT_SEGMENTS = 1
+OUTPUT_REPLAY = 2
+
+# Length of a single instant replay fragment in seconds
+REPLAY_FRAGMENT_TIME = 5
+
+# Where replay fragments are kept when they are held in memory
+REPLAY_MEMORY_DIR = os.environ.get("XDG_RUNTIME_DIR", "/dev/shm")
+
+# PulseAudio sample formats that volume and level handle as they are, in
+# native byte order. Anything else is converted by PulseAudio.
+if sys.byteorder == "little":
+    PA_SAMPLE_FORMATS = {3: "S16LE", 5: "F32LE", 7: "S32LE"}
+else:
+    PA_SAMPLE_FORMATS = {4: "S16BE", 6: "F32BE", 8: "S32BE"}
+
 # PulseAudio Error Codes
 PA_LOAD_ERROR = 1
 PA_GET_STATE_ERROR = 2
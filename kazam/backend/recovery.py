@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+#
+#       recovery.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+#
+# Recovery of tempfiles left behind when Kazam, X or the whole machine
+# died in the middle of a recording.
+#
+
+import os
+import glob
+import fcntl
+import struct
+import logging
+logger = logging.getLogger("Recovery")
+
+from gi.repository import GObject, GLib
+
+from kazam.utils import get_next_filename
+from kazam.backend.remux import Remuxer
+from kazam.backend.filemover import FileMover
+
+def is_locked(fname):
+    """Returns True if another process holds the lock on a tempfile.
+
+    Screencast keeps an exclusive flock on its tempfile for as long as it
+    exists, the lock goes away with the process, whatever way it ends.
+    """
+    try:
+        fd = os.open(fname, os.O_RDONLY)
+    except OSError:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+def find_orphans(directory):
+    """Returns lists of leftover recording and faststart tempfiles.
+
+    Tempfiles of recordings that are still running, in this or another
+    instance, are locked and skipped. Faststart files belong to the
+    tempfile they are named after and are skipped with it.
+    """
+    movies = []
+    muxes = []
+    for fname in glob.glob(os.path.join(directory, "kazam_*.movie*")):
+        if fname.endswith(".movie"):
+            if not is_locked(fname):
+                movies.append(fname)
+        elif fname.endswith(".movie.mux"):
+            movie = fname[:-len(".mux")]
+            if not os.path.exists(movie) or not is_locked(movie):
+                muxes.append(fname)
+    return (sorted(movies), sorted(muxes))
+
+
+def find_replay_dirs(directories):
+    """Returns fragment directories of instant replays that are not running.
+
+    Directories of running replays, and of replays being saved, are locked
+    the same way as tempfiles.
+    """
+    dirs = []
+    for directory in directories:
+        for path in glob.glob(os.path.join(directory, "kazam_replay_*")):
+            if os.path.isdir(path) and not is_locked(path):
+                dirs.append(path)
+    return sorted(dirs)
+
+
+def detect_container(path):
+    """Guesses the container from the magic bytes at the start of the file.
+
+    Returns:
+        One of "avi", "webm", "matroska", "mp4", "ogg", "mp3" or None.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(64)
+    except IOError:
+        return None
+
+    if len(head) < 12:
+        return None
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm" if b"webm" in head else "matroska"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:3] == b"ID3":
+        return "mp3"
+    return None
+
+
+def mp4_atoms(path):
+    """Returns the set of top level atom types of an MP4 file."""
+    atoms = set()
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        pos = 0
+        while pos + 8 <= size:
+            f.seek(pos)
+            (atom_size, atom_type) = struct.unpack(">I4s", f.read(8))
+            if atom_size == 1:
+                atom_size = struct.unpack(">Q", f.read(8))[0]
+            elif atom_size == 0:
+                atom_size = size - pos
+            if atom_size < 8:
+                break
+            atoms.add(atom_type)
+            pos += atom_size
+    return atoms
+
+
+class Recovery(GObject.GObject):
+    """Turns orphaned tempfiles back into playable recordings.
+
+    Matroska, WebM, Ogg, MP3 and fragmented MP4 files play as they are and
+    are only renamed. AVI files without an index are remuxed into Matroska in the
+    background. MP4 files without a moov atom cannot be recovered and are
+    kept aside as Kazam_damaged files. Files are moved with FileMover, one
+    at a time, so copies to another filesystem don't block the main loop.
+
+    Faststart files hold the media data of an MP4 that was not finished,
+    they are never deleted. Each one is kept next to the damaged file of
+    its recording, or as a Kazam_damaged file of its own.
+
+    "recovery-done" is emitted with a list of (tempfile, result) tuples,
+    result is None for files that could not be recovered.
+    """
+    __gsignals__ = {"recovery-done": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (GObject.TYPE_PYOBJECT,),),
+                    }
+
+    def __init__(self, movies, muxes, dest):
+        GObject.GObject.__init__(self)
+        self.pending = list(movies)
+        self.muxes = list(muxes)
+        self.dest = dest
+        self.results = []
+        self.damaged = {}
+
+    def start(self):
+        GLib.idle_add(self.recover_next)
+
+    def recover_next(self):
+        if not self.pending:
+            if self.muxes:
+                self.keep_mux(self.muxes.pop(0))
+            else:
+                self.emit("recovery-done", self.results)
+            return False
+
+        fname = self.pending.pop(0)
+        container = detect_container(fname)
+        logger.debug("Recovering {0}, container: {1}".format(fname, container))
+
+        if container == "avi":
+            output = get_next_filename(self.dest, "Kazam_recovered", ".mkv")
+            remuxer = Remuxer(output, "matroskamux")
+            remuxer.connect("remux-done", self.cb_remux_done, fname)
+            remuxer.start_file(fname, "avidemux")
+            return False
+
+        if container == "webm":
+            self.rename(fname, ".webm")
+        elif container == "matroska":
+            self.rename(fname, ".mkv")
+        elif container == "ogg":
+            self.rename(fname, ".ogg")
+        elif container == "mp3":
+            self.rename(fname, ".mp3")
+        elif container == "mp4" and mp4_atoms(fname) & set([b"moov", b"moof"]):
+            self.rename(fname, ".mp4")
+        else:
+            self.keep_damaged(fname)
+        return False
+
+    def cb_remux_done(self, remuxer, output, fname):
+        if output:
+            os.remove(fname)
+            self.results.append((fname, output))
+            GLib.idle_add(self.recover_next)
+            return
+        try:
+            os.remove(remuxer.output)
+        except OSError:
+            pass
+        self.keep_damaged(fname)
+
+    def move(self, fname, output, cb_done):
+        mover = FileMover(fname, output)
+        mover.connect("move-done", self.cb_move_done, cb_done)
+        mover.start()
+
+    def cb_move_done(self, mover, result, cb_done):
+        cb_done(mover.src, result)
+        GLib.idle_add(self.recover_next)
+
+    def rename(self, fname, ext):
+        self.move(fname, get_next_filename(self.dest, "Kazam_recovered", ext), self.cb_renamed)
+
+    def cb_renamed(self, fname, output):
+        if output:
+            logger.info("Recovered {0} as {1}".format(fname, output))
+        else:
+            logger.warning("Unable to move {0}, left in place.".format(fname))
+        self.results.append((fname, output))
+
+    def keep_damaged(self, fname):
+        #
+        # Keep the data around, but stop offering it on every start.
+        #
+        self.move(fname, get_next_filename(self.dest, "Kazam_damaged", ".movie"), self.cb_kept_damaged)
+
+    def cb_kept_damaged(self, fname, output):
+        if output:
+            logger.warning("Unable to recover {0}, kept as {1}".format(fname, output))
+            self.damaged[fname] = output
+        else:
+            logger.warning("Unable to recover or move {0}, left in place.".format(fname))
+        self.results.append((output or fname, None))
+
+    def keep_mux(self, fname):
+        movie = fname[:-len(".mux")]
+        if movie in self.damaged:
+            output = "{0}.mux".format(self.damaged[movie])
+        else:
+            output = get_next_filename(self.dest, "Kazam_damaged", ".movie.mux")
+        self.move(fname, output, self.cb_kept_mux)
+
+    def cb_kept_mux(self, fname, output):
+        if output:
+            logger.warning("Kept faststart file {0} as {1}".format(fname, output))
+        else:
+            logger.warning("Unable to move faststart file {0}, left in place.".format(fname))
+        self.results.append((output or fname, None))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+#       remux.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import logging
+logger = logging.getLogger("Remux")
+
+from gi.repository import GObject, Gst
+
+
+class Remuxer(GObject.GObject):
+    """Copies already encoded streams into a new container.
+
+    Nothing is decoded or encoded, streams coming out of the source are
+    only queued and fed to a fresh muxer. Work is done in GStreamer
+    threads, "remux-done" is emitted from the main loop with the output
+    path on success or None on failure.
+    """
+    __gsignals__ = {"remux-done": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (GObject.TYPE_PYOBJECT,),),
+                    }
+
+    def __init__(self, output, muxer):
+        GObject.GObject.__init__(self)
+        self.output = output
+        self.pipeline = Gst.Pipeline()
+
+        self.mux = Gst.ElementFactory.make(muxer, "muxer")
+        self.sink = Gst.ElementFactory.make("filesink", "sink")
+        self.sink.set_property("location", output)
+        self.pipeline.add(self.mux)
+        self.pipeline.add(self.sink)
+        self.mux.link(self.sink)
+
+        self.bus = self.pipeline.get_bus()
+        self.bus.add_signal_watch()
+        self.bus.connect("message", self.on_message)
+
+    def start_fragments(self, location):
+        """Joins fragments matching the location glob, in name order."""
+        logger.debug("Remuxing fragments {0} to {1}".format(location, self.output))
+        src = Gst.ElementFactory.make("splitmuxsrc", "source")
+        src.set_property("location", location)
+        src.connect("pad-added", self.cb_pad_added)
+        self.pipeline.add(src)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def start_file(self, location, demuxer):
+        logger.debug("Remuxing {0} with {1} to {2}".format(location, demuxer, self.output))
+        src = Gst.ElementFactory.make("filesrc", "source")
+        src.set_property("location", location)
+        demux = Gst.ElementFactory.make(demuxer, "demuxer")
+        demux.connect("pad-added", self.cb_pad_added)
+        self.pipeline.add(src)
+        self.pipeline.add(demux)
+        src.link(demux)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def cb_pad_added(self, element, pad):
+        queue = Gst.ElementFactory.make("queue", None)
+        self.pipeline.add(queue)
+        queue.sync_state_with_parent()
+        ret = pad.link(queue.get_static_pad("sink"))
+        logger.debug(" Link {0} -> queue: {1}".format(pad.get_name(), ret))
+        ret = queue.link(self.mux)
+        logger.debug(" Link queue -> muxer: {0}".format(ret))
+
+    def on_message(self, bus, message):
+        t = message.type
+        if t == Gst.MessageType.EOS:
+            logger.debug("Remux finished: {0}".format(self.output))
+            self.pipeline.set_state(Gst.State.NULL)
+            self.bus.remove_signal_watch()
+            self.emit("remux-done", self.output)
+        elif t == Gst.MessageType.ERROR:
+            logger.warning("Remux of {0} failed: {1}".format(self.output, message.parse_error()[1]))
+            self.pipeline.set_state(Gst.State.NULL)
+            self.bus.remove_signal_watch()
+            self.emit("remux-done", None)
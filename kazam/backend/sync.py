@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+#       sync.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import logging
+import threading
+logger = logging.getLogger("Sync")
+
+from gi.repository import GLib, Gst
+
+from kazam.backend.prefs import SYNC_INTERVAL, SYNC_DRIFT_LIMIT, SYNC_SAMPLE_BUFFERS
+
+SYNC_LOG_HEADER = "time,stream,buffers,latency_ms,latency_max_ms,jitter_ms,offset_ms,compensation_ms\n"
+
+
+class SyncMonitor(object):
+    """Measures capture latency, jitter and A/V offset of live sources.
+
+    Buffer probes on the source pads compare the timestamp of a buffer
+    with the running time of the pipeline clock when the buffer is pushed.
+    That difference is the capture latency. It should stay constant, any
+    growth of the audio latency that video does not share is audio drifting
+    away from the screen.
+
+    The probes are Python code on the streaming threads, so they only
+    sample. Every interval a probe measures SYNC_SAMPLE_BUFFERS buffers in
+    a row and removes itself, it is added again on the next tick.
+
+    Once every SYNC_INTERVAL milliseconds a row per source is appended to a
+    CSV file. With compensation enabled the accumulated offset is applied
+    as a pad offset on the audio branch once it exceeds SYNC_DRIFT_LIMIT.
+    """
+
+    def __init__(self, pipeline, path=None, compensate=False):
+        self.pipeline = pipeline
+        self.path = path
+        self.compensate = compensate
+        self.streams = []
+        self.lock = threading.Lock()
+        self.fh = None
+        self.tick_id = None
+
+    def add_stream(self, name, pad, offset_pad=None):
+        """Starts measuring buffers leaving pad.
+
+        Args:
+            name: stream name used in the log, "video" is the reference
+                  for the A/V offset.
+            pad: source pad of a live source element.
+            offset_pad: pad that drift compensation is applied on, None
+                        for streams that should not be compensated.
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        stream = {"name": name,
+                  "pad": pad,
+                  "probe_id": None,
+                  "offset_pad": offset_pad,
+                  "buffers": 0,
+                  "latency_sum": 0,
+                  "latency_max": 0,
+                  "last_latency": None,
+                  "jitter": 0.0,
+                  "baseline": None,
+                  "latency": 0.0,
+                  "offset": 0.0,
+                  "compensation": 0}
+        self.streams.append(stream)
+        self.add_probe(stream)
+
+    def add_probe(self, stream):
+        with self.lock:
+            if stream["probe_id"] is not None:
+                return
+            #
+            # Jitter is only measured between buffers of the same sample.
+            #
+            stream["last_latency"] = None
+            stream["sampled"] = 0
+            stream["probe_id"] = stream["pad"].add_probe(Gst.PadProbeType.BUFFER, self.cb_buffer, stream)
+
+    def start(self):
+        if self.path:
+            try:
+                self.fh = open(self.path, "w")
+                self.fh.write(SYNC_LOG_HEADER)
+            except IOError:
+                logger.warning("Unable to write A/V sync log {0}".format(self.path))
+                self.fh = None
+        self.tick_id = GLib.timeout_add(SYNC_INTERVAL, self.cb_tick)
+        logger.debug("Sync monitor started, log: {0}".format(self.path))
+
+    def stop(self):
+        if self.tick_id:
+            GLib.source_remove(self.tick_id)
+            self.tick_id = None
+            self.cb_tick()
+        probes = []
+        with self.lock:
+            for stream in self.streams:
+                if stream["probe_id"] is not None:
+                    probes.append((stream["pad"], stream["probe_id"]))
+                    stream["probe_id"] = None
+        for (pad, probe_id) in probes:
+            pad.remove_probe(probe_id)
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+        for stream in self.streams:
+            logger.debug("Sync {0}: offset {1:.1f}ms, compensation {2:.1f}ms".format(stream["name"],
+                                                                                  stream["offset"],
+                                                                                  stream["compensation"] / Gst.MSECOND))
+
+    def cb_buffer(self, pad, info, stream):
+        #
+        # Runs in the streaming thread, keep it short.
+        #
+        pts = info.get_buffer().pts
+        clock = self.pipeline.get_clock()
+        if pts == Gst.CLOCK_TIME_NONE or not clock:
+            return Gst.PadProbeReturn.OK
+
+        latency = clock.get_time() - self.pipeline.get_base_time() - pts
+        with self.lock:
+            stream["buffers"] += 1
+            stream["latency_sum"] += latency
+            stream["latency_max"] = max(stream["latency_max"], latency)
+            if stream["last_latency"] is not None:
+                # Interarrival jitter as in RFC 3550
+                stream["jitter"] += (abs(latency - stream["last_latency"]) - stream["jitter"]) / 16.0
+            stream["last_latency"] = latency
+            stream["sampled"] += 1
+            if stream["sampled"] >= SYNC_SAMPLE_BUFFERS:
+                stream["probe_id"] = None
+                return Gst.PadProbeReturn.REMOVE
+        return Gst.PadProbeReturn.OK
+
+    def cb_tick(self):
+        clock = self.pipeline.get_clock()
+        if clock:
+            running_time = (clock.get_time() - self.pipeline.get_base_time()) / Gst.SECOND
+        else:
+            running_time = 0.0
+
+        rows = []
+        with self.lock:
+            for stream in self.streams:
+                if not stream["buffers"]:
+                    continue
+                stream["latency"] = stream["latency_sum"] / stream["buffers"] / Gst.MSECOND
+                if stream["baseline"] is None:
+                    stream["baseline"] = stream["latency"]
+                rows.append((stream, stream["buffers"], stream["latency_max"] / Gst.MSECOND))
+                stream["buffers"] = 0
+                stream["latency_sum"] = 0
+                stream["latency_max"] = 0
+
+        video = [s for s in self.streams if s["name"] == "video" and s["baseline"] is not None]
+        video_drift = video[0]["latency"] - video[0]["baseline"] if video else 0.0
+
+        for (stream, buffers, latency_max) in rows:
+            if stream["name"] != "video":
+                stream["offset"] = stream["latency"] - stream["baseline"] - video_drift
+                self.compensate_stream(stream)
+            if self.fh:
+                self.fh.write("{0:.3f},{1},{2},{3:.3f},{4:.3f},{5:.3f},{6:.3f},{7:.3f}\n".format(
+                              running_time,
+                              stream["name"],
+                              buffers,
+                              stream["latency"],
+                              latency_max,
+                              stream["jitter"] / Gst.MSECOND,
+                              stream["offset"],
+                              stream["compensation"] / Gst.MSECOND))
+        if self.fh:
+            self.fh.flush()
+        if self.tick_id:
+            for stream in self.streams:
+                self.add_probe(stream)
+        return True
+
+    def compensate_stream(self, stream):
+        #
+        # A growing audio latency means its timestamps fall behind the
+        # screen, so audio is shifted later by the same amount.
+        #
+        if not self.compensate or not stream["offset_pad"]:
+            return
+        target = int(stream["offset"] * Gst.MSECOND)
+        if abs(target - stream["compensation"]) < SYNC_DRIFT_LIMIT * Gst.MSECOND:
+            return
+        logger.info("Compensating {0} drift, offset {1:.1f}ms.".format(stream["name"], stream["offset"]))
+        stream["offset_pad"].set_offset(target)
+        stream["compensation"] = target
+
+    def get_stats(self):
+        """Returns the latest latency, jitter and offset of every stream in ms."""
+        stats = {}
+        with self.lock:
+            for stream in self.streams:
+                name = stream["name"]
+                stats["sync_{0}_latency".format(name)] = stream["latency"]
+                stats["sync_{0}_jitter".format(name)] = stream["jitter"] / Gst.MSECOND
+                if name != "video":
+                    stats["sync_{0}_offset".format(name)] = stream["offset"]
+                    stats["sync_{0}_compensation".format(name)] = stream["compensation"] / Gst.MSECOND
+        return stats
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+#       vfr.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import logging
+logger = logging.getLogger("VFR")
+
+from gi.repository import Gst
+
+
+class FrameFilter(object):
+    """Drops captured frames that show nothing new.
+
+    A buffer probe right after the capture queue only lets a frame through
+    when the screen was damaged since the last frame that was let through,
+    or when max_interval has passed without one. Frames keep their capture
+    timestamps, containers that store a timestamp for every frame end up
+    with a variable frame rate and the encoder never sees duplicates.
+
+    Damage is reported in the main loop a little after it happened. A
+    frame captured before that is dropped, the first one captured after it
+    is always let through, so the final state of every change is recorded.
+    """
+
+    def __init__(self, pipeline, min_interval, max_interval):
+        self.pipeline = pipeline
+        self.min_interval = min_interval * Gst.MSECOND
+        self.max_interval = max_interval * Gst.MSECOND
+        self.enabled = True
+        self.last_damage = None
+        self.last_pts = None
+        self.frames_in = 0
+        self.frames_skipped = 0
+
+    def attach(self, pad):
+        pad.add_probe(Gst.PadProbeType.BUFFER, self.cb_buffer, None)
+
+    def watch_damage(self, monitor):
+        monitor.connect("damage", self.cb_damage)
+
+    def cb_damage(self, monitor, pixels):
+        clock = self.pipeline.get_clock()
+        if clock:
+            self.last_damage = clock.get_time() - self.pipeline.get_base_time()
+
+    def cb_buffer(self, pad, info, data):
+        #
+        # Runs in the streaming thread, once per captured frame.
+        #
+        self.frames_in += 1
+        pts = info.get_buffer().pts
+        if not self.enabled or pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        if self.last_pts is None:
+            self.last_pts = pts
+            return Gst.PadProbeReturn.OK
+
+        interval = pts - self.last_pts
+        damaged = self.last_damage is not None and self.last_damage >= self.last_pts
+        if (damaged and interval >= self.min_interval) or interval >= self.max_interval:
+            self.last_pts = pts
+            return Gst.PadProbeReturn.OK
+
+        self.frames_skipped += 1
+        return Gst.PadProbeReturn.DROP
+
+    def get_stats(self):
+        return {"frames_captured": self.frames_in,
+                "frames_vfr_skipped": self.frames_skipped}
@@ -21,7 +21,6 @@
 #       MA 02110-1301, USA.
 
 import os
-import shutil
 import logging
 logger = logging.getLogger("Done Recording")
 
@@ -29,6 +28,7 @@ from gettext import gettext as _
 from gi.repository import Gtk, GObject
 
 from kazam.backend.prefs import *
+from kazam.backend.filemover import FileMover
 from kazam.frontend.combobox import EditComboBox
 from kazam.frontend.save_dialog import SaveDialog
 
@@ -43,16 +43,20 @@ class DoneRecording(Gtk.Window):
                             [GObject.TYPE_PYOBJECT],),
     "save-cancel"     : (GObject.SIGNAL_RUN_LAST,
                             None,
-                            (),)
+                            (),),
+    "move-start"      : (GObject.SIGNAL_RUN_LAST,
+                            None,
+                            [GObject.TYPE_PYOBJECT],),
     }
 
-    def __init__(self, icons, tempfile, codec, old_path):
+    def __init__(self, icons, tempfile, extension, old_path):
         Gtk.Window.__init__(self, title="Kazam - " + _("Recording finished"))
         self.icons = icons
         self.tempfile = tempfile
-        self.codec = codec
+        self.extension = extension
         self.action = ACTION_SAVE
         self.old_path = old_path
+        self.mover = None
         self.set_position(Gtk.WindowPosition.NONE)
 
         # Setup UI
@@ -102,6 +106,12 @@ class DoneRecording(Gtk.Window):
         self.vbox.pack_start(self.grid, True, True, 0)
         self.vbox.pack_start(self.radiobutton_save, True, True, 0)
         self.vbox.pack_start(self.hbox, True, True, 0)
+
+        self.progressbar = Gtk.ProgressBar()
+        self.progressbar.set_show_text(True)
+        self.progressbar.set_no_show_all(True)
+        self.vbox.pack_start(self.progressbar, True, True, 0)
+
         self.add(self.vbox)
         self.connect("delete-event", self.cb_delete_event)
         self.set_resizable(False)
@@ -117,30 +127,63 @@ class DoneRecording(Gtk.Window):
             self.destroy()
         else:
             self.set_sensitive(False)
-            logger.debug("Continue - Save ({0}).".format(self.codec))
+            logger.debug("Continue - Save ({0}).".format(self.extension))
             (dialog, result, self.old_path) = SaveDialog(_("Save screencast"),
-                                          self.old_path, self.codec)
+                                          self.old_path, self.extension)
 
             if result == Gtk.ResponseType.OK:
                 uri = os.path.join(dialog.get_current_folder(), dialog.get_filename())
 
-                if not uri.endswith(CODEC_LIST[self.codec][3]):
-                    uri += CODEC_LIST[self.codec][3]
+                if not uri.endswith(self.extension):
+                    uri += self.extension
 
-                shutil.move(self.tempfile, uri)
                 dialog.destroy()
-                self.emit("save-done", self.old_path)
-                self.destroy()
+
+                #
+                # Copying across filesystems can take a while, keep the
+                # window around to show progress.
+                #
+                self.progressbar.set_text(_("Saving ..."))
+                self.progressbar.show()
+                self.mover = FileMover(self.tempfile, uri)
+                self.mover.connect("progress", self.cb_move_progress)
+                self.mover.connect("move-done", self.cb_move_done)
+                self.emit("move-start", self.mover)
+                self.mover.start()
             else:
                 self.set_sensitive(True)
                 dialog.destroy()
 
+    def cb_move_progress(self, mover, fraction):
+        self.progressbar.set_fraction(fraction)
+
+    def cb_move_done(self, mover, result):
+        if result is None:
+            #
+            # The tempfile is still there, let the user pick another place.
+            #
+            self.mover = None
+            self.progressbar.hide()
+            dialog = Gtk.MessageDialog(self, 0,
+                                       Gtk.MessageType.ERROR,
+                                       Gtk.ButtonsType.OK,
+                                       _("Unable to save the screencast."))
+            dialog.format_secondary_text(_("The recording is kept in {0}.").format(self.tempfile))
+            dialog.run()
+            dialog.destroy()
+            self.set_sensitive(True)
+            return
+        self.emit("save-done", self.old_path)
+        self.destroy()
+
 
     def cb_cancel_clicked(self, widget):
         self.emit("save-cancel")
         self.destroy()
 
     def cb_delete_event(self, widget, data):
+        if self.mover:
+            return True
         self.emit("save-cancel")
         self.destroy()
 
@@ -49,6 +49,9 @@ class KazamSuperIndicator(GObject.GObject):
         "indicator-start-request" : (GObject.SIGNAL_RUN_LAST,
                                      None,
                                      (), ),
+        "indicator-replay-request" : (GObject.SIGNAL_RUN_LAST,
+                                      None,
+                                      (), ),
 
         "indicator-about-request" : (GObject.SIGNAL_RUN_LAST,
                                      None,
@@ -78,6 +81,10 @@ class KazamSuperIndicator(GObject.GObject):
         self.menuitem_finish.set_sensitive(False)
         self.menuitem_finish.connect("activate", self.on_menuitem_finish_activate)
 
+        self.menuitem_replay = Gtk.MenuItem(_("Save instant replay"))
+        self.menuitem_replay.set_sensitive(False)
+        self.menuitem_replay.connect("activate", self.on_menuitem_replay_activate)
+
         self.menuitem_separator = Gtk.SeparatorMenuItem()
 
         self.menuitem_quit = Gtk.MenuItem(_("Quit"))
@@ -86,6 +93,7 @@ class KazamSuperIndicator(GObject.GObject):
         self.menu.append(self.menuitem_start)
         self.menu.append(self.menuitem_pause)
         self.menu.append(self.menuitem_finish)
+        self.menu.append(self.menuitem_replay)
         self.menu.append(self.menuitem_separator)
         self.menu.append(self.menuitem_quit)
 
@@ -105,6 +113,7 @@ class KazamSuperIndicator(GObject.GObject):
             Keybinder.bind("<Super><Ctrl>P", self.cb_hotkeys, "pause-request")
             Keybinder.bind("<Super><Ctrl>W", self.cb_hotkeys, "show-request")
             Keybinder.bind("<Super><Ctrl>Q", self.cb_hotkeys, "quit-request")
+            Keybinder.bind("<Super><Ctrl>I", self.cb_hotkeys, "replay-request")
             self.recording = False
         except ImportError:
             logger.info("Unable to import Keybinder, hotkeys not available.")
@@ -124,6 +133,8 @@ class KazamSuperIndicator(GObject.GObject):
             self.emit("indicator-show-request")
         elif action == "quit-request" and not self.recording:
             self.emit("indicator-quit-request")
+        elif action == "replay-request" and self.menuitem_replay.get_sensitive():
+            self.emit("indicator-replay-request")
 
     def on_menuitem_pause_activate(self, menuitem):
         if self.menuitem_pause.get_active():
@@ -135,12 +146,16 @@ class KazamSuperIndicator(GObject.GObject):
         self.recording = True
         self.emit("indicator-start-request")
 
+    def on_menuitem_replay_activate(self, menuitem):
+        self.emit("indicator-replay-request")
+
     def on_menuitem_finish_activate(self, menuitem):
         self.recording = False
         self.menuitem_start.set_sensitive(True)
         self.menuitem_pause.set_sensitive(False)
         self.menuitem_pause.set_active(False)
         self.menuitem_finish.set_sensitive(False)
+        self.menuitem_replay.set_sensitive(False)
         self.menuitem_quit.set_sensitive(True)
         self.emit("indicator-stop-request")
 
@@ -223,6 +238,11 @@ try:
             if not self.silent:
                 self.indicator.set_status(AppIndicator3.IndicatorStatus.ATTENTION)
 
+        def set_stats_text(self, text):
+            # Application indicators have no tooltips, the title is the
+            # closest thing panels show.
+            self.indicator.set_title(text if text else "Kazam")
+
 except (ImportError, ValueError):
     #
     # AppIndicator failed to import, not running Ubuntu?
@@ -296,6 +316,9 @@ except (ImportError, ValueError):
             logger.debug("Recording started.")
             self.indicator.set_from_icon_name("kazam-recording")
 
+        def set_stats_text(self, text):
+            self.indicator.set_tooltip_text(text)
+
         def hide_it(self):
             self.indicator.set_visible(False)
 
@@ -20,7 +20,6 @@
 #       MA 02110-1301, USA.
 
 import os
-import math
 import logging
 logger = logging.getLogger("Preferences")
 
@@ -28,6 +27,7 @@ from gi.repository import Gtk, Gdk, GObject, Pango
 
 from kazam.utils import *
 from kazam.backend.prefs import *
+from kazam.frontend.widgets import LevelMeter
 
 class Preferences(GObject.GObject):
     __gsignals__ = {
@@ -35,6 +35,10 @@ class Preferences(GObject.GObject):
                         None,
                         (),
             ),
+        "volume-changed" : (GObject.SIGNAL_RUN_LAST,
+                            None,
+                            (GObject.TYPE_INT, GObject.TYPE_DOUBLE),
+            ),
         }
 
     def __init__(self):
@@ -47,6 +51,8 @@ class Preferences(GObject.GObject):
 
         self.audio_source_info = None
         self.audio2_source_info = None
+        self.populating = False
+        self.sources_handler = None
 
         self.builder = Gtk.Builder()
         self.builder.add_from_file(os.path.join(prefs.datadir, "ui", "preferences.ui"))
@@ -75,9 +81,16 @@ class Preferences(GObject.GObject):
 
         self.filechooser_video.set_current_folder(prefs.video_dest)
 
+        self.meter_audio = LevelMeter(self.levelbar_audio)
+        self.meter_audio2 = LevelMeter(self.levelbar_audio2)
+
         self.populate_codecs()
+        self.populate_audio_codecs()
+        self.populate_encoder_presets()
+        self.populate_output_sizes()
         if prefs.sound:
             self.populate_audio_sources()
+            self.sources_handler = prefs.pa_q.connect("sources-changed", self.cb_sources_changed)
         self.populate_shutter_sounds()
 
         self.restore_UI()
@@ -118,18 +131,48 @@ class Preferences(GObject.GObject):
         self.combobox_codec.set_model(codec_model)
         self.combobox_codec.set_row_separator_func(self.is_separator, None)
 
+    def populate_audio_codecs(self):
+        for codec in detect_audio_codecs():
+            self.combobox_audio_codec.append(str(codec), AUDIO_CODEC_LIST[codec][2])
+
+    def populate_encoder_presets(self):
+        for preset in ENCODER_PRESETS:
+            self.combobox_encoder_preset.append(str(preset[0]), preset[2])
+
+    def populate_output_sizes(self):
+        sizes = [size[:2] for size in OUTPUT_SIZES]
+        for size in OUTPUT_SIZES:
+            self.combobox_output_size.append("{0}x{1}".format(size[0], size[1]), size[2])
+        # A size set in the configuration file is offered too
+        if [prefs.output_width, prefs.output_height] not in sizes:
+            self.combobox_output_size.append("{0}x{1}".format(prefs.output_width, prefs.output_height),
+                                             "{0}x{1}".format(prefs.output_width, prefs.output_height))
+
     def populate_audio_sources(self):
         speaker_source_model = Gtk.ListStore(str)
         mic_source_model = Gtk.ListStore(str)
-        for source in prefs.audio_sources:
-            if "Monitor" in source[2]:
-                speaker_source_model.append([source[2]])
-            else:
-                mic_source_model.append([source[2]])
+        for source in prefs.speaker_sources:
+            speaker_source_model.append([source[2]])
+        for source in prefs.mic_sources:
+            mic_source_model.append([source[2]])
 
         self.combobox_audio.set_model(speaker_source_model)
         self.combobox_audio2.set_model(mic_source_model)
 
+    def cb_sources_changed(self, pa_q):
+        logger.debug("Audio sources changed, repopulating.")
+        self.populating = True
+        self.populate_audio_sources()
+        self.combobox_audio.set_active(prefs.audio_source)
+        self.combobox_audio2.set_active(prefs.audio2_source)
+        self.populating = False
+        self.update_level_meters()
+
+    def update_level_meters(self):
+        if prefs.sound:
+            self.meter_audio.set_device(prefs.get_source_name(prefs.speaker_sources, prefs.audio_source))
+            self.meter_audio2.set_device(prefs.get_source_name(prefs.mic_sources, prefs.audio2_source))
+
     def populate_shutter_sounds(self):
         for s_file in prefs.sound_files:
             self.combobox_shutter_type.append(None, s_file[:-4])
@@ -140,11 +183,17 @@ class Preferences(GObject.GObject):
         if prefs.sound:
             self.combobox_audio.set_active(prefs.audio_source)
             self.combobox_audio2.set_active(prefs.audio2_source)
+            self.volumebutton_audio.set_value(gain_to_slider(prefs.speakers_volume))
+            self.volumebutton_audio2.set_value(gain_to_slider(prefs.microphone_volume))
+            self.update_level_meters()
         else:
             self.combobox_audio.set_sensitive(False)
             self.combobox_audio2.set_sensitive(False)
             self.volumebutton_audio.set_sensitive(False)
             self.volumebutton_audio2.set_sensitive(False)
+            self.switch_separate_tracks.set_sensitive(False)
+            self.combobox_audio_codec.set_sensitive(False)
+            self.switch_audio_only.set_sensitive(False)
 
         if prefs.countdown_splash:
             self.switch_countdown_splash.set_active(True)
@@ -152,6 +201,21 @@ class Preferences(GObject.GObject):
             self.switch_countdown_splash.set_active(False)
 
         self.spinbutton_framerate.set_value(prefs.framerate)
+        self.switch_capture_damage.set_active(prefs.capture_damage)
+        self.switch_instant_replay.set_active(prefs.instant_replay)
+        self.switch_segment_recording.set_active(prefs.segment_recording)
+        self.switch_crash_safe.set_active(prefs.crash_safe)
+        self.switch_sync_log.set_active(prefs.sync_log)
+        self.switch_idle_pause.set_active(prefs.idle_pause)
+        self.switch_vfr.set_active(prefs.vfr)
+        self.switch_adaptive.set_active(prefs.adaptive)
+        self.switch_separate_tracks.set_active(prefs.separate_tracks)
+        self.switch_audio_only.set_active(prefs.audio_only)
+        if not self.combobox_audio_codec.set_active_id(str(prefs.audio_codec)):
+            self.combobox_audio_codec.set_active(0)
+        if not self.combobox_encoder_preset.set_active_id(str(prefs.encoder_preset)):
+            self.combobox_encoder_preset.set_active(0)
+        self.combobox_output_size.set_active_id("{0}x{1}".format(prefs.output_width, prefs.output_height))
 
         if prefs.autosave_video:
             self.switch_autosave_video.set_active(True)
@@ -217,6 +281,11 @@ class Preferences(GObject.GObject):
 
     def cb_delete_event(self, widget, user_data):
         logger.debug("Deleting preferences window")
+        if self.sources_handler:
+            prefs.pa_q.disconnect(self.sources_handler)
+            self.sources_handler = None
+        self.meter_audio.set_device(None)
+        self.meter_audio2.set_device(None)
         self.emit("prefs-quit")
 
     def cb_switch_countdown_splash(self, widget, user_data):
@@ -225,23 +294,20 @@ class Preferences(GObject.GObject):
 
     def cb_audio_changed(self, widget):
         logger.debug("Audio Changed.")
+        if self.populating or self.combobox_audio.get_active() < 0:
+            return
         prefs.audio_source = self.combobox_audio.get_active()
         logger.debug("  - A_1 {0}".format(prefs.audio_source))
 
         pa_audio_idx =  prefs.speaker_sources[prefs.audio_source][0]
-        prefs.pa_q.set_source_mute_by_index(pa_audio_idx, 0)
+        prefs.pa_q.set_source_mute_by_index_async(pa_audio_idx, 0)
+        self.meter_audio.set_device(prefs.speaker_sources[prefs.audio_source][1])
 
         logger.debug("  - PA Audio1 IDX: {0}".format(pa_audio_idx))
-        self.audio_source_info = prefs.pa_q.get_source_info_by_index(pa_audio_idx)
-        if len(self.audio_source_info) > 0:
-            val = prefs.pa_q.cvolume_to_dB(self.audio_source_info[2])
-            if math.isinf(val):
-                vol = 0
-            else:
-                vol = 60 + val
-            self.volumebutton_audio.set_value(vol)
-        else:
-            logger.debug("Error getting volume info for Audio 1")
+        prefs.pa_q.get_source_info_by_index_async(pa_audio_idx, self.cb_audio_info)
+
+    def cb_audio_info(self, info):
+        self.audio_source_info = info
         if len(self.audio_source_info):
            logger.debug("New Audio1: {0}".format(self.audio_source_info[3]))
         else:
@@ -249,46 +315,39 @@ class Preferences(GObject.GObject):
 
     def cb_audio2_changed(self, widget):
         logger.debug("Audio2 Changed.")
+        if self.populating or self.combobox_audio2.get_active() < 0:
+            return
 
         prefs.audio2_source = self.combobox_audio2.get_active()
         logger.debug("  - A_2 {0}".format(prefs.audio2_source))
 
         pa_audio2_idx =  prefs.mic_sources[prefs.audio2_source][0]
-        prefs.pa_q.set_source_mute_by_index(pa_audio2_idx, 0)
+        prefs.pa_q.set_source_mute_by_index_async(pa_audio2_idx, 0)
+        self.meter_audio2.set_device(prefs.mic_sources[prefs.audio2_source][1])
 
         logger.debug("  - PA Audio2 IDX: {0}".format(pa_audio2_idx))
-        self.audio2_source_info = prefs.pa_q.get_source_info_by_index(pa_audio2_idx)
-
-        if len(self.audio2_source_info) > 0:
-            val = prefs.pa_q.cvolume_to_dB(self.audio2_source_info[2])
-            if math.isinf(val):
-                vol = 0
-            else:
-                vol = 60 + val
-            self.volumebutton_audio2.set_value(vol)
-        else:
-            logger.debug("Error getting volume info for Audio 1")
+        prefs.pa_q.get_source_info_by_index_async(pa_audio2_idx, self.cb_audio2_info)
 
+    def cb_audio2_info(self, info):
+        self.audio2_source_info = info
         if len(self.audio2_source_info):
             logger.debug("New Audio2:\n  {0}".format(self.audio2_source_info[3]))
         else:
             logger.debug("New Audio2:\n  Error retrieving data.")
 
+    #
+    # Volume sliders set the gain inside the recording pipeline, the volume
+    # of the PulseAudio source itself is left alone.
+    #
     def cb_volume_changed(self, widget, value):
         logger.debug("Volume 1 changed, new value: {0}".format(value))
-        idx = self.combobox_audio.get_active()
-        pa_idx =  prefs.audio_sources[idx][0]
-        chn = self.audio_source_info[2].channels
-        cvol = prefs.pa_q.dB_to_cvolume(chn, value-60)
-        prefs.pa_q.set_source_volume_by_index(pa_idx, cvol)
+        prefs.speakers_volume = slider_to_gain(value)
+        self.emit("volume-changed", 1, prefs.speakers_volume)
 
     def cb_volume2_changed(self, widget, value):
         logger.debug("Volume 2 changed, new value: {0}".format(value))
-        idx = self.combobox_audio2.get_active()
-        pa_idx =  prefs.audio_sources[idx][0]
-        chn = self.audio2_source_info[2].channels
-        cvol = prefs.pa_q.dB_to_cvolume(chn, value-60)
-        prefs.pa_q.set_source_volume_by_index(pa_idx, cvol)
+        prefs.microphone_volume = slider_to_gain(value)
+        self.emit("volume-changed", 2, prefs.microphone_volume)
 
     #
     # Screencasting callbacks
@@ -298,6 +357,68 @@ class Preferences(GObject.GObject):
         prefs.framerate = widget.get_value_as_int()
         logger.debug("Framerate now: {0}".format(prefs.framerate))
 
+    def cb_switch_capture_damage(self, widget, user_data):
+        prefs.capture_damage = widget.get_active()
+        logger.debug("Incremental capture: {0}.".format(prefs.capture_damage))
+
+    def cb_switch_instant_replay(self, widget, user_data):
+        prefs.instant_replay = widget.get_active()
+        logger.debug("Instant replay: {0}.".format(prefs.instant_replay))
+
+    def cb_switch_segment_recording(self, widget, user_data):
+        prefs.segment_recording = widget.get_active()
+        logger.debug("Segmented recording: {0}.".format(prefs.segment_recording))
+
+    def cb_switch_crash_safe(self, widget, user_data):
+        prefs.crash_safe = widget.get_active()
+        logger.debug("Crash-safe output: {0}.".format(prefs.crash_safe))
+
+    def cb_switch_sync_log(self, widget, user_data):
+        prefs.sync_log = widget.get_active()
+        logger.debug("A/V sync log: {0}.".format(prefs.sync_log))
+
+    def cb_switch_idle_pause(self, widget, user_data):
+        prefs.idle_pause = widget.get_active()
+        logger.debug("Idle pause: {0}.".format(prefs.idle_pause))
+
+    def cb_switch_vfr(self, widget, user_data):
+        prefs.vfr = widget.get_active()
+        logger.debug("Variable frame rate: {0}.".format(prefs.vfr))
+
+    def cb_switch_adaptive(self, widget, user_data):
+        prefs.adaptive = widget.get_active()
+        logger.debug("Adaptive quality: {0}.".format(prefs.adaptive))
+
+    def cb_switch_audio_only(self, widget, user_data):
+        prefs.audio_only = widget.get_active()
+        logger.debug("Audio only: {0}.".format(prefs.audio_only))
+
+    def cb_switch_separate_tracks(self, widget, user_data):
+        prefs.separate_tracks = widget.get_active()
+        logger.debug("Separate audio tracks: {0}.".format(prefs.separate_tracks))
+
+    def cb_audio_codec_changed(self, widget):
+        codec_id = widget.get_active_id()
+        if codec_id is None:
+            return
+        prefs.audio_codec = int(codec_id)
+        logger.debug("Audio codec selected: {0} - {1}".format(AUDIO_CODEC_LIST[prefs.audio_codec][2],
+                                                              prefs.audio_codec))
+
+    def cb_encoder_preset_changed(self, widget):
+        preset_id = widget.get_active_id()
+        if preset_id is None:
+            return
+        prefs.encoder_preset = int(preset_id)
+        logger.debug("Encoder preset selected: {0}".format(ENCODER_PRESETS[prefs.encoder_preset][2]))
+
+    def cb_output_size_changed(self, widget):
+        size_id = widget.get_active_id()
+        if size_id is None:
+            return
+        (prefs.output_width, prefs.output_height) = [int(i) for i in size_id.split("x")]
+        logger.debug("Output size selected: {0}".format(size_id))
+
     def cb_codec_changed(self, widget):
         i = widget.get_active()
         model = widget.get_model()
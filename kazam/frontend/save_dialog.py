@@ -29,7 +29,7 @@ from gettext import gettext as _
 from datetime import datetime
 from kazam.backend.prefs import *
 
-def SaveDialog(title, old_path, codec, main_mode=MODE_SCREENCAST):
+def SaveDialog(title, old_path, extension, main_mode=MODE_SCREENCAST):
     logger.debug("Save dialog called with path: {0}".format(old_path))
     dialog = Gtk.FileChooserDialog(title, None,
                                    Gtk.FileChooserAction.SAVE,
@@ -39,7 +39,7 @@ def SaveDialog(title, old_path, codec, main_mode=MODE_SCREENCAST):
 
     dt = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
     if main_mode == MODE_SCREENCAST:
-        dialog.set_current_name("{0} {1}{2}".format(_("Screencast"), dt, CODEC_LIST[codec][3]))
+        dialog.set_current_name("{0} {1}{2}".format(_("Screencast"), dt, extension))
     elif main_mode == MODE_SCREENSHOT:
         dialog.set_current_name("{0} {1}.png".format(_("Screenshot"), dt))
 
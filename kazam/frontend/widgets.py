@@ -21,6 +21,8 @@
 
 from gi.repository import Gtk, Gdk, Pango, GObject, GdkPixbuf
 
+from kazam.backend.levels import get_level_monitor
+
 class _Tile(object):
     def __init__(self):
         self.set_focus_on_click(False)
@@ -58,3 +60,41 @@ class ModeButton(TileToggleButton):
         #for child in self:
         #    self.propagate_draw(child, cr)
 
+
+class LevelMeter(object):
+    """Shows the level of a PulseAudio source on a Gtk.LevelBar.
+
+    Levels are applied from a frame clock tick callback, so the bar is
+    redrawn at most once per frame and not at all while it is not mapped.
+    """
+    def __init__(self, bar):
+        self.bar = bar
+        self.monitor = None
+        self.handler = None
+        self.value = 0.0
+        self.tick_id = None
+
+    def set_device(self, device):
+        """Starts metering device, None stops the meter."""
+        if self.monitor and self.monitor.device == device:
+            return
+        if self.monitor:
+            self.monitor.disconnect(self.handler)
+            self.monitor.release()
+            self.monitor = None
+            self.handler = None
+        if device:
+            self.monitor = get_level_monitor(device)
+            self.handler = self.monitor.connect("level", self.cb_level)
+            self.monitor.acquire()
+        self.cb_level(None, 0.0)
+
+    def cb_level(self, monitor, value):
+        self.value = value
+        if self.tick_id is None:
+            self.tick_id = self.bar.add_tick_callback(self.cb_tick, None)
+
+    def cb_tick(self, widget, frame_clock, data):
+        self.tick_id = None
+        widget.set_value(self.value)
+        return False
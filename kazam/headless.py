@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+#
+#       headless.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+#
+# Headless recorder. Drives the GStreamer backend directly and must never
+# import anything from kazam.frontend, so it can run on a bare X server
+# without a session bus, indicator or any of the windows.
+#
+
+import os
+import signal
+import shutil
+import logging
+
+from gi.repository import GObject, GLib, Gst
+
+from kazam.backend.prefs import *
+from kazam.backend.benchmark import parse_resolution
+
+logger = logging.getLogger("Headless")
+
+
+def parse_area(value):
+    """Converts X,Y,WIDTH,HEIGHT into the area tuple used by Screencast.
+
+    End coordinates are inclusive, the last pixel that is captured.
+    """
+    (x, y, w, h) = [int(v) for v in value.split(",")]
+    return (x, y, x + w - 1, y + h - 1, w, h)
+
+
+class HeadlessApp(GObject.GObject):
+
+    def __init__(self, args, debug, test):
+        GObject.GObject.__init__(self)
+        self.args = args
+        self.recorder = None
+        self.timeout_id = None
+        self.stopping = False
+        self.rc = 0
+
+        prefs.debug = debug
+        prefs.test = test
+        prefs.sound = False
+        prefs.instant_replay = False
+        prefs.segment_recording = bool(args.segment_time or args.segment_size)
+        prefs.segment_seconds = args.segment_time or 0
+        prefs.segment_size_mb = args.segment_size or 0
+        prefs.segment_max_files = args.max_segments
+
+        if args.codec:
+            prefs.codec = CODEC_NAMES[args.codec]
+        if args.framerate:
+            prefs.framerate = args.framerate
+        if args.preset:
+            prefs.encoder_preset = ENCODER_PRESET_NAMES[args.preset]
+        prefs.capture_cursor = args.cursor
+        prefs.crash_safe = args.crash_safe
+        prefs.separate_tracks = args.separate_tracks
+        prefs.sync_log = args.sync_log
+        prefs.sync_compensate = args.sync_compensate
+        prefs.audio_only = args.audio_only
+        prefs.idle_pause = bool(args.idle_pause)
+        if args.idle_pause:
+            prefs.idle_timeout = args.idle_pause
+        if args.idle_level is not None:
+            prefs.idle_level = args.idle_level
+        prefs.vfr = args.vfr
+        if args.vfr_min_interval is not None:
+            prefs.vfr_min_interval = args.vfr_min_interval
+        if args.vfr_max_interval is not None:
+            prefs.vfr_max_interval = args.vfr_max_interval
+        prefs.adaptive = args.adaptive
+        if args.memory_limit is not None:
+            prefs.queue_memory_limit = args.memory_limit
+        if args.output_size:
+            (prefs.output_width, prefs.output_height) = parse_resolution(args.output_size)
+        if args.speakers_profile:
+            prefs.speakers_profile = AUDIO_PROFILE_NAMES[args.speakers_profile]
+        if args.mic_profile:
+            prefs.microphone_profile = AUDIO_PROFILE_NAMES[args.mic_profile]
+        if args.audio_codec:
+            prefs.audio_codec = AUDIO_CODEC_NAMES[args.audio_codec]
+
+        self.output = os.path.abspath(args.output)
+        if not self.output.endswith(codec_extension(prefs.codec)):
+            self.output += codec_extension(prefs.codec)
+
+        #
+        # Keep the tempfile on the same filesystem as the output, so the
+        # final move is a rename.
+        #
+        prefs.video_dest = os.path.dirname(self.output)
+
+        self.loop = GLib.MainLoop()
+
+    def run(self):
+        from kazam.backend.gstreamer import Screencast
+
+        if prefs.audio_only:
+            if not (self.args.speakers or self.args.mic):
+                logger.critical("Audio-only recording needs --speakers or --mic.")
+                return 1
+            return self.record(None, None, None)
+
+        area = parse_area(self.args.area) if self.args.area else None
+        xid = self.args.xid
+
+        if xid:
+            from gi.repository import GdkX11
+            disp = GdkX11.X11Display.get_default()
+            win = GdkX11.X11Window.foreign_new_for_display(disp, xid)
+            prefs.xid_geometry = win.get_geometry()
+
+        if HW.combined_screen:
+            video_source = HW.combined_screen
+        elif HW.screens:
+            video_source = HW.screens[0]
+        else:
+            video_source = None
+
+        if not (video_source or area):
+            logger.critical("No video source found, is DISPLAY set?")
+            return 1
+
+        return self.record(video_source, area, xid)
+
+    def record(self, video_source, area, xid):
+        logger.debug("Recording to {0}".format(self.output))
+        self.recorder = Screencast()
+        if prefs.segment_recording:
+            (base, ext) = os.path.splitext(self.output)
+            self.recorder.segment_location = "{0}_%05d{1}".format(base, ext)
+        self.recorder.setup_sources(video_source,
+                                    self.args.speakers,
+                                    self.args.mic,
+                                    area,
+                                    xid)
+        self.recorder.connect("flush-done", self.cb_flush_done)
+        self.recorder.bus.connect("message::error", self.cb_error)
+
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGINT, self.cb_signal)
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, self.cb_signal)
+
+        if self.args.duration:
+            self.timeout_id = GLib.timeout_add(int(self.args.duration * 1000), self.cb_timeout)
+
+        self.recorder.start_recording()
+        logger.info("Recording started.")
+        self.loop.run()
+        return self.rc
+
+    def stop(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info("Finishing recording.")
+        self.recorder.stop_recording()
+
+    def cb_timeout(self):
+        self.timeout_id = None
+        self.stop()
+        return False
+
+    def cb_signal(self):
+        self.stop()
+        return True
+
+    def cb_error(self, bus, message):
+        logger.error("Recording failed: {0}".format(message.parse_error()[1]))
+        self.rc = 1
+        self.recorder.pipeline.set_state(Gst.State.NULL)
+        tempfile = self.recorder.get_tempfile()
+        for fname in (tempfile, "{0}.mux".format(tempfile)):
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+        self.loop.quit()
+
+    def cb_flush_done(self, recorder):
+        if prefs.segment_recording:
+            for segment in recorder.get_segments():
+                logger.info("Segment saved to {0}".format(segment))
+            self.loop.quit()
+            return
+
+        tempfile = recorder.get_tempfile()
+        try:
+            shutil.move(tempfile, self.output)
+            logger.info("Recording saved to {0}".format(self.output))
+        except OSError:
+            logger.error("Unable to move {0} to {1}".format(tempfile, self.output))
+            self.rc = 1
+
+        for (log, suffix) in ((recorder.get_sync_log(), SYNC_LOG_SUFFIX),
+                              (recorder.get_adapt_log(), ADAPT_LOG_SUFFIX)):
+            if log and os.path.isfile(log):
+                shutil.move(log, "{0}{1}".format(self.output, suffix))
+                logger.info("Log saved to {0}{1}".format(self.output, suffix))
+
+        try:
+            os.remove("{0}.mux".format(tempfile))
+        except OSError:
+            pass
+
+        self.loop.quit()
@@ -37,6 +37,18 @@ PA_OPERATION_RUNNING = 0
 PA_OPERATION_DONE = 1
 PA_OPERATION_CANCELLED = 2
 
+PA_INVALID_INDEX = 0xFFFFFFFF
+
+PA_SUBSCRIPTION_MASK_SOURCE = 0x0002
+
+PA_SUBSCRIPTION_EVENT_SOURCE = 0x0001
+PA_SUBSCRIPTION_EVENT_FACILITY_MASK = 0x000F
+
+PA_SUBSCRIPTION_EVENT_NEW = 0x0000
+PA_SUBSCRIPTION_EVENT_CHANGE = 0x0010
+PA_SUBSCRIPTION_EVENT_REMOVE = 0x0020
+PA_SUBSCRIPTION_EVENT_TYPE_MASK = 0x0030
+
 # Convenience ...
 STRING = c_char_p
 size_t = c_ulong
@@ -63,6 +75,18 @@ pa_threaded_mainloop_stop.argtypes = [POINTER(pa_threaded_mainloop)]
 pa_threaded_mainloop_get_api = PA.pa_threaded_mainloop_get_api
 pa_threaded_mainloop_get_api.restype = POINTER(pa_mainloop_api)
 pa_threaded_mainloop_get_api.argtypes = [POINTER(pa_threaded_mainloop)]
+pa_threaded_mainloop_lock = PA.pa_threaded_mainloop_lock
+pa_threaded_mainloop_lock.restype = None
+pa_threaded_mainloop_lock.argtypes = [POINTER(pa_threaded_mainloop)]
+pa_threaded_mainloop_unlock = PA.pa_threaded_mainloop_unlock
+pa_threaded_mainloop_unlock.restype = None
+pa_threaded_mainloop_unlock.argtypes = [POINTER(pa_threaded_mainloop)]
+pa_threaded_mainloop_wait = PA.pa_threaded_mainloop_wait
+pa_threaded_mainloop_wait.restype = None
+pa_threaded_mainloop_wait.argtypes = [POINTER(pa_threaded_mainloop)]
+pa_threaded_mainloop_signal = PA.pa_threaded_mainloop_signal
+pa_threaded_mainloop_signal.restype = None
+pa_threaded_mainloop_signal.argtypes = [POINTER(pa_threaded_mainloop), c_int]
 
 class pa_context(Structure):
     pass
@@ -75,6 +99,14 @@ pa_stream._fields_ = []
 
 class pa_operation(Structure):
         pass
+pa_operation_state = c_int
+pa_operation_state_t = pa_operation_state
+pa_operation_get_state = PA.pa_operation_get_state
+pa_operation_get_state.restype = pa_operation_state_t
+pa_operation_get_state.argtypes = [POINTER(pa_operation)]
+pa_operation_unref = PA.pa_operation_unref
+pa_operation_unref.restype = None
+pa_operation_unref.argtypes = [POINTER(pa_operation)]
 
 class pa_cvolume(Structure):
         pass
@@ -116,9 +148,9 @@ pa_source_info._fields_ = [
     ('channel_map', pa_channel_map),
     ('owner_module', uint32_t),
     ('volume', pa_cvolume),
-#    ('mute', c_int),
-#    ('monitor_of_sink', uint32_t),
-#    ('monitor_of_sink_name', STRING),
+    ('mute', c_int),
+    ('monitor_of_sink', uint32_t),
+    ('monitor_of_sink_name', STRING),
 #    ('latency', pa_usec_t),
 #    ('driver', STRING),
 #    ('flags', pa_source_flags_t),
@@ -145,6 +177,9 @@ pa_stream_success_cb_t = CFUNCTYPE(None, POINTER(pa_stream), c_int, c_void_p)
 pa_stream_request_cb_t = CFUNCTYPE(None, POINTER(pa_stream), size_t, c_void_p)
 pa_stream_notify_cb_t = CFUNCTYPE(None, POINTER(pa_stream), c_void_p)
 pa_source_info_cb_t = CFUNCTYPE(None, POINTER(pa_context), POINTER(pa_source_info), c_int, c_void_p)
+pa_subscription_mask_t = c_int
+pa_subscription_event_type_t = c_int
+pa_context_subscribe_cb_t = CFUNCTYPE(None, POINTER(pa_context), pa_subscription_event_type_t, uint32_t, c_void_p)
 
 pa_context_new = PA.pa_context_new
 pa_context_new.restype = POINTER(pa_context)
@@ -195,3 +230,10 @@ pa_sw_volume_from_dB.argtypes = [c_double]
 pa_sw_volume_to_dB = PA.pa_sw_volume_to_dB
 pa_sw_volume_to_dB.restype = c_double
 pa_sw_volume_to_dB.argtypes = [pa_volume_t]
+
+pa_context_subscribe = PA.pa_context_subscribe
+pa_context_subscribe.restype = POINTER(pa_operation)
+pa_context_subscribe.argtypes = [POINTER(pa_context), pa_subscription_mask_t, pa_context_success_cb_t, c_void_p]
+pa_context_set_subscribe_callback = PA.pa_context_set_subscribe_callback
+pa_context_set_subscribe_callback.restype = None
+pa_context_set_subscribe_callback.argtypes = [POINTER(pa_context), pa_context_subscribe_cb_t, c_void_p]
@@ -19,10 +19,11 @@
 #       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 #       MA 02110-1301, USA.
 
-import time
 import logging
 logger = logging.getLogger("PulseAudio")
 
+from gi.repository import GLib, GObject
+
 from kazam.pulseaudio.error_handling import *
 from kazam.backend.prefs import *
 
@@ -31,7 +32,18 @@ try:
 except:
     raise PAError(PA_LOAD_ERROR, "Unable to load pulseaudio wrapper lib. Is PulseAudio installed?")
 
-class pulseaudio_q:
+class pulseaudio_q(GObject.GObject):
+    """PulseAudio client running in its own threaded mainloop.
+
+    Keeps a table of all the sources, updated from subscription events.
+    "sources-changed" is emitted in the GLib main loop when a source is
+    added, removed or renamed.
+    """
+    __gsignals__ = {"sources-changed": (GObject.SIGNAL_RUN_LAST,
+                    None,
+                    (),),
+                    }
+
     def __init__(self):
         """pulseaudio_q constructor.
 
@@ -45,12 +57,21 @@ class pulseaudio_q:
             None
         """
 
+        GObject.GObject.__init__(self)
         self.pa_state = -1
+        self.pa_ml = None
+        self.source_cache = {}
+        self.source_names = {}
         self.sources = []
         self._sources = []
         self._return_result = []
         self.pa_status = PA_STOPPED
 
+        #
+        # ctypes callbacks of async operations that are still in flight
+        #
+        self._pending = []
+
         #
         # Making sure that we don't lose references to callback functions
         #
@@ -58,9 +79,12 @@ class pulseaudio_q:
         self._pa_sourcelist_cb = pa_source_info_cb_t(self.pa_sourcelist_cb)
         self._pa_sourceinfo_cb = pa_source_info_cb_t(self.pa_sourceinfo_cb)
         self._pa_context_success_cb = pa_context_success_cb_t(self.pa_context_success_cb)
+        self._pa_subscribe_cb = pa_context_subscribe_cb_t(self.pa_subscribe_cb)
+        self._pa_sourceupdate_cb = pa_source_info_cb_t(self.pa_sourceupdate_cb)
 
     def pa_context_success_cb(self, context, c_int, user_data):
         self._pa_ctx_success = c_int
+        pa_threaded_mainloop_signal(self.pa_ml, 0)
         return
 
     def pa_state_cb(self, context, userdata):
@@ -92,6 +116,8 @@ class pulseaudio_q:
                 logger.debug("State connected.")
         except:
             raise PAError(PA_GET_STATE_ERROR, "Unable to read context state.")
+        finally:
+            pa_threaded_mainloop_signal(self.pa_ml, 0)
 
         return  0
 
@@ -122,15 +148,80 @@ class pulseaudio_q:
             logger.debug("  Name: {0}".format(source_info.contents.name))
             logger.debug("  Desc: {0}".format(source_info.contents.description))
             self.pa_status = PA_WORKING
-            self._sources.append([source_info.contents.index,
-                                 source_info.contents.name.decode('utf-8'),
-                                 " ".join(source_info.contents.description.decode('utf-8').split())])
+            self._sources.append(self.source_entry(source_info))
         else:
             logger.debug("pa_sourcelist_cb() -- finished")
             self.pa_status = PA_FINISHED
+            pa_threaded_mainloop_signal(self.pa_ml, 0)
 
         return 0
 
+    def pa_subscribe_cb(self, context, event, index, userdata):
+        """Subscription callback, runs in the mainloop thread.
+
+        New and changed sources are looked up right away, the results and
+        removals are passed on to the GLib main loop.
+        """
+        if event & PA_SUBSCRIPTION_EVENT_FACILITY_MASK != PA_SUBSCRIPTION_EVENT_SOURCE:
+            return
+        if event & PA_SUBSCRIPTION_EVENT_TYPE_MASK == PA_SUBSCRIPTION_EVENT_REMOVE:
+            GLib.idle_add(self.cb_source_removed, index)
+        else:
+            op = pa_context_get_source_info_by_index(context, index, self._pa_sourceupdate_cb, None)
+            if op:
+                pa_operation_unref(op)
+
+    def pa_sourceupdate_cb(self, context, source_info, eol, userdata):
+        if eol == 0:
+            GLib.idle_add(self.cb_source_updated, self.source_entry(source_info))
+
+    def cb_source_updated(self, entry):
+        old = self.source_cache.get(entry[0])
+        self.source_cache[entry[0]] = entry
+        self.source_names[entry[1]] = entry[0]
+        if old != entry:
+            logger.debug("Source updated: {0}".format(entry))
+            self.emit("sources-changed")
+        return False
+
+    def cb_source_removed(self, index):
+        entry = self.source_cache.pop(index, None)
+        if entry:
+            logger.debug("Source removed: {0}".format(entry))
+            self.source_names.pop(entry[1], None)
+            self.emit("sources-changed")
+        return False
+
+    def get_cached_sources(self):
+        """Returns the cached list of sources, ordered by index."""
+        return [self.source_cache[idx] for idx in sorted(self.source_cache)]
+
+    def get_source_by_name(self, name):
+        """Returns the cached entry of the named source or None."""
+        return self.source_cache.get(self.source_names.get(name))
+
+    def source_entry(self, source_info):
+        return [source_info.contents.index,
+                source_info.contents.name.decode('utf-8'),
+                " ".join(source_info.contents.description.decode('utf-8').split()),
+                source_info.contents.monitor_of_sink != PA_INVALID_INDEX,
+                (source_info.contents.sample_spec.format,
+                 source_info.contents.sample_spec.rate,
+                 source_info.contents.sample_spec.channels)]
+
+    def source_info_entry(self, source_info):
+        cvolume = pa_cvolume()
+        v = pa_volume_t * 32
+        cvolume.channels = source_info.contents.volume.channels
+        cvolume.values = v()
+        for i in range(0, source_info.contents.volume.channels):
+            cvolume.values[i] = source_info.contents.volume.values[i]
+
+        return [source_info.contents.index,
+                source_info.contents.name.decode('utf-8'),
+                cvolume,
+                " ".join(source_info.contents.description.decode('utf-8').split())]
+
     def pa_sourceinfo_cb(self, context, source_info, eol, userdata):
         """Source list callback function
 
@@ -159,18 +250,7 @@ class pulseaudio_q:
             logger.debug("  Name: {0}".format(source_info.contents.name))
             logger.debug("  Desc: {0}".format(source_info.contents.description))
             self.pa_status = PA_WORKING
-            cvolume = pa_cvolume()
-            v = pa_volume_t * 32
-            cvolume.channels = source_info.contents.volume.channels
-            cvolume.values = v()
-            for i in range(0, source_info.contents.volume.channels):
-                cvolume.values[i] = source_info.contents.volume.values[i]
-
-
-            self._return_result  = [source_info.contents.index,
-                                    source_info.contents.name.decode('utf-8'),
-                                    cvolume,
-                                    " ".join(source_info.contents.description.decode('utf-8').split())]
+            self._return_result = self.source_info_entry(source_info)
         else:
             try:
                 logger.debug("pa_sourceinfo_cb() -- Hit EOL")
@@ -180,6 +260,7 @@ class pulseaudio_q:
             except:
                 logger.debug("pa_sourceinfo_cb() -- EOL no data!")
             self.pa_status = PA_FINISHED
+            pa_threaded_mainloop_signal(self.pa_ml, 0)
         logger.debug("pa_sourceinfo_cb() -- finished")
         return 0
 
@@ -213,20 +294,37 @@ class pulseaudio_q:
         except:
             raise PAError(PA_STARTUP_ERROR, "Unable to access PulseAudio API.")
 
-        try:
-            logger.debug("Connecting to server.")
-            if pa_context_connect(self.pa_ctx, None, 0, None):
-                raise PAError(PA_UNABLE_TO_CONNECT, "Unable to connect to PulseAudio server.")
-        except:
-            raise PAError(PA_UNABLE_TO_CONNECT2, "Unable to initiate connection to PulseAudio server.")
         try:
             logger.debug("Start mainloop.")
-            pa_threaded_mainloop_start(self.pa_ml)
-            time.sleep(0.1)  # Mainloop needs some time to start ...
-            pa_context_get_state(self.pa_ctx)
+            if pa_threaded_mainloop_start(self.pa_ml) < 0:
+                raise PAError(PA_MAINLOOP_START_ERROR, "Unable to start mainloop.")
         except:
             raise PAError(PA_MAINLOOP_START_ERROR, "Unable to start mainloop.")
 
+        #
+        # The state callback signals the mainloop on every state change,
+        # sleep until the context is either ready or failed.
+        #
+        pa_threaded_mainloop_lock(self.pa_ml)
+        try:
+            logger.debug("Connecting to server.")
+            if pa_context_connect(self.pa_ctx, None, 0, None) < 0:
+                raise PAError(PA_UNABLE_TO_CONNECT2, "Unable to initiate connection to PulseAudio server.")
+            while self.pa_state not in (PA_STATE_READY, PA_STATE_FAILED):
+                pa_threaded_mainloop_wait(self.pa_ml)
+        finally:
+            pa_threaded_mainloop_unlock(self.pa_ml)
+
+        if self.pa_state == PA_STATE_FAILED:
+            raise PAError(PA_UNABLE_TO_CONNECT, "Unable to connect to PulseAudio server.")
+
+        logger.debug("Subscribing to source events.")
+        pa_threaded_mainloop_lock(self.pa_ml)
+        pa_context_set_subscribe_callback(self.pa_ctx, self._pa_subscribe_cb, None)
+        pa_threaded_mainloop_unlock(self.pa_ml)
+        self.run_operation(pa_context_subscribe, PA_SUBSCRIPTION_MASK_SOURCE,
+                           self._pa_context_success_cb, None)
+
     def end(self):
         """Disconnects from PulseAudio server.
 
@@ -244,66 +342,152 @@ class pulseaudio_q:
         """
         try:
             logger.debug("Disconnecting from server.")
+            pa_threaded_mainloop_lock(self.pa_ml)
             pa_context_disconnect(self.pa_ctx)
+            pa_threaded_mainloop_unlock(self.pa_ml)
+            pa_threaded_mainloop_stop(self.pa_ml)
             self.pa_ml = None
             self.pa_mlapi = None
             self.pa_ctx = None
         except:
             raise PAError(PA_MAINLOOP_END_ERROR, "Unable to end mainloop.")
 
+    def wait_operation(self, op):
+        """Waits for an operation to finish, mainloop lock must be held."""
+        if not op:
+            return False
+        while pa_operation_get_state(op) == PA_OPERATION_RUNNING:
+            pa_threaded_mainloop_wait(self.pa_ml)
+        state = pa_operation_get_state(op)
+        pa_operation_unref(op)
+        return state == PA_OPERATION_DONE
+
+    def run_operation(self, func, *args):
+        pa_threaded_mainloop_lock(self.pa_ml)
+        try:
+            return self.wait_operation(func(self.pa_ctx, *args))
+        finally:
+            pa_threaded_mainloop_unlock(self.pa_ml)
+
+    def start_operation(self, func, *args):
+        pa_threaded_mainloop_lock(self.pa_ml)
+        try:
+            op = func(self.pa_ctx, *args)
+            if op:
+                pa_operation_unref(op)
+            return bool(op)
+        finally:
+            pa_threaded_mainloop_unlock(self.pa_ml)
+
+    def finish_async(self, c_cb, callback, result):
+        #
+        # Called from the PulseAudio thread, hand the result over to the
+        # GLib main loop.
+        #
+        GLib.idle_add(self.cb_async_done, c_cb, callback, result)
+
+    def cb_async_done(self, c_cb, callback, result):
+        self._pending.remove(c_cb)
+        if callback:
+            callback(result)
+        return False
+
     def get_audio_sources(self):
         try:
             logger.debug("get_audio_sources() called.")
-            pa_context_get_source_info_list(self.pa_ctx, self._pa_sourcelist_cb, None)
-            t = time.clock()
-            while time.clock() - t < 5:
-                if self.pa_status == PA_FINISHED:
-                    self.sources = self._sources
-                    self._sources = []
-                    return self.sources
-            raise PAError(PA_GET_SOURCES_TIMEOUT, "Unable to get sources, operation timed out.")
+            self.pa_status = PA_WORKING
+            if self.run_operation(pa_context_get_source_info_list, self._pa_sourcelist_cb, None):
+                self.sources = self._sources
+                self._sources = []
+                self.source_cache = dict((src[0], src) for src in self.sources)
+                self.source_names = dict((src[1], src[0]) for src in self.sources)
+                return self.sources
+            raise PAError(PA_GET_SOURCES_ERROR, "Unable to get sources.")
         except:
             logger.debug("Unable to get audio sources.")
             raise PAError(PA_GET_SOURCES_ERROR, "Unable to get sources.")
 
+    def get_audio_sources_async(self, callback):
+        """Requests the list of sources, callback(sources) runs in the main loop."""
+        sources = []
+
+        def cb(context, source_info, eol, userdata):
+            if eol == 0:
+                sources.append(self.source_entry(source_info))
+            else:
+                self.finish_async(c_cb, callback, sources if eol > 0 else None)
+
+        c_cb = pa_source_info_cb_t(cb)
+        self._pending.append(c_cb)
+        if not self.start_operation(pa_context_get_source_info_list, c_cb, None):
+            self._pending.remove(c_cb)
+            raise PAError(PA_GET_SOURCES_ERROR, "Unable to get sources.")
+
     def get_source_info_by_index(self, index):
         try:
             logger.debug("get_source_info_by_index() called. IDX: {0}".format(index))
-            pa_context_get_source_info_by_index(self.pa_ctx, index, self._pa_sourceinfo_cb, None)
-            t = time.clock()
-            while time.clock() - t < 5:
-                if self.pa_status == PA_FINISHED:
-                    time.sleep(0.1)
-                    ret = self._return_result
-                    self._return_result = []
-                    return ret
-            raise PAError(PA_GET_SOURCE_TIMEOUT, "Unable to get source, operation timed out.")
+            self.pa_status = PA_WORKING
+            self._return_result = []
+            self.run_operation(pa_context_get_source_info_by_index, index, self._pa_sourceinfo_cb, None)
+            ret = self._return_result
+            self._return_result = []
+            return ret
         except:
             raise PAError(PA_GET_SOURCE_ERROR, "Unable to get source.")
 
+    def get_source_info_by_index_async(self, index, callback):
+        """Requests info for a source, callback(info) runs in the main loop.
+
+        info is the same list get_source_info_by_index() returns, empty on
+        failure.
+        """
+        result = []
+
+        def cb(context, source_info, eol, userdata):
+            if eol == 0:
+                result.extend(self.source_info_entry(source_info))
+            else:
+                self.finish_async(c_cb, callback, result)
+
+        c_cb = pa_source_info_cb_t(cb)
+        self._pending.append(c_cb)
+        if not self.start_operation(pa_context_get_source_info_by_index, index, c_cb, None):
+            self._pending.remove(c_cb)
+            raise PAError(PA_GET_SOURCE_ERROR, "Unable to get source.")
+
     def set_source_volume_by_index(self, index, cvolume):
         try:
-            pa_context_set_source_volume_by_index(self.pa_ctx, index, cvolume,
-                                                  self._pa_context_success_cb, None)
-            t = time.clock()
-            while time.clock() - t < 5:
-                if self.pa_status == PA_FINISHED:
-                    return 1
-            raise PAError(PA_GET_SOURCES_TIMEOUT, "Unable to get sources, operation timed out.")
+            if self.run_operation(pa_context_set_source_volume_by_index, index, cvolume,
+                                  self._pa_context_success_cb, None):
+                return 1
+            raise PAError(PA_GET_SOURCES_ERROR, "Unable to set volume.")
         except:
-            raise PAError(PA_GET_SOURCES_ERROR, "Unable to get sources.")
+            raise PAError(PA_GET_SOURCES_ERROR, "Unable to set volume.")
+
+    def set_source_volume_by_index_async(self, index, cvolume, callback=None):
+        self.start_success_operation(pa_context_set_source_volume_by_index, index, cvolume, callback)
 
     def set_source_mute_by_index(self, index, mute):
         try:
-            pa_context_set_source_mute_by_index(self.pa_ctx, index, mute,
-                                                  self._pa_context_success_cb, None)
-            t = time.clock()
-            while time.clock() - t < 5:
-                if self.pa_status == PA_FINISHED:
-                    return 1
-            raise PAError(PA_GET_SOURCES_TIMEOUT, "Unable to get sources, operation timed out.")
+            if self.run_operation(pa_context_set_source_mute_by_index, index, mute,
+                                  self._pa_context_success_cb, None):
+                return 1
+            raise PAError(PA_GET_SOURCES_ERROR, "Unable to set mute.")
         except:
-            raise PAError(PA_GET_SOURCES_ERROR, "Unable to get sources.")
+            raise PAError(PA_GET_SOURCES_ERROR, "Unable to set mute.")
+
+    def set_source_mute_by_index_async(self, index, mute, callback=None):
+        self.start_success_operation(pa_context_set_source_mute_by_index, index, mute, callback)
+
+    def start_success_operation(self, func, index, value, callback):
+        def cb(context, success, userdata):
+            self.finish_async(c_cb, callback, bool(success))
+
+        c_cb = pa_context_success_cb_t(cb)
+        self._pending.append(c_cb)
+        if not self.start_operation(func, index, value, c_cb, None):
+            self._pending.remove(c_cb)
+            raise PAError(PA_GET_SOURCES_ERROR, "Unable to start operation.")
 
     def cvolume_to_linear(self, cvolume):
         avg = 0
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+#
+#       test_headless.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+from unittest import TestCase, main
+
+from kazam.headless import parse_area
+
+
+class ParseAreaTest(TestCase):
+
+    def test_parse_area(self):
+        self.assertEqual(parse_area("0,0,1920,1080"), (0, 0, 1919, 1079, 1920, 1080))
+        self.assertEqual(parse_area("100,50,640,480"), (100, 50, 739, 529, 640, 480))
+
+    def test_invalid_area(self):
+        self.assertRaises(ValueError, parse_area, "100,50,640")
+        self.assertRaises(ValueError, parse_area, "a,b,c,d")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+#       test_prefs.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+from unittest import TestCase, main
+
+from kazam.backend.prefs import prefs, get_queue_settings, parse_settings, audio_container, \
+                                AUDIO_CODEC_MP3, AUDIO_CODEC_VORBIS, AUDIO_CODEC_OPUS_VOICE
+
+
+class FakeConfig(object):
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, section, key):
+        return self.values.get((section, key))
+
+
+class PrefsTest(TestCase):
+
+    ATTRS = ("config", "audio_codec", "instant_replay", "segment_recording")
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.saved = dict((attr, getattr(prefs, attr)) for attr in self.ATTRS)
+
+    def tearDown(self):
+        for (attr, value) in self.saved.items():
+            setattr(prefs, attr, value)
+        TestCase.tearDown(self)
+
+    def test_parse_settings(self):
+        self.assertEqual(parse_settings("speed-preset=veryfast  quantizer=20"),
+                         [("speed-preset", "veryfast"), ("quantizer", "20")])
+        self.assertEqual(parse_settings("option-string=scenecut=40:min-keyint=15"),
+                         [("option-string", "scenecut=40:min-keyint=15")])
+        self.assertEqual(parse_settings("novalue key=1"), [("key", "1")])
+        self.assertEqual(parse_settings(""), [])
+
+    def test_get_queue_settings(self):
+        prefs.config = FakeConfig({("queues", "queue_v1"): "mb=256 ms=1000 leaky=downstream",
+                                   ("queues", "queue_a_in"): "mb=0.5 ms=0",
+                                   ("queues", "queue_bad"): "mb=lots ms=10 leaky=upstream"})
+        self.assertEqual(get_queue_settings("queue_v1"), (256 * 1024 * 1024, 1000 * 1000000, "downstream"))
+        self.assertEqual(get_queue_settings("queue_a_in"), (512 * 1024, 0, "no"))
+        self.assertEqual(get_queue_settings("queue_bad"), (0, 0, "upstream"))
+        self.assertEqual(get_queue_settings("queue_missing"), (0, 0, "no"))
+
+    def test_get_source_position(self):
+        sources = [[0, "alsa_output.monitor", "Speakers", True, None],
+                   [3, "alsa_input.usb-mic", "USB Microphone", False, None]]
+        self.assertEqual(prefs.get_source_position(sources, "alsa_output.monitor"), 0)
+        self.assertEqual(prefs.get_source_position(sources, "alsa_input.usb-mic"), 1)
+        self.assertIsNone(prefs.get_source_position(sources, "alsa_input.gone"))
+        self.assertIsNone(prefs.get_source_position([], None))
+
+    def test_audio_container(self):
+        prefs.instant_replay = False
+        prefs.segment_recording = False
+        prefs.audio_codec = AUDIO_CODEC_MP3
+        self.assertEqual(audio_container(), ("id3v2mux", ".mp3"))
+        prefs.audio_codec = AUDIO_CODEC_VORBIS
+        self.assertEqual(audio_container(), ("oggmux", ".ogg"))
+        prefs.audio_codec = AUDIO_CODEC_OPUS_VOICE
+        self.assertEqual(audio_container(), ("oggmux", ".opus"))
+
+    def test_audio_container_split(self):
+        prefs.audio_codec = AUDIO_CODEC_MP3
+        prefs.instant_replay = False
+        prefs.segment_recording = True
+        self.assertEqual(audio_container(), ("matroskamux", ".mka"))
+        prefs.segment_recording = False
+        prefs.instant_replay = True
+        self.assertEqual(audio_container(), ("matroskamux", ".mka"))
+        prefs.audio_codec = AUDIO_CODEC_VORBIS
+        self.assertEqual(audio_container(), ("oggmux", ".ogg"))
+
+if __name__ == '__main__':
+    main()
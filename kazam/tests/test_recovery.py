@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+#       test_recovery.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+import os
+import fcntl
+import shutil
+import tempfile
+from unittest import TestCase, main
+
+from kazam.backend.recovery import detect_container, find_orphans, find_replay_dirs
+
+
+class RecoveryTest(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.tmpdir = tempfile.mkdtemp(prefix="kazam_test_")
+        self.locks = []
+
+    def tearDown(self):
+        for fd in self.locks:
+            os.close(fd)
+        shutil.rmtree(self.tmpdir)
+        TestCase.tearDown(self)
+
+    def make_file(self, name, data=b""):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def lock(self, path):
+        fd = os.open(path, os.O_RDWR)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        self.locks.append(fd)
+
+    def test_detect_container(self):
+        padding = b"\0" * 32
+        cases = [(b"RIFF\0\0\0\0AVI LIST", "avi"),
+                 (b"\x1a\x45\xdf\xa3\x9f\x42\x82\x84webm", "webm"),
+                 (b"\x1a\x45\xdf\xa3\x9f\x42\x82\x88matroska", "matroska"),
+                 (b"\0\0\0\x18ftypisom", "mp4"),
+                 (b"OggS\0\x02\0\0\0\0\0\0", "ogg"),
+                 (b"ID3\x04\0\0\0\0\0\0\0\0", "mp3"),
+                 (b"not a known container", None)]
+        for (cnt, (head, container)) in enumerate(cases):
+            path = self.make_file("file_{0}".format(cnt), head + padding)
+            self.assertEqual(detect_container(path), container)
+
+    def test_detect_container_short_or_missing(self):
+        self.assertIsNone(detect_container(self.make_file("short", b"RIFF")))
+        self.assertIsNone(detect_container(os.path.join(self.tmpdir, "missing")))
+
+    def test_find_orphans(self):
+        orphan = self.make_file("kazam_a.movie")
+        orphan_mux = self.make_file("kazam_a.movie.mux")
+        lone_mux = self.make_file("kazam_b.movie.mux")
+        self.make_file("unrelated.movie")
+        self.assertEqual(find_orphans(self.tmpdir), ([orphan], sorted([orphan_mux, lone_mux])))
+
+    def test_find_orphans_skips_locked(self):
+        live = self.make_file("kazam_live.movie")
+        self.make_file("kazam_live.movie.mux")
+        orphan = self.make_file("kazam_dead.movie")
+        self.lock(live)
+        self.assertEqual(find_orphans(self.tmpdir), ([orphan], []))
+
+    def test_find_replay_dirs(self):
+        live = os.path.join(self.tmpdir, "kazam_replay_live")
+        dead = os.path.join(self.tmpdir, "kazam_replay_save_dead")
+        os.mkdir(live)
+        os.mkdir(dead)
+        self.make_file("kazam_replay_file")
+        fd = os.open(live, os.O_RDONLY)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        self.locks.append(fd)
+        self.assertEqual(find_replay_dirs([self.tmpdir]), [dead])
+
+if __name__ == '__main__':
+    main()
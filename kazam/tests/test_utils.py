@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+#
+#       test_utils.py
+#
+#       Copyright 2026 Kazam contributors
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 3 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+
+from unittest import TestCase, main
+
+from kazam.utils import fit_size, level_to_fraction
+
+
+class FitSizeTest(TestCase):
+
+    def test_scales_down_keeping_aspect(self):
+        self.assertEqual(fit_size(1920, 1080, 1280, 1280), (1280, 720))
+        self.assertEqual(fit_size(1920, 1080, 1920, 540), (960, 540))
+
+    def test_never_scales_up(self):
+        self.assertEqual(fit_size(640, 480, 1920, 1080), (640, 480))
+
+    def test_even_rounds_down(self):
+        self.assertEqual(fit_size(1280, 1024, 641, 641), (641, 513))
+        self.assertEqual(fit_size(1280, 1024, 641, 641, even=True), (640, 512))
+        self.assertEqual(fit_size(1001, 501, 2000, 2000, even=True), (1000, 500))
+
+    def test_minimum_size(self):
+        self.assertEqual(fit_size(4000, 10, 100, 100), (100, 1))
+        self.assertEqual(fit_size(1, 1, 10, 10, even=True), (2, 2))
+
+
+class LevelToFractionTest(TestCase):
+
+    def test_floor_and_below_are_empty(self):
+        self.assertEqual(level_to_fraction(-60, -60), 0.0)
+        self.assertEqual(level_to_fraction(-90, -60), 0.0)
+
+    def test_linear_in_db(self):
+        self.assertEqual(level_to_fraction(-30, -60), 0.5)
+        self.assertEqual(level_to_fraction(-15, -60), 0.75)
+        self.assertEqual(level_to_fraction(0, -60), 1.0)
+
+    def test_clipped_to_full(self):
+        self.assertEqual(level_to_fraction(6, -60), 1.0)
+
+if __name__ == '__main__':
+    main()
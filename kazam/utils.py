@@ -39,6 +39,36 @@ def get_next_filename(sdir, prefix, ext):
     return "Kazam_recording{0}".format(ext)
 
 
+def slider_to_gain(value):
+    """Converts a 0-60 volume slider value, -60 to 0 dB, to linear gain."""
+    if value <= 0:
+        return 0.0
+    return math.pow(10, (value - 60) / 20.0)
+
+
+def gain_to_slider(gain):
+    if gain <= 0:
+        return 0
+    return min(60, max(0, 60 + 20 * math.log10(gain)))
+
+
+def level_to_fraction(db, floor):
+    """Maps a dBFS level to 0.0 - 1.0, floor and anything below it is 0.0."""
+    if db <= floor:
+        return 0.0
+    return round(min(1.0, 1.0 - db / floor), 2)
+
+
+def fit_size(width, height, max_width, max_height, even=False):
+    """Scales a frame size down to fit max_width x max_height, keeping the
+    aspect ratio. Frames that already fit are never scaled up."""
+    scale = min(1.0, max_width / width, max_height / height)
+    (width, height) = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    if even:
+        (width, height) = (max(2, width - width % 2), max(2, height - height % 2))
+    return (width, height)
+
+
 def in_circle(center_x, center_y, radius, x, y):
     dist = math.sqrt((center_x - x) ** 2 + (center_y - y) ** 2)
     return dist <= radius